@@ -2,9 +2,17 @@
 
 
 import os
+import json
+import zlib
+import gzip
+import logging
+from contextlib import contextmanager
 from itertools import izip_longest
 
 
+log = logging.getLogger(__name__)
+
+
 def check_create_dir(directory, info=False):
     """Check to see if directory exists, if not make it.
 
@@ -66,3 +74,514 @@ def frange(start, stop, step=1.0):
     while i <= stop:
         yield i
         i += step
+
+
+def get_filter_efficiency(summary_filename):
+    """Get the generator-level filter efficiency from a generateMC summary file,
+    i.e. the fraction of generated events that were kept.
+
+    Parameters
+    ----------
+    summary_filename : str
+        Name of JSON summary file written by generateMC.
+
+    Returns
+    -------
+    float
+        Filter efficiency, 1 if no filters were used.
+
+    Raises
+    ------
+    RuntimeError
+        If the summary has no generated events to calculate the efficiency.
+    """
+    with open(summary_filename) as summary_file:
+        summary = json.load(summary_file)
+    filter_summary = summary['filter']
+    if filter_summary['nEvents'] == 0:
+        raise RuntimeError('No events generated in %s, cannot determine '
+                           'filter efficiency' % summary_filename)
+    return filter_summary['nPassed'] / float(filter_summary['nEvents'])
+
+
+def get_events_for_tries(tries_per_job, filter_efficiency):
+    """Get the number of events to ask each job to keep, such that each job
+    generates approximately tries_per_job events before filtering.
+
+    Parameters
+    ----------
+    tries_per_job : int
+        Number of events each job should generate before any filters.
+    filter_efficiency : float
+        Fraction of generated events that pass the filters.
+
+    Returns
+    -------
+    int
+        Number of events to keep per job (at least 1).
+    """
+    return max(1, int(tries_per_job * filter_efficiency))
+
+
+def generate_summary_filename(channel, mass, energy, n_events, seed):
+    """Filename of the JSON summary generateMC writes for each mass point,
+    as made by PythiaProgramOpts::generateFilenameStem.
+
+    >>> generate_summary_filename('ggh_4tau', '8', 13, 1000, 2)
+    ggh_4tau_ma1_8_13TeV_n1000_seed2_summary.json
+    """
+    return "%s_ma1_%s_%dTeV_n%s_seed%s_summary.json" % (channel, mass, energy, n_events, seed)
+
+
+def generate_mass_filename(filename, mass):
+    """Insert the mass into a filename, as generateMC does when generating
+    several mass points with a user-specified filename. This must match
+    PythiaProgramOpts::massFilename.
+
+    >>> generate_mass_filename('myfile_seed1.hepmc', '4')
+    myfile_seed1_ma1_4.hepmc
+    """
+    stem, ext = os.path.splitext(filename)
+    return "%s_ma1_%s%s" % (stem, mass, ext)
+
+
+def add_filter_args(parser):
+    """Add the options for sizing jobs by filter efficiency to the
+    argument parser of a submission script. See set_events_for_filter."""
+    parser.add_argument("--filterSummary",
+                        help="Summary JSON file from a previous generateMC run "
+                        "with the same filters. The filter efficiency from "
+                        "it is used to work out how many events each job "
+                        "has to generate.",
+                        default=None)
+    parser.add_argument("--triesPerJob",
+                        help="Number of events each job should generate "
+                        "before filtering. Requires --filterSummary. The "
+                        "number of events to keep per job (-n) is then set "
+                        "from the filter efficiency.",
+                        type=int, default=None)
+
+
+def set_events_for_filter(args):
+    """Use the filter efficiency from a previous run to size jobs.
+
+    If args.triesPerJob is set, the number of events to keep per job is set
+    in args.args so that each job generates ~triesPerJob events.
+    Otherwise just reports the expected number of events generated per job.
+    Does nothing if args.filterSummary is not set.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Must contain filterSummary, triesPerJob and args (the list of
+        program arguments), as from add_filter_args.
+
+    Raises
+    ------
+    RuntimeError
+        If triesPerJob is used without filterSummary, or the filter
+        efficiency is 0.
+    """
+    if not args.filterSummary:
+        if args.triesPerJob:
+            raise RuntimeError('--triesPerJob requires --filterSummary')
+        return
+    filter_eff = get_filter_efficiency(args.filterSummary)
+    log.info('Filter efficiency from %s: %.3g', args.filterSummary, filter_eff)
+    if filter_eff <= 0:
+        raise RuntimeError('Filter efficiency is 0, cannot size jobs')
+    flags = [f for f in ['--number', '-n'] if f in args.args]
+    if args.triesPerJob:
+        n_events = get_events_for_tries(args.triesPerJob, filter_eff)
+        if flags:
+            i_value = args.args.index(flags[0]) + 1
+            if i_value < len(args.args) and not args.args[i_value].startswith('-'):
+                args.args[i_value] = str(n_events)
+            else:
+                args.args.insert(i_value, str(n_events))
+        else:
+            args.args.extend(['--number', str(n_events)])
+        log.info('Setting number of events per job to %d', n_events)
+    elif flags:
+        n_events = int(args.args[args.args.index(flags[0]) + 1])
+    else:
+        log.warning('Number of events per job not specified - assuming 1')
+        n_events = 1
+    log.info('Each job will generate ~%d events to keep %d',
+             int(float(n_events) / filter_eff), n_events)
+
+
+def strip_extensions(filename, extensions):
+    """Remove any of the known extensions from the end of a filename,
+    leaving any other dots (e.g. in masses like m1.5) alone.
+
+    >>> strip_extensions('ma1_m1.5_seed1.lhe.gz', ['.gz', '.lhe'])
+    ma1_m1.5_seed1
+    """
+    stripped = True
+    while stripped:
+        stripped = False
+        for ext in extensions:
+            if filename.endswith(ext):
+                filename = filename[:-len(ext)]
+                stripped = True
+    return filename
+
+
+def sidecar_filename(filename):
+    """Get the name of the JSON sidecar file for an output file.
+
+    >>> sidecar_filename('out.hepmc.gz')
+    out.hepmc.gz.json
+    """
+    return filename + '.json'
+
+
+def file_checksum(filename, chunk_size=1024 * 1024):
+    """Get the size and CRC32 checksum of a file.
+
+    Uses the same format as generateMC, i.e. "crc32:<8 hex digits>".
+
+    Parameters
+    ----------
+    filename : str
+        Name of file.
+    chunk_size : int, optional
+        Number of bytes to read at a time.
+
+    Returns
+    -------
+    int, str
+        Size of file in bytes, checksum.
+    """
+    crc = 0
+    n_bytes = 0
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            crc = zlib.crc32(chunk, crc)
+            n_bytes += len(chunk)
+    return n_bytes, 'crc32:%08x' % (crc & 0xffffffff)
+
+
+def write_sidecar(filename, metadata):
+    """Write the JSON sidecar file for an output file, with the size and
+    checksum of the file added to the metadata.
+
+    Parameters
+    ----------
+    filename : str
+        Name of output file. Must be complete (e.g. zipped) already.
+    metadata : dict
+        Info about the contents of the file, e.g. nEvents, sigmaGen_mb.
+
+    Returns
+    -------
+    str
+        Name of sidecar file.
+    """
+    metadata = dict(metadata)
+    metadata['bytes'], metadata['checksum'] = file_checksum(filename)
+    sidecar = sidecar_filename(filename)
+    tmp_name = sidecar + '.tmp'
+    with open(tmp_name, 'w') as f:
+        json.dump(metadata, f, indent=2, sort_keys=True)
+    os.rename(tmp_name, sidecar)
+    return sidecar
+
+
+def read_sidecar(filename):
+    """Read the JSON sidecar file for an output file.
+
+    Parameters
+    ----------
+    filename : str
+        Name of output file (not the sidecar itself).
+
+    Returns
+    -------
+    dict or None
+        Contents of the sidecar, or None if there isn't one.
+    """
+    sidecar = sidecar_filename(filename)
+    if not os.path.isfile(sidecar):
+        return None
+    with open(sidecar) as f:
+        return json.load(f)
+
+
+def get_n_events(filename):
+    """Get the number of events in a file from its sidecar, without opening
+    the file itself.
+
+    Parameters
+    ----------
+    filename : str
+        Name of output file.
+
+    Returns
+    -------
+    int or None
+        Number of events, or None if there is no sidecar.
+    """
+    metadata = read_sidecar(filename)
+    if metadata is None:
+        return None
+    return metadata['nEvents']
+
+
+def group_by_events(filenames, events_per_group):
+    """Split files into groups with up to events_per_group events each,
+    using the number of events in each file's sidecar.
+
+    Files are kept in order. A file with more events than events_per_group
+    gets its own group, as does any file without a sidecar.
+
+    Parameters
+    ----------
+    filenames : list[str]
+        Files to group.
+    events_per_group : int
+        Maximum number of events per group.
+
+    Returns
+    -------
+    list[list[str]]
+        Groups of filenames.
+    """
+    groups = []
+    current, current_events = [], 0
+    for filename in filenames:
+        n_events = get_n_events(filename)
+        if n_events is None:
+            if current:
+                groups.append(current)
+                current, current_events = [], 0
+            groups.append([filename])
+            continue
+        if current and current_events + n_events > events_per_group:
+            groups.append(current)
+            current, current_events = [], 0
+        current.append(filename)
+        current_events += n_events
+    if current:
+        groups.append(current)
+    return groups
+
+
+def bgzf_index_filename(filename):
+    """Get the name of the event index file for a BGZF file.
+
+    >>> bgzf_index_filename('out.hepmc.gz')
+    out.hepmc.gz.idx
+    """
+    return filename + '.idx'
+
+
+def read_bgzf_index(index_filename):
+    """Read the event index for a BGZF file written by generateMC --bgzf.
+
+    Parameters
+    ----------
+    index_filename : str
+        Name of index file.
+
+    Returns
+    -------
+    dict
+        With keys:
+        'events': list of (event number, virtual offset) for indexed events,
+        'footer': virtual offset of the text after the last event,
+        'nEvents': total number of events.
+    """
+    index = {'events': [], 'footer': None, 'nEvents': None}
+    with open(index_filename) as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            if parts[0] == 'event':
+                index['events'].append((int(parts[1]), int(parts[2])))
+            elif parts[0] == 'footer':
+                index['footer'] = int(parts[1])
+            elif parts[0] == 'nEvents':
+                index['nEvents'] = int(parts[1])
+    return index
+
+
+@contextmanager
+def open_bgzf_at(filename, virtual_offset):
+    """Open a BGZF file for reading, starting at a virtual offset
+    (e.g. from read_bgzf_index), without decompressing what comes before.
+
+    Parameters
+    ----------
+    filename : str
+        Name of BGZF file.
+    virtual_offset : int
+        (compressed offset of block << 16) | offset in uncompressed block
+
+    For example:
+    >>> index = read_bgzf_index(bgzf_index_filename('out.hepmc.gz'))
+    >>> with open_bgzf_at('out.hepmc.gz', index['events'][5][1]) as f:
+    ...     print f.readline()
+    """
+    with open(filename, 'rb') as raw:
+        raw.seek(virtual_offset >> 16)
+        gz = gzip.GzipFile(fileobj=raw, mode='rb')
+        gz.read(virtual_offset & 0xffff)
+        yield gz
+
+
+# How events are laid out in each text event format: the start of the
+# first line of each event, the start of the first line after all events,
+# and the standard text after all events.
+EVENT_FORMATS = {
+    'hepmc': {'event_start': 'E ',
+              'footer_start': 'HepMC::IO_GenEvent-END',
+              'footer': 'HepMC::IO_GenEvent-END_EVENT_LISTING\n\n'},
+    'lhe': {'event_start': '<event',
+            'footer_start': '</LesHouchesEvents>',
+            'footer': '</LesHouchesEvents>\n'}
+}
+
+
+def get_event_format(filename):
+    """Get the event format (hepmc, lhe) of a file from its name.
+
+    Raises
+    ------
+    RuntimeError
+        If the format is not recognised.
+    """
+    parts = os.path.basename(filename).lower().split('.')
+    for fmt, exts in [('hepmc', ['hepmc']), ('lhe', ['lhe', 'lhef'])]:
+        if any(ext in parts for ext in exts):
+            return fmt
+    raise RuntimeError('Cannot determine event format of %s' % filename)
+
+
+def extract_event_range(filename, first, last, output, fmt=None):
+    """Write events [first, last) of a HepMC/LHE file to a new uncompressed
+    file, keeping the header and footer so it is a valid file on its own.
+
+    Streams through the file, so works with any file (zipped or not),
+    but has to decompress everything up to the last event.
+
+    Parameters
+    ----------
+    filename : str
+        Input file, can be gzipped.
+    first : int
+        Index of first event to keep (from 0).
+    last : int
+        Index of event after the last one to keep.
+    output : str
+        Output filename.
+    fmt : str, optional
+        Event format (hepmc, lhe). If None, determined from filename.
+
+    Returns
+    -------
+    int
+        Number of events written.
+    """
+    layout = EVENT_FORMATS[fmt or get_event_format(filename)]
+    opener = gzip.open if filename.endswith('.gz') else open
+    i_event = -1
+    n_written = 0
+    with opener(filename, 'rb') as fin, open(output, 'wb') as fout:
+        for line in fin:
+            if line.startswith(layout['footer_start']):
+                break
+            if line.startswith(layout['event_start']):
+                i_event += 1
+                if i_event >= last:
+                    break
+                if i_event >= first:
+                    n_written += 1
+            # i_event < 0 is the header
+            if i_event < 0 or i_event >= first:
+                fout.write(line)
+        fout.write(layout['footer'])
+    return n_written
+
+
+def extract_bgzf_event_range(filename, index, first, last, output):
+    """Write events [first, last) of a BGZF file to a new gzip file, keeping
+    the header and footer, by copying the compressed blocks directly.
+
+    Much faster than extract_event_range, since nothing is decompressed.
+    first must be an indexed event, and last either an indexed event
+    or the total number of events.
+
+    Parameters
+    ----------
+    filename : str
+        BGZF file, written by generateMC --bgzf.
+    index : dict
+        Event index for the file, from read_bgzf_index.
+    first : int
+        Index of first event to keep (from 0).
+    last : int
+        Index of event after the last one to keep.
+    output : str
+        Output filename.
+
+    Raises
+    ------
+    ValueError
+        If first or last are not in the index.
+    """
+    offsets = dict(index['events'])
+    offsets[index['nEvents']] = index['footer']
+    if first not in offsets or last not in offsets or not index['events']:
+        raise ValueError('Event range %d-%d not in index' % (first, last))
+
+    # Indexed events always start a block, so only need the block offsets
+    def block_offset(virtual_offset):
+        return virtual_offset >> 16
+
+    header_end = block_offset(index['events'][0][1])
+    ranges = [(0, header_end),
+              (block_offset(offsets[first]), block_offset(offsets[last])),
+              (block_offset(index['footer']), None)]
+    chunk_size = 1024 * 1024
+    with open(filename, 'rb') as fin, open(output, 'wb') as fout:
+        for start, end in ranges:
+            fin.seek(start)
+            remaining = end - start if end is not None else None
+            while remaining is None or remaining > 0:
+                size = chunk_size if remaining is None else min(chunk_size, remaining)
+                data = fin.read(size)
+                if not data:
+                    break
+                fout.write(data)
+                if remaining is not None:
+                    remaining -= len(data)
+
+
+def split_event_ranges(n_events, events_per_chunk, index=None):
+    """Split a file's events into ranges of about events_per_chunk events.
+
+    If the file has a BGZF index, the ranges start at indexed events,
+    so they can be extracted with extract_bgzf_event_range.
+
+    Parameters
+    ----------
+    n_events : int
+        Total number of events in file.
+    events_per_chunk : int
+        Target number of events per range.
+    index : dict, optional
+        BGZF event index for the file, from read_bgzf_index.
+
+    Returns
+    -------
+    list[(int, int)]
+        (first, last) for each range, with last not included.
+    """
+    if index and len(index['events']) > 1:
+        interval = index['events'][1][0] - index['events'][0][0]
+        events_per_chunk = max(interval, (events_per_chunk // interval) * interval)
+    return [(first, min(first + events_per_chunk, n_events))
+            for first in range(0, n_events, events_per_chunk)]
@@ -0,0 +1,727 @@
+#!/usr/bin/env python
+"""
+Make plots comparing samples, e.g. different masses, as set out in a
+JSON (or YAML) config file:
+
+{
+    "samples": {
+        "h125_ma4": {"files": "8TeV/ggh125_2a_4tau_ma1_4_*.root",
+                     "label": "m_{a} = 4 GeV", "color": "kGreen+3"},
+        ...
+    },
+    "plots": [
+        {"tree": "hVars", "var": "hPt", "nbins": 50, "xlim": [0, 200],
+         "xtitle": "H p_{T} [GeV]", "ytitle": "p.d.f.", "title": "..."},
+        {"var": "bbDr", "xlim": [0, 1.5], ...},
+        ...
+    ],
+    "comparisons": [
+        {"samples": ["h125_ma4", "h125_ma8"], "dir": "8TeV/mh125_ma4vs8"},
+        ...
+    ]
+}
+
+- "files" can be a filename, glob, or list of them, relative to the config
+  file. Histograms from all the files of a sample are added together.
+- Plots with a "tree" are filled from that tree's branch "var", weighted by
+  its "weight" branch if it has one, using the cached arrays from
+  tree_cache.py. "var" can also be an expression of branches, and an optional
+  "selection" (e.g. "abs(hEta) < 2.4") picks which entries to fill, see
+  hist_cache.evaluate. Filled histograms are cached by hist_cache.py, so
+  re-running with only cosmetic changes doesn't fill them again.
+  Plots without a tree use the histogram called "var" in each file, drawn
+  over "xlim" if given.
+- Plots can set a "name", used for the output files and to select it on
+  the command line. The default is "var", so plots of the same var (e.g.
+  with different selections or binning) need different names.
+- Any plot field missing, except "name", is taken from "plotDefaults".
+- Comparisons can also set "name" (to select it on the command line),
+  "output" (filename without extension, default is the plot name; with
+  more than one plot, files are <output>_<plot name>),
+  "legend" ([x1, y1, x2, y2]), "canvas" ([width, height]),
+  "drawOpt", and "fillAlpha" (to fill histograms as well).
+
+Files are only found and opened when a comparison needs them, and only a
+limited number of ROOT files are held open at once. With --jobs N, the
+comparisons are drawn in N processes, each with its own ROOT.
+
+Plots are only made again if they are out of date: what each one depends on
+(input files & their checksums, its settings, and the plotting code) is
+recorded in .plots_<comparison name>.json in its directory. So adding a file
+to one sample only remakes the plots using that sample. Use --force to make
+all the plots regardless.
+
+With --accumDir DIR, the histograms for each sample are kept in persistent
+accumulators (see hist_accumulator.py) in DIR, which record the files they
+include. Then when files are added to a sample, only the new files are
+filled and added. If a file is removed from a sample or changed, its
+accumulators are made again from scratch.
+
+    ./compare_plots.py config.json [--comparisons NAME ...] [--plots VAR ...]
+                       [--format pdf png] [--jobs N] [--accumDir DIR]
+"""
+
+
+import os
+import sys
+import json
+import glob
+import time
+import hashlib
+import argparse
+import logging
+from multiprocessing import Pool
+from collections import namedtuple, OrderedDict
+import numpy as np
+import tree_cache
+import hist_cache
+import hist_accumulator
+
+
+logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+# Handy structure to hold info about a plot.
+# tree is None for plots of histograms stored in the files.
+Plot = namedtuple('Plot', 'name tree var nbins xlim xtitle ytitle title selection')
+
+COMPARISON_DEFAULTS = {
+    'legend': [0.45, 0.7, 0.85, 0.88],
+    'canvas': [800, 600],
+    'drawOpt': 'NOSTACK HISTE',
+    'fillAlpha': None,
+    'output': None,
+}
+
+
+_code_version = None
+
+
+def code_version():
+    """Get a hash of the plotting code, i.e. this module, tree_cache, hist_cache
+    and hist_accumulator."""
+    global _code_version
+    if _code_version is None:
+        sha = hashlib.sha1()
+        for module in [sys.modules[__name__], tree_cache, hist_cache, hist_accumulator]:
+            source = os.path.splitext(module.__file__)[0] + '.py'
+            with open(source) as f:
+                sha.update(f.read())
+        _code_version = sha.hexdigest()
+    return _code_version
+
+
+def get_root():
+    """Import ROOT, set up for batch plotting. Only done when first needed,
+    so that loading a config, or using cached arrays, doesn't need it."""
+    import ROOT
+    ROOT.PyConfig.IgnoreCommandLineOptions = True
+    ROOT.gROOT.SetBatch(1)
+    ROOT.gStyle.SetOptStat(0)
+    ROOT.gStyle.SetLegendBorderSize(0)
+    ROOT.TH1.SetDefaultSumw2(True)
+    return ROOT
+
+
+def parse_color(color):
+    """Convert a color to a ROOT color number.
+
+    Parameters
+    ----------
+    color : int or str
+        Color number, or name of a ROOT color with an optional offset,
+        e.g. "kGreen+3", "kViolet-2"
+
+    Returns
+    -------
+    int
+    """
+    if isinstance(color, int):
+        return color
+    ROOT = get_root()
+    for sign in ['+', '-']:
+        if sign in color:
+            name, offset = color.split(sign)
+            value = getattr(ROOT, name.strip())
+            return value + int(offset) if sign == '+' else value - int(offset)
+    return getattr(ROOT, color.strip())
+
+
+def load_config(filename):
+    """Load a JSON or YAML (.yaml, .yml) config file.
+
+    Raises
+    ------
+    ImportError
+        If the config is YAML but PyYAML isn't installed.
+    """
+    with open(filename) as f:
+        if os.path.splitext(filename)[1] in ['.yaml', '.yml']:
+            import yaml
+            return yaml.safe_load(f)
+        return json.load(f, object_pairs_hook=OrderedDict)
+
+
+class FileCache(object):
+    """Keep a limited number of ROOT files open, closing the least
+    recently used one when needed.
+
+    Parameters
+    ----------
+    max_open : int
+        Maximum number of files open at once.
+    """
+
+    def __init__(self, max_open=20):
+        self.max_open = max_open
+        self._files = OrderedDict()
+
+    def get(self, filename):
+        """Get an open TFile."""
+        if filename in self._files:
+            rf = self._files.pop(filename)
+        else:
+            ROOT = get_root()
+            rf = ROOT.TFile(filename, 'READ')
+            if not rf or rf.IsZombie():
+                raise IOError('Cannot open file %s' % filename)
+            while len(self._files) >= self.max_open:
+                self._files.popitem(last=False)[1].Close()
+        self._files[filename] = rf  # most recently used is last
+        return rf
+
+    def close(self):
+        for rf in self._files.values():
+            rf.Close()
+        self._files.clear()
+
+
+class Sample(object):
+    """A sample, i.e. a set of files that are plotted together.
+
+    Parameters
+    ----------
+    name : str
+        Name of sample in the config.
+    config : dict
+        Sample config: files, label, color, linestyle (optional).
+    base_dir : str
+        Directory that file paths are relative to.
+    """
+
+    def __init__(self, name, config, base_dir):
+        self.name = name
+        self.label = config.get('label', name)
+        self.color = config.get('color', 1)
+        self.linestyle = config.get('linestyle', 1)
+        patterns = config['files']
+        self._patterns = [patterns] if isinstance(patterns, basestring) else patterns
+        self._base_dir = base_dir
+        self._files = None
+
+    @property
+    def files(self):
+        """Filenames, found from the patterns when first used."""
+        if self._files is None:
+            self._files = []
+            for pattern in self._patterns:
+                matches = sorted(glob.glob(os.path.join(self._base_dir, pattern)))
+                if not matches:
+                    raise IOError('No files match %s for sample %s' % (pattern, self.name))
+                self._files.extend(matches)
+        return self._files
+
+
+class PlotComparer(object):
+    """Make comparison plots from a config.
+
+    Histograms are only filled for the samples & plots that are drawn,
+    and each is only filled once. For tree plots, all the plots using a tree
+    are filled together, so each tree in each file is read once.
+
+    Parameters
+    ----------
+    config : dict
+        Loaded config.
+    base_dir : str
+        Directory that paths in the config are relative to.
+    max_open : int, optional
+        Maximum number of ROOT files open at once.
+    use_hist_cache : bool, optional
+        Get filled histograms from, and save them to, the histogram cache.
+    accum_dir : str, optional
+        Directory for histogram accumulators. If set, only the files not
+        already in a sample's accumulators are filled.
+    """
+
+    def __init__(self, config, base_dir='.', max_open=20, use_hist_cache=True, accum_dir=None):
+        self.config = config
+        self.base_dir = base_dir
+        self.use_hist_cache = use_hist_cache
+        self.accum_dir = accum_dir
+        self.hist_cache = hist_cache.HistCache()
+        # number of files added to, and already in, the accumulators
+        self.n_accum_added = 0
+        self.n_accum_skipped = 0
+        # samples starting with #, !, _ are ignored, like comments
+        self.samples = {name: Sample(name, s, base_dir)
+                        for name, s in config['samples'].iteritems()
+                        if name[0] not in ['#', '!', '_']}
+        defaults = config.get('plotDefaults', {})
+        self.plots = []
+        for p in config['plots']:
+            fields = dict(defaults)
+            fields.update(p)
+            fields['name'] = p.get('name') or fields.get('var')
+            if fields['name'] in [plot.name for plot in self.plots]:
+                raise ValueError('More than one plot called %s, give them different "name"s'
+                                 % fields['name'])
+            self.plots.append(Plot(**{f: fields.get(f) for f in Plot._fields}))
+        self.comparisons = []
+        for comp in config['comparisons']:
+            settings = dict(COMPARISON_DEFAULTS)
+            settings.update(comp)
+            settings.setdefault('name', settings.get('dir', '.'))
+            settings.setdefault('dir', '.')
+            for name in settings['samples']:
+                if name not in self.samples:
+                    raise KeyError('Unknown sample %s in comparison %s' % (name, settings['name']))
+            settings['dir'] = os.path.join(base_dir, settings['dir'])
+            self.comparisons.append(settings)
+        self.file_cache = FileCache(max_open)
+        self._tree_hists = {}
+
+    def get_hist(self, sample, plot, name):
+        """Get the histogram for a plot from a sample, filling it if needed.
+
+        Returns
+        -------
+        ROOT.TH1
+            A new histogram, owned by python.
+        """
+        h_title = ';'.join([plot.title or '', plot.xtitle or '', plot.ytitle or ''])
+        if plot.tree is None:
+            h = None
+            for filename in sample.files:
+                h_file = self.file_cache.get(filename).Get(plot.var)
+                if not h_file:
+                    raise KeyError('No histogram %s in file %s' % (plot.var, filename))
+                if h is None:
+                    h = h_file.Clone(name)
+                    h.SetDirectory(0)  # otherwise TFile owns it
+                else:
+                    h.Add(h_file)
+            h.SetTitle(h_title)
+            return h
+
+        key = self.hist_key(sample, plot)
+        if key not in self._tree_hists:
+            self.fill_tree(sample, plot.tree)
+        counts, sumw2 = self._tree_hists[key]
+        return tree_cache.make_th1(name, h_title, counts, sumw2, plot.nbins, plot.xlim)
+
+    @staticmethod
+    def hist_key(sample, plot):
+        """Get the key for a filled tree plot histogram. Plots of the same var
+        with different binning are different histograms."""
+        return (sample.name, plot.tree, plot.var, plot.nbins, tuple(plot.xlim), plot.selection)
+
+    def fill_tree(self, sample, tree_name):
+        """Fill all the plots that use a tree, for a sample. Plots that only
+        differ in their titles share a histogram, so are only filled once."""
+        tree_plots = OrderedDict()
+        for p in self.plots:
+            if p.tree == tree_name:
+                tree_plots.setdefault(self.hist_key(sample, p), p)
+        tree_plots = tree_plots.values()
+        selections = OrderedDict.fromkeys(p.selection for p in tree_plots)
+        if self.accum_dir:
+            self.fill_tree_accumulated(sample, tree_plots, selections)
+            return
+        for filename in sample.files:
+            filled = []
+            for selection in selections:
+                sel_plots = [p for p in tree_plots if p.selection == selection]
+                filled.extend(zip(sel_plots, self.fill_file(filename, tree_name,
+                                                            sel_plots, selection)))
+            for plot, (counts, sumw2) in filled:
+                key = self.hist_key(sample, plot)
+                if key in self._tree_hists:
+                    counts = counts + self._tree_hists[key][0]
+                    sumw2 = sumw2 + self._tree_hists[key][1]
+                self._tree_hists[key] = (counts, sumw2)
+
+    def fill_tree_accumulated(self, sample, tree_plots, selections):
+        """Fill plots using a tree for a sample, only filling the files that
+        aren't already in their accumulators."""
+        cache = self.hist_cache if self.use_hist_cache else None
+        for selection in selections:
+            sel_plots = [p for p in tree_plots if p.selection == selection]
+            accs = [self.get_accumulator(sample, p) for p in sel_plots]
+            n_added = 0
+            for filename in sample.files:
+                todo = [acc for acc in accs if not acc.includes(filename)]
+                while todo:
+                    try:
+                        hist_accumulator.HistAccumulator.add_files(todo, filename, cache)
+                        n_added += 1
+                        break
+                    except hist_accumulator.AlreadyIncludedError:
+                        # another process added it to some of them first
+                        for acc in todo:
+                            acc.reload()
+                        todo = [acc for acc in todo if not acc.includes(filename)]
+            self.n_accum_added += n_added
+            self.n_accum_skipped += len(sample.files) - n_added
+            log.info('Added %d of %d files to accumulators for %s',
+                     n_added, len(sample.files), sample.name)
+            for plot, acc in zip(sel_plots, accs):
+                key = self.hist_key(sample, plot)
+                self._tree_hists[key] = (np.array(acc.counts), np.array(acc.sumw2))
+
+    def get_accumulator(self, sample, plot):
+        """Get the accumulator for a sample & tree plot, emptying it first if
+        it includes files that are no longer in the sample (or have changed).
+
+        Returns
+        -------
+        hist_accumulator.HistAccumulator
+        """
+        description = json.dumps([sample.name, plot.tree, plot.var, plot.nbins,
+                                  list(plot.xlim), plot.selection])
+        directory = os.path.join(self.accum_dir, '%s_%s' % (sample.name.replace('/', '_'),
+                                                            hashlib.sha1(description).hexdigest()))
+        args = (plot.tree, plot.var, plot.nbins, plot.xlim, plot.selection)
+        acc = hist_accumulator.HistAccumulator.open(directory, *args)
+        if acc.clear_unless_within(tree_cache.get_checksum(f) for f in sample.files):
+            log.warning('Files removed or changed in sample %s, emptied accumulator %s',
+                        sample.name, directory)
+        return acc
+
+    def fill_file(self, filename, tree_name, plots, selection):
+        """Fill plots with the same tree & selection from one file.
+
+        Returns
+        -------
+        list[(numpy.ndarray, numpy.ndarray)]
+            Sum of weights, and sum of weights squared, for each plot.
+        """
+        hists = [(p.var, p.nbins, p.xlim) for p in plots]
+        if self.use_hist_cache:
+            return self.hist_cache.get_hists(filename, tree_name, hists, selection)
+        return hist_cache.fill_hists(tree_cache.get_tree(filename, tree_name), hists, selection)
+
+    def plot_compare(self, comparison, plot, formats=('pdf',)):
+        """Plot a histogram for several samples on the same canvas and save.
+
+        Parameters
+        ----------
+        comparison : dict
+            Comparison settings from the config.
+        plot : Plot
+            Plot to make.
+        formats : list[str], optional
+            Output formats for plot files, all saved from the same canvas.
+        """
+        ROOT = get_root()
+        plot_dir = comparison['dir']
+        unique_name = '%s_%s' % (comparison['name'].replace("/", "_"), plot.name)
+        c = ROOT.TCanvas("c_%s" % unique_name, '', *comparison['canvas'])
+        c.SetTicks(1, 1)
+
+        h_title = ';'.join([plot.title or '', plot.xtitle or '', plot.ytitle or ''])
+        hst = ROOT.THStack('hst_%s' % unique_name, plot.title or '')
+        leg = ROOT.TLegend(*comparison['legend'])
+        leg.SetFillStyle(0)
+        leg.SetLineWidth(0)
+
+        leg_opt = 'L'
+        for i, name in enumerate(comparison['samples']):
+            sample = self.samples[name]
+            h = self.get_hist(sample, plot, '%s_%d' % (unique_name, i))
+            color = parse_color(sample.color)
+            h.SetLineColor(color)
+            h.SetLineStyle(sample.linestyle)
+            if comparison['fillAlpha'] is not None:
+                h.SetFillColorAlpha(color, comparison['fillAlpha'])
+                leg_opt = 'LF'
+            if plot.tree is None and plot.xlim:
+                h.SetAxisRange(plot.xlim[0], plot.xlim[1], 'X')
+            if h.Integral() > 0:
+                h.Scale(1. / h.Integral())
+            hst.Add(h)
+            leg.AddEntry(h, sample.label, leg_opt)
+        hst.Draw(comparison['drawOpt'])
+        leg.Draw()
+        h_draw = hst.GetHistogram()
+        h_draw.GetXaxis().SetTitleOffset(1.1)
+        h_draw.GetYaxis().SetTitleOffset(1.3)
+        if plot.tree is None and plot.xlim:
+            h_draw.SetAxisRange(plot.xlim[0], plot.xlim[1], 'X')
+        h_draw.SetTitle(h_title)
+        if not os.path.isdir(plot_dir):
+            os.makedirs(plot_dir)
+        for output in self.output_filenames(comparison, plot, formats):
+            c.SaveAs(output)
+        c.Close()
+
+    def output_filenames(self, comparison, plot, formats):
+        """Get the output filenames for a plot, one per format.
+
+        The stem is the plot name, or the comparison's "output" if set. If the
+        config has more than one plot, "output" is a prefix, <output>_<name>,
+        so the plots don't overwrite each other.
+        """
+        stem = plot.name
+        if comparison['output']:
+            stem = comparison['output']
+            if len(self.plots) > 1:
+                stem += '_' + plot.name
+        return [os.path.join(comparison['dir'], '%s.%s' % (stem, fmt)) for fmt in formats]
+
+    def dependency_hash(self, comparison, plot):
+        """Get a hash of everything a plot depends on: the input files
+        (names & checksums), the plot, comparison & sample settings, and the
+        plotting code. If it changes, the plot needs to be made again.
+
+        Returns
+        -------
+        str
+        """
+        samples = []
+        for name in comparison['samples']:
+            sample = self.samples[name]
+            samples.append([name, sample.label, sample.color, sample.linestyle,
+                            [[f, tree_cache.get_checksum(f)] for f in sample.files]])
+        settings = {k: v for k, v in comparison.iteritems() if k != 'name'}
+        description = json.dumps([plot._asdict(), settings, samples, code_version()],
+                                 sort_keys=True)
+        return hashlib.sha1(description).hexdigest()
+
+    def manifest_filename(self, comparison):
+        """Get the file that records what each plot of a comparison depends on."""
+        return os.path.join(comparison['dir'],
+                            '.plots_%s.json' % comparison['name'].replace('/', '_'))
+
+    def read_manifest(self, comparison):
+        """Read the dependency hash for each output file of a comparison.
+
+        Returns
+        -------
+        dict
+            Hash for each output filename, empty if there is no manifest.
+        """
+        filename = self.manifest_filename(comparison)
+        if not os.path.isfile(filename):
+            return {}
+        with open(filename) as f:
+            return json.load(f)
+
+    def write_manifest(self, comparison, manifest):
+        filename = self.manifest_filename(comparison)
+        tmp_name = filename + '.tmp'
+        with open(tmp_name, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.rename(tmp_name, filename)
+
+    def outdated_plots(self, i_comparison, plot_indices, formats):
+        """Get the plots of a comparison that need making, i.e. where an output
+        file is missing, or its dependencies have changed since it was made.
+
+        Returns
+        -------
+        list[int]
+            Indices of plots in self.plots
+        """
+        comparison = self.comparisons[i_comparison]
+        manifest = self.read_manifest(comparison)
+        outdated = []
+        for i_plot in plot_indices:
+            plot = self.plots[i_plot]
+            dep_hash = self.dependency_hash(comparison, plot)
+            for output in self.output_filenames(comparison, plot, formats):
+                if not os.path.isfile(output) or manifest.get(os.path.basename(output)) != dep_hash:
+                    outdated.append(i_plot)
+                    break
+        return outdated
+
+    def render(self, i_comparison, plot_indices, formats=('pdf',)):
+        """Make plots for one comparison, and record their dependencies.
+
+        Parameters
+        ----------
+        i_comparison : int
+            Index of comparison in self.comparisons.
+        plot_indices : list[int]
+            Indices of plots in self.plots to make.
+        formats : list[str], optional
+            Output formats for plot files.
+        """
+        comparison = self.comparisons[i_comparison]
+        start = time.time()
+        manifest = self.read_manifest(comparison)
+        for i_plot in plot_indices:
+            plot = self.plots[i_plot]
+            dep_hash = self.dependency_hash(comparison, plot)
+            self.plot_compare(comparison, plot, formats)
+            for output in self.output_filenames(comparison, plot, formats):
+                manifest[os.path.basename(output)] = dep_hash
+            self.write_manifest(comparison, manifest)
+        if self.accum_dir:
+            log.info('Made %d plots for %s in %.1f s (%d files added to accumulators, '
+                     '%d already included)', len(plot_indices), comparison['name'],
+                     time.time() - start, self.n_accum_added, self.n_accum_skipped)
+        else:
+            log.info('Made %d plots for %s in %.1f s (%d histograms from cache, %d filled)',
+                     len(plot_indices), comparison['name'], time.time() - start,
+                     self.hist_cache.n_hits, self.hist_cache.n_misses)
+
+    def run(self, comparisons=None, plots=None, formats=('pdf',), n_jobs=1, force=False):
+        """Make the plots for all the comparisons that are missing or out of date.
+
+        With n_jobs > 1, all the files with trees to plot are cached first,
+        and with accumulators, each sample's accumulators are brought up to
+        date (so two comparisons of the same sample don't both fill them),
+        then each comparison is drawn in a separate worker process. ROOT is
+        never imported in this process, so each worker has its own, and a
+        worker only handles one comparison before it is replaced, to limit
+        its memory use.
+
+        Parameters
+        ----------
+        comparisons : list[str], optional
+            Only make these comparisons (by name). Default is all.
+        plots : list[str], optional
+            Only make these plots (by name). Default is all.
+        formats : list[str], optional
+            Output formats for plot files.
+        n_jobs : int, optional
+            Number of processes to use.
+        force : bool, optional
+            Make all plots, even if they are up to date.
+        """
+        plot_indices = [i for i, p in enumerate(self.plots) if not plots or p.name in plots]
+        tasks = []
+        n_up_to_date = 0
+        for i, comp in enumerate(self.comparisons):
+            if comparisons and comp['name'] not in comparisons:
+                continue
+            todo = plot_indices if force else self.outdated_plots(i, plot_indices, formats)
+            n_up_to_date += len(plot_indices) - len(todo)
+            if todo:
+                tasks.append((i, todo))
+        log.info('%d plots up to date, %d to make', n_up_to_date,
+                 sum(len(todo) for _, todo in tasks))
+
+        if n_jobs == 1:
+            for i, todo in tasks:
+                self.render(i, todo, formats)
+            self.file_cache.close()
+            return
+
+        if any(self.plots[i_plot].tree for _, todo in tasks for i_plot in todo):
+            tree_files = OrderedDict()
+            for i, _ in tasks:
+                for name in self.comparisons[i]['samples']:
+                    tree_files.update((f, None) for f in self.samples[name].files)
+            start = time.time()
+            pool = Pool(n_jobs)
+            try:
+                pool.map(tree_cache.cache_file, tree_files.keys())
+            finally:
+                pool.close()
+                pool.join()
+            log.info('Cached %d files in %.1f s', len(tree_files), time.time() - start)
+
+            if self.accum_dir:
+                sample_trees = OrderedDict()
+                for i, todo in tasks:
+                    for name in self.comparisons[i]['samples']:
+                        sample_trees.update(((name, self.plots[i_plot].tree), None)
+                                            for i_plot in todo if self.plots[i_plot].tree)
+                start = time.time()
+                pool = Pool(n_jobs)
+                try:
+                    pool.map(_fill_accumulators,
+                             [(self.config, self.base_dir, self.use_hist_cache, self.accum_dir,
+                               name, tree) for name, tree in sample_trees])
+                finally:
+                    pool.close()
+                    pool.join()
+                log.info('Filled accumulators for %d samples & trees in %.1f s',
+                         len(sample_trees), time.time() - start)
+
+        pool = Pool(n_jobs, maxtasksperchild=1)
+        try:
+            pool.map(_render_comparison,
+                     [(self.config, self.base_dir, self.file_cache.max_open,
+                       self.use_hist_cache, self.accum_dir, i, todo, formats)
+                      for i, todo in tasks],
+                     chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+
+def _fill_accumulators(args):
+    """Fill the accumulators for a sample & tree in a worker process, for Pool.map"""
+    config, base_dir, use_hist_cache, accum_dir, sample_name, tree_name = args
+    comparer = PlotComparer(config, base_dir, use_hist_cache=use_hist_cache, accum_dir=accum_dir)
+    comparer.fill_tree(comparer.samples[sample_name], tree_name)
+
+
+def _render_comparison(args):
+    """Make the plots for a comparison in a worker process, for Pool.map"""
+    (config, base_dir, max_open, use_hist_cache, accum_dir,
+     i_comparison, plot_indices, formats) = args
+    comparer = PlotComparer(config, base_dir, max_open, use_hist_cache, accum_dir)
+    comparer.render(i_comparison, plot_indices, formats)
+    comparer.file_cache.close()
+
+
+def main(in_args=sys.argv[1:]):
+    """Make comparison plots from a config file."""
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('config',
+                        help='JSON or YAML config file')
+    parser.add_argument('--comparisons',
+                        nargs='+',
+                        help='Only make these comparisons, by name (or dir if no name)')
+    parser.add_argument('--plots',
+                        nargs='+',
+                        help='Only make these plots, by name (or var if no name)')
+    parser.add_argument('--format',
+                        nargs='+', default=['pdf'],
+                        help='Output format(s) for plots, e.g. pdf png')
+    parser.add_argument('--maxOpenFiles',
+                        type=int, default=20,
+                        help='Maximum number of ROOT files open at once (per process)')
+    parser.add_argument('--jobs',
+                        type=int, default=1,
+                        help='Number of processes to draw plots with')
+    parser.add_argument('--force',
+                        action='store_true',
+                        help='Make all plots, even ones that are up to date')
+    parser.add_argument('--noHistCache',
+                        action='store_true',
+                        help="Always fill histograms, don't use the histogram cache")
+    parser.add_argument('--accumDir',
+                        help='Directory for histogram accumulators, so only new files are filled')
+    args = parser.parse_args(in_args)
+
+    if args.jobs < 1:
+        parser.error('--jobs must be >= 1')
+
+    start = time.time()
+    config = load_config(args.config)
+    comparer = PlotComparer(config, os.path.dirname(args.config) or '.', args.maxOpenFiles,
+                            not args.noHistCache, args.accumDir)
+    comparer.run(args.comparisons, args.plots, args.format, args.jobs, args.force)
+    log.info('Total time: %.1f s', time.time() - start)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
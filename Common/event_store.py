@@ -0,0 +1,365 @@
+#!/usr/bin/env python
+"""
+Columnar event store, converted from HepMC files, for fast repeated analysis.
+
+Each HepMC file is converted once into a directory of .npy files: one per
+particle column (px, pdgid, ...), one per event column (weight, ...), and the
+offsets of each event's particles. Reopening a store memory-maps these files,
+so nothing is read until it is used, and studies run without any unzipping
+or text parsing.
+
+For example:
+>>> store = EventStore('store/out_seed1')
+>>> pt = np.hypot(store['px'], store['py'])  # all particles, all events
+>>> muons = store.event(10)  # particles in event 10, as a structured array
+
+or for all the files in a campaign:
+>>> for store in open_stores('store'):
+...     print store.n_events
+
+Convert files from the command line (in parallel over files):
+
+    ./event_store.py store/ /hdfs/.../*.hepmc.gz --columns px py pz e pdgid status --jobs 4
+"""
+
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+from multiprocessing import Pool
+import numpy as np
+from hepmc_reader import HepMCReader, PARTICLE_DTYPE, EVENT_DTYPE
+import common
+
+
+logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+# 'event' is not stored, since it is only the index within a batch;
+# the offsets give which event each particle belongs to.
+PARTICLE_COLUMNS = [c for c in PARTICLE_DTYPE.names if c != 'event']
+
+EVENT_COLUMNS = list(EVENT_DTYPE.names)
+
+STORE_INFO = 'store.json'
+
+# Size of the .npy header we write, so data can be written before the number
+# of entries is known. Must be a multiple of 16 for the data to be aligned.
+NPY_HEADER_SIZE = 128
+
+
+def _npy_header(dtype, n_entries):
+    """Make a .npy (version 1.0) header of length NPY_HEADER_SIZE
+    for a 1D array."""
+    header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" \
+             % (np.lib.format.dtype_to_descr(dtype), n_entries)
+    preamble = np.lib.format.MAGIC_PREFIX + '\x01\x00'
+    n_pad = NPY_HEADER_SIZE - len(preamble) - 2 - len(header) - 1
+    if n_pad < 0:
+        raise RuntimeError('.npy header too long for %s' % dtype)
+    header += ' ' * n_pad + '\n'
+    return preamble + np.uint16(len(header)).astype('<u2').tobytes() + header
+
+
+class ColumnWriter(object):
+    """Write a 1D .npy file in pieces, without knowing its length in advance.
+
+    Parameters
+    ----------
+    filename : str
+        Output .npy filename.
+    dtype : numpy.dtype
+        Type of the column.
+    """
+
+    def __init__(self, filename, dtype):
+        self.filename = filename
+        self.dtype = np.dtype(dtype)
+        self.n_entries = 0
+        self._file = open(filename, 'wb')
+        self._file.write(_npy_header(self.dtype, 0))
+
+    def write(self, values):
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        self._file.write(values.tobytes())
+        self.n_entries += len(values)
+
+    def close(self):
+        """Write the final header, and close the file."""
+        self._file.seek(0)
+        self._file.write(_npy_header(self.dtype, self.n_entries))
+        self._file.close()
+
+
+def store_directory(filename, out_dir):
+    """Get the store directory for a HepMC file, i.e. <out_dir>/<filename without .hepmc(.gz)>"""
+    stem = common.strip_extensions(os.path.basename(filename), ['.gz', '.hepmc'])
+    return os.path.join(out_dir, stem)
+
+
+def convert_hepmc(filename, out_dir, columns=None, status=None, pdgid=None,
+                  batch_size=10000):
+    """Convert a HepMC file into a columnar store.
+
+    Parameters
+    ----------
+    filename : str
+        HepMC file, can be gzipped.
+    out_dir : str
+        The store is made in <out_dir>/<file stem>.
+    columns : list[str], optional
+        Particle columns to store, from PARTICLE_COLUMNS. Default is all.
+        Event columns are always all stored.
+    status : list[int], optional
+        Only store particles with one of these statuses.
+    pdgid : list[int], optional
+        Only store particles with one of these PDGIDs (and antiparticles).
+    batch_size : int, optional
+        Number of events to read at a time. Sets the memory use.
+
+    Returns
+    -------
+    str
+        Store directory.
+
+    Raises
+    ------
+    KeyError
+        If a column is not a particle column.
+    """
+    columns = columns or PARTICLE_COLUMNS
+    for col in columns:
+        if col not in PARTICLE_COLUMNS:
+            raise KeyError('Unknown particle column %s, must be one of %s'
+                           % (col, ', '.join(PARTICLE_COLUMNS)))
+    store_dir = store_directory(filename, out_dir)
+    common.check_create_dir(store_dir)
+    # remove old info first, so a failed conversion doesn't look complete
+    info_filename = os.path.join(store_dir, STORE_INFO)
+    if os.path.isfile(info_filename):
+        os.remove(info_filename)
+
+    start = time.time()
+    writers = {}
+    for col in columns:
+        writers['particles_' + col] = ColumnWriter(
+            os.path.join(store_dir, 'particles_%s.npy' % col), PARTICLE_DTYPE[col])
+    for col in EVENT_COLUMNS:
+        writers['events_' + col] = ColumnWriter(os.path.join(store_dir, 'events_%s.npy' % col),
+                                                EVENT_DTYPE[col])
+    offsets = ColumnWriter(os.path.join(store_dir, 'offsets.npy'), np.int64)
+    offsets.write([0])
+
+    reader = HepMCReader(filename, batch_size=batch_size, status=status, pdgid=pdgid)
+    for batch in reader:
+        for col in columns:
+            writers['particles_' + col].write(batch.particles[col])
+        for col in EVENT_COLUMNS:
+            writers['events_' + col].write(batch.events[col])
+        # offsets in the batch start at 0, so shift by the particles so far
+        n_particles = writers['particles_' + columns[0]].n_entries - len(batch.particles)
+        offsets.write(batch.offsets[1:] + n_particles)
+    for writer in writers.values() + [offsets]:
+        writer.close()
+
+    n_particles = writers['particles_' + columns[0]].n_entries
+    info = {
+        'source': os.path.abspath(filename),
+        'particleColumns': list(columns),
+        'eventColumns': EVENT_COLUMNS,
+        'nEvents': reader.n_events,
+        'nParticles': n_particles,
+        'status': status,
+        'pdgid': pdgid,
+    }
+    with open(info_filename, 'w') as f:
+        json.dump(info, f, indent=2, sort_keys=True)
+    log.info('Converted %s: %d events, %d particles in %.1f s',
+             filename, reader.n_events, n_particles, time.time() - start)
+    return store_dir
+
+
+def _convert_hepmc_star(args):
+    """Unpack args for convert_hepmc, for use with Pool.imap"""
+    filename, kwargs = args
+    return convert_hepmc(filename, **kwargs)
+
+
+def convert_files(filenames, out_dir, n_jobs=1, **kwargs):
+    """Convert several HepMC files, in parallel over files.
+
+    Parameters
+    ----------
+    filenames : list[str]
+        HepMC files to convert.
+    out_dir : str
+        Directory to make the stores in.
+    n_jobs : int, optional
+        Number of files to convert at once.
+    **kwargs
+        Passed to convert_hepmc.
+
+    Returns
+    -------
+    list[str]
+        Store directories, in the same order as filenames.
+
+    Raises
+    ------
+    RuntimeError
+        If two files would make the same store directory.
+    """
+    store_dirs = [store_directory(f, out_dir) for f in filenames]
+    if len(set(store_dirs)) != len(store_dirs):
+        raise RuntimeError('Files have the same stem, cannot store them in the same directory')
+    kwargs['out_dir'] = out_dir
+    if n_jobs == 1:
+        return [convert_hepmc(f, **kwargs) for f in filenames]
+    pool = Pool(n_jobs)
+    try:
+        return pool.map(_convert_hepmc_star, [(f, kwargs) for f in filenames])
+    finally:
+        pool.close()
+        pool.join()
+
+
+class EventStore(object):
+    """A columnar event store, made by convert_hepmc.
+
+    Columns are memory-mapped read-only when first used, so opening a store
+    is cheap, and only the columns used are ever read from disk.
+
+    Parameters
+    ----------
+    store_dir : str
+        Store directory.
+
+    Attributes
+    ----------
+    info : dict
+        Contents of store.json: source file, columns, number of events, etc.
+    offsets : numpy.ndarray
+        Particles for event i are [offsets[i]:offsets[i + 1]] of each particle column.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        info_filename = os.path.join(store_dir, STORE_INFO)
+        if not os.path.isfile(info_filename):
+            raise IOError('%s is not a complete event store' % store_dir)
+        with open(info_filename) as f:
+            self.info = json.load(f)
+        self._columns = {}
+        self.offsets = self._load('offsets')
+
+    @property
+    def n_events(self):
+        return self.info['nEvents']
+
+    @property
+    def n_particles(self):
+        return self.info['nParticles']
+
+    @property
+    def particle_columns(self):
+        return self.info['particleColumns']
+
+    def _load(self, name):
+        if name not in self._columns:
+            self._columns[name] = np.load(os.path.join(self.store_dir, name + '.npy'),
+                                          mmap_mode='r')
+        return self._columns[name]
+
+    def __getitem__(self, column):
+        """Get a particle column for all events, e.g. store['px']"""
+        if column not in self.particle_columns:
+            raise KeyError('No particle column %s in %s' % (column, self.store_dir))
+        return self._load('particles_' + column)
+
+    def events(self, column):
+        """Get an event column, e.g. store.events('weight')"""
+        if column not in EVENT_COLUMNS:
+            raise KeyError('No event column %s' % column)
+        return self._load('events_' + column)
+
+    def event_index(self):
+        """Get the index of the event each particle belongs to.
+
+        Useful for per-event sums, e.g. np.bincount(store.event_index(), pt).
+        """
+        return np.repeat(np.arange(self.n_events), np.diff(self.offsets))
+
+    def event(self, i, columns=None):
+        """Get the particles in event i, as a structured array.
+
+        Parameters
+        ----------
+        i : int
+            Event index.
+        columns : list[str], optional
+            Columns to include. Default is all stored columns.
+        """
+        columns = columns or self.particle_columns
+        start, end = self.offsets[i], self.offsets[i + 1]
+        particles = np.empty(end - start, dtype=[(c, PARTICLE_DTYPE[c]) for c in columns])
+        for col in columns:
+            particles[col] = self[col][start:end]
+        return particles
+
+
+def open_stores(out_dir):
+    """Open all the complete stores in a directory.
+
+    Parameters
+    ----------
+    out_dir : str
+        Directory the stores were made in.
+
+    Returns
+    -------
+    list[EventStore]
+        Stores, sorted by directory name.
+    """
+    return [EventStore(os.path.join(out_dir, d)) for d in sorted(os.listdir(out_dir))
+            if os.path.isfile(os.path.join(out_dir, d, STORE_INFO))]
+
+
+def main(in_args=sys.argv[1:]):
+    """Convert HepMC files to columnar stores."""
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('outDir',
+                        help='Directory to make the stores in')
+    parser.add_argument('inputs', nargs='+',
+                        help='HepMC files to convert')
+    parser.add_argument('--columns',
+                        nargs='+', choices=PARTICLE_COLUMNS,
+                        help='Particle columns to store. Default is all.')
+    parser.add_argument('--status',
+                        type=int, nargs='+',
+                        help='Only store particles with these statuses')
+    parser.add_argument('--pdgid',
+                        type=int, nargs='+',
+                        help='Only store particles with these PDGIDs')
+    parser.add_argument('--batchSize',
+                        type=int, default=10000,
+                        help='Number of events to read at a time')
+    parser.add_argument('--jobs',
+                        type=int, default=1,
+                        help='Number of files to convert in parallel')
+    args = parser.parse_args(in_args)
+
+    if args.jobs < 1:
+        parser.error('--jobs must be >= 1')
+
+    convert_files(args.inputs, args.outDir, n_jobs=args.jobs, columns=args.columns,
+                  status=args.status, pdgid=args.pdgid, batch_size=args.batchSize)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
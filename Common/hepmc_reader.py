@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+"""
+Streaming reader for HepMC2 IO_GenEvent files (e.g. from generateMC --hepmc),
+which can be gzipped. Events are returned in batches, with the particles as
+NumPy structured arrays, so memory use is set by the batch size, not the file.
+
+For example:
+>>> reader = HepMCReader('out.hepmc.gz', batch_size=1000, status=[1], pdgid=[13])
+>>> for batch in reader:
+...     muons = batch.particles
+...     pt = np.hypot(muons['px'], muons['py'])
+...     for event in batch:  # per-event particle tables
+...         print len(event)
+
+Can also be run as a script to benchmark reading speed, optionally against
+the time for DelphesHepMC to process the same file:
+
+    ./hepmc_reader.py out.hepmc.gz [--delphes <DelphesHepMC> --card <card>]
+"""
+
+
+import os
+import sys
+import gzip
+import time
+import argparse
+import logging
+import tempfile
+from subprocess import check_call
+import numpy as np
+
+
+logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+PARTICLE_DTYPE = np.dtype([('event', np.int32),  # index of event in batch
+                           ('barcode', np.int32),
+                           ('pdgid', np.int32),
+                           ('px', np.float64),
+                           ('py', np.float64),
+                           ('pz', np.float64),
+                           ('e', np.float64),
+                           ('m', np.float64),
+                           ('status', np.int32),
+                           ('prod_vertex', np.int32),  # 0 if none
+                           ('end_vertex', np.int32)])  # 0 if none
+
+EVENT_DTYPE = np.dtype([('number', np.int64),
+                        ('process_id', np.int32),
+                        ('weight', np.float64),  # first weight, 1 if none
+                        ('n_particles', np.int32)])  # before any filtering
+
+
+class HepMCBatch(object):
+    """A batch of events read from a HepMC file.
+
+    Attributes
+    ----------
+    events : numpy.ndarray
+        One entry per event, with dtype EVENT_DTYPE
+    particles : numpy.ndarray
+        Particles from all events in the batch that pass the filters,
+        with dtype PARTICLE_DTYPE. The 'event' field is the index of the event
+        in this batch.
+    offsets : numpy.ndarray
+        Particles for event i are particles[offsets[i]:offsets[i + 1]]
+    """
+
+    def __init__(self, events, particles, offsets):
+        self.events = events
+        self.particles = particles
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.events)
+
+    def event(self, i):
+        """Get the particles for event i in the batch (a view, not a copy)."""
+        return self.particles[self.offsets[i]:self.offsets[i + 1]]
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self.event(i)
+
+
+class HepMCReader(object):
+    """Read a HepMC2 IO_GenEvent file in batches of events.
+
+    Parameters
+    ----------
+    filename : str
+        HepMC file, can be gzipped (.gz).
+    batch_size : int, optional
+        Number of events per batch.
+    status : list[int], optional
+        Only keep particles with one of these statuses, e.g. [1] for final state.
+    pdgid : list[int], optional
+        Only keep particles with one of these PDGIDs. Antiparticles are
+        included, e.g. [13] keeps mu+ and mu-.
+    max_events : int, optional
+        Stop after this many events. -1 for all.
+    """
+
+    def __init__(self, filename, batch_size=1000, status=None, pdgid=None, max_events=-1):
+        if batch_size < 1:
+            raise ValueError('batch_size must be >= 1')
+        self.filename = filename
+        self.batch_size = batch_size
+        self.status = set(status) if status else None
+        self.pdgid = set(abs(p) for p in pdgid) if pdgid else None
+        self.max_events = max_events
+        self.n_events = 0
+
+    def _open(self):
+        if self.filename.endswith('.gz'):
+            return gzip.open(self.filename, 'rb')
+        return open(self.filename, 'rb')
+
+    def __iter__(self):
+        status_keep = self.status
+        pdgid_keep = self.pdgid
+
+        events, particles, offsets = [], [], []
+        event_index = -1  # index of current event in batch
+        vertex = 0  # barcode of current vertex
+        n_orphans = 0  # number of incoming particles left for current vertex
+
+        def make_batch():
+            return HepMCBatch(np.array([tuple(e) for e in events], dtype=EVENT_DTYPE),
+                              np.array(particles, dtype=PARTICLE_DTYPE),
+                              np.array(offsets + [len(particles)], dtype=np.int64))
+
+        with self._open() as f:
+            for line in f:
+                tag = line[0]
+                if tag == 'P':
+                    events[-1][3] += 1
+                    parts = line.split()
+                    if n_orphans > 0:
+                        # incoming particle to the vertex, produced elsewhere
+                        n_orphans -= 1
+                        prod_vertex = 0
+                    else:
+                        prod_vertex = vertex
+                    # filter before converting the rest of the line
+                    pdg = int(parts[2])
+                    if pdgid_keep is not None and abs(pdg) not in pdgid_keep:
+                        continue
+                    status = int(parts[8])
+                    if status_keep is not None and status not in status_keep:
+                        continue
+                    particles.append((event_index, int(parts[1]), pdg,
+                                      float(parts[3]), float(parts[4]),
+                                      float(parts[5]), float(parts[6]),
+                                      float(parts[7]), status,
+                                      prod_vertex, int(parts[11])))
+                elif tag == 'V':
+                    parts = line.split()
+                    vertex = int(parts[1])
+                    n_orphans = int(parts[7])
+                elif tag == 'E':
+                    if self.n_events == self.max_events:
+                        break
+                    if len(events) == self.batch_size:
+                        yield make_batch()
+                        events, particles, offsets = [], [], []
+                        event_index = -1
+                    parts = line.split()
+                    events.append([int(parts[1]), int(parts[6]), self._get_weight(parts), 0])
+                    offsets.append(len(particles))
+                    event_index += 1
+                    vertex = 0
+                    n_orphans = 0
+                    self.n_events += 1
+        if events:
+            yield make_batch()
+
+    @staticmethod
+    def _get_weight(parts):
+        """Get the first event weight from the split E line, 1 if none."""
+        # E no mpi scale aqcd aqed id barcode nvtx beam1 beam2 nrandom [randoms] nweights [weights]
+        n_random = int(parts[11])
+        i_weights = 12 + n_random
+        if len(parts) > i_weights and int(parts[i_weights]) > 0:
+            return float(parts[i_weights + 1])
+        return 1.
+
+
+def benchmark_reader(filename, batch_size, status=None, pdgid=None):
+    """Time reading all events in a file.
+
+    Returns
+    -------
+    int, int, float
+        Number of events, number of particles kept, time taken in seconds.
+    """
+    reader = HepMCReader(filename, batch_size=batch_size, status=status, pdgid=pdgid)
+    n_particles = 0
+    start = time.time()
+    for batch in reader:
+        n_particles += len(batch.particles)
+    return reader.n_events, n_particles, time.time() - start
+
+
+def benchmark_delphes(filename, delphes_exe, card):
+    """Time DelphesHepMC processing the same file.
+
+    Returns
+    -------
+    float
+        Time taken in seconds, including unzipping if needed.
+    """
+    out_dir = tempfile.mkdtemp()
+    output = os.path.join(out_dir, 'delphes_benchmark.root')
+    start = time.time()
+    if filename.endswith('.gz'):
+        # DelphesHepMC reads from STDIN with "-"
+        check_call('gunzip -c %s | %s %s %s -' % (filename, delphes_exe, card, output), shell=True)
+    else:
+        check_call([delphes_exe, card, output, filename])
+    taken = time.time() - start
+    os.remove(output)
+    os.rmdir(out_dir)
+    return taken
+
+
+def main(in_args=sys.argv[1:]):
+    """Benchmark reading a HepMC file."""
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('filename',
+                        help='HepMC file to read')
+    parser.add_argument('--batchSize',
+                        type=int, default=1000,
+                        help='Number of events per batch')
+    parser.add_argument('--status',
+                        type=int, nargs='+',
+                        help='Only keep particles with these statuses')
+    parser.add_argument('--pdgid',
+                        type=int, nargs='+',
+                        help='Only keep particles with these PDGIDs')
+    parser.add_argument('--delphes',
+                        help='DelphesHepMC executable, to compare against')
+    parser.add_argument('--card',
+                        help='Delphes card, needed with --delphes')
+    args = parser.parse_args(in_args)
+
+    if args.delphes and not args.card:
+        parser.error('--delphes requires --card')
+
+    n_events, n_particles, taken = benchmark_reader(args.filename, args.batchSize,
+                                                    args.status, args.pdgid)
+    rate = n_events / taken if taken > 0 else 0
+    log.info('HepMCReader: %d events, %d particles kept in %.2f s: %.1f events/sec',
+             n_events, n_particles, taken, rate)
+
+    if args.delphes:
+        delphes_taken = benchmark_delphes(args.filename, args.delphes, args.card)
+        delphes_rate = n_events / delphes_taken if delphes_taken > 0 else 0
+        log.info('DelphesHepMC: %d events in %.2f s: %.1f events/sec',
+                 n_events, delphes_taken, delphes_rate)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""
+Persistent histogram accumulators, so that adding files (e.g. new seeds) to
+a sample only costs the time to fill the new files.
+
+An accumulator is a directory holding the bin contents & sum of weights
+squared as memory-mapped .npy files, and accumulator.json listing which
+files have already been added (by checksum, so a renamed or copied file
+is still recognised). Adding a file that is already included raises an
+error, so nothing is ever counted twice.
+
+The arrays are never changed in place: adding to an accumulator writes new
+arrays, then replaces accumulator.json to point to them, so a crash part
+way through leaves the old contents, and the list of files, intact.
+
+For example:
+>>> acc = HistAccumulator.open('acc/h125_ma4_hPt', 'hVars', 'hPt', 50, [0, 200])
+>>> acc.add_file('ggh_ma1_4_8TeV_n1000_seed1.root')
+>>> acc.add_file('ggh_ma1_4_8TeV_n1000_seed2.root')  # only fills seed2
+>>> counts, sumw2 = acc.counts, acc.sumw2
+
+Accumulators with the same definition can also be merged:
+>>> acc.merge(HistAccumulator('other/h125_ma4_hPt'))
+"""
+
+
+import os
+import json
+import fcntl
+import numpy as np
+import tree_cache
+import hist_cache
+
+
+ACCUMULATOR_INFO = 'accumulator.json'
+
+# Fields that define what an accumulator holds; merged or added
+# histograms must match all of them
+DEFINITION_FIELDS = ['tree', 'expression', 'nbins', 'xlim', 'selection', 'weighted']
+
+
+class AlreadyIncludedError(ValueError):
+    """Raised when adding a file that is already in an accumulator."""
+    pass
+
+
+class HistAccumulator(object):
+    """A histogram, with the list of files it has been filled from,
+    stored on disk so more files can be added later.
+
+    Use HistAccumulator.open to make a new one.
+
+    Parameters
+    ----------
+    directory : str
+        Directory of an existing accumulator.
+
+    Attributes
+    ----------
+    definition : dict
+        Tree, expression, binning, selection, and if it is weighted.
+    sources : list[dict]
+        Filename & checksum of each file included so far.
+    counts, sumw2 : numpy.memmap
+        Sum of weights, and sum of weights squared, in each bin, including
+        underflow & overflow, as from tree_cache.fill_hist. Read-only.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        info_filename = os.path.join(directory, ACCUMULATOR_INFO)
+        if not os.path.isfile(info_filename):
+            raise IOError('%s is not a histogram accumulator' % directory)
+        with _Lock(directory):
+            self._read_info()
+
+    @classmethod
+    def open(cls, directory, tree, expression, nbins, xlim, selection=None, weighted=True):
+        """Open an accumulator, making an empty one if it doesn't exist.
+
+        Raises
+        ------
+        ValueError
+            If it exists but holds a different histogram.
+        """
+        definition = {'tree': tree, 'expression': expression, 'nbins': nbins,
+                      'xlim': list(xlim), 'selection': selection, 'weighted': weighted}
+        if not os.path.isfile(os.path.join(directory, ACCUMULATOR_INFO)):
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            with _Lock(directory):
+                if not os.path.isfile(os.path.join(directory, ACCUMULATOR_INFO)):
+                    for name in ['counts', 'sumw2']:
+                        np.save(_array_filename(directory, name, 0), np.zeros(nbins + 2))
+                    _write_info(directory, {'definition': definition, 'sources': [],
+                                            'version': 0})
+        acc = cls(directory)
+        if acc.definition != json.loads(json.dumps(definition)):
+            raise ValueError('Accumulator %s holds %s, not %s'
+                             % (directory, acc.definition, definition))
+        return acc
+
+    def _read_info(self):
+        """Read the info & the arrays it points to. Only call this with the
+        lock held, so the arrays aren't replaced in between."""
+        with open(os.path.join(self.directory, ACCUMULATOR_INFO)) as f:
+            info = json.load(f)
+        self.definition = info['definition']
+        self.sources = info['sources']
+        self.version = info.get('version')
+        self.counts = np.load(_array_filename(self.directory, 'counts', self.version),
+                              mmap_mode='r')
+        self.sumw2 = np.load(_array_filename(self.directory, 'sumw2', self.version),
+                             mmap_mode='r')
+
+    def _replace(self, counts, sumw2, sources):
+        """Replace the contents, with the lock held. The new arrays are only
+        used once accumulator.json points to them."""
+        version = (self.version or 0) + 1
+        np.save(_array_filename(self.directory, 'counts', version), counts)
+        np.save(_array_filename(self.directory, 'sumw2', version), sumw2)
+        _write_info(self.directory, {'definition': self.definition, 'sources': sources,
+                                     'version': version})
+        for name in ['counts', 'sumw2']:
+            os.remove(_array_filename(self.directory, name, self.version))
+        self._read_info()
+
+    def reload(self):
+        """Read the contents again, e.g. after another process added to it."""
+        with _Lock(self.directory):
+            self._read_info()
+
+    def clear_unless_within(self, checksums):
+        """Empty the accumulator if it includes any file not in checksums,
+        e.g. one removed from a sample or changed since it was added.
+
+        Returns
+        -------
+        bool
+            True if it was emptied.
+        """
+        with _Lock(self.directory):
+            self._read_info()
+            if self.checksums <= set(checksums):
+                return False
+            empty = np.zeros(self.definition['nbins'] + 2)
+            self._replace(empty, empty, [])
+            return True
+
+    @property
+    def checksums(self):
+        return set(s['checksum'] for s in self.sources)
+
+    def includes(self, root_filename):
+        """Check if a file has already been added."""
+        return tree_cache.get_checksum(root_filename) in self.checksums
+
+    def add(self, counts, sumw2, sources):
+        """Add filled bins to the accumulator.
+
+        Parameters
+        ----------
+        counts, sumw2 : numpy.ndarray
+            Sum of weights & sum of weights squared, as from tree_cache.fill_hist.
+        sources : list[dict]
+            Filename & checksum of the files they were filled from.
+
+        Raises
+        ------
+        AlreadyIncludedError
+            If any of the sources is already included.
+        """
+        self._add_all([self], [(counts, sumw2)], sources)
+
+    @staticmethod
+    def _add_all(accumulators, filled, sources):
+        """Add filled bins to several accumulators, holding all their locks,
+        and only once none of them are found to include any of the sources."""
+        with _Lock(*[a.directory for a in accumulators]):
+            checksums = set(s['checksum'] for s in sources)
+            for acc in accumulators:
+                # someone else may have added files since we opened it
+                acc._read_info()
+                overlap = acc.checksums & checksums
+                if overlap:
+                    names = [s['filename'] for s in sources if s['checksum'] in overlap]
+                    raise AlreadyIncludedError('Already in accumulator %s: %s'
+                                               % (acc.directory, ', '.join(names)))
+            for acc, (counts, sumw2) in zip(accumulators, filled):
+                acc._replace(acc.counts + counts, acc.sumw2 + sumw2,
+                             acc.sources + list(sources))
+
+    def add_file(self, root_filename, cache=None):
+        """Fill the histogram from a ROOT file and add it.
+
+        Parameters
+        ----------
+        root_filename : str
+            ROOT file from generateMC.
+        cache : hist_cache.HistCache, optional
+            Histogram cache to fill through. Default is to fill directly
+            from tree_cache.
+
+        Raises
+        ------
+        AlreadyIncludedError
+            If the file is already included.
+        """
+        self.add_files([self], root_filename, cache)
+
+    @staticmethod
+    def add_files(accumulators, root_filename, cache=None):
+        """Fill several accumulators from the same tree, selection & weighting
+        in a ROOT file, reading the tree once.
+
+        Raises
+        ------
+        AlreadyIncludedError
+            If the file is already in any of them. None are changed.
+        """
+        definitions = set((a.definition['tree'], a.definition['selection'],
+                           a.definition['weighted']) for a in accumulators)
+        if len(definitions) != 1:
+            raise ValueError('Accumulators must use the same tree, selection & weighting')
+        tree, selection, weighted = definitions.pop()
+        source = {'filename': os.path.abspath(root_filename),
+                  'checksum': tree_cache.get_checksum(root_filename)}
+        for acc in accumulators:
+            if source['checksum'] in acc.checksums:
+                raise AlreadyIncludedError('%s already in accumulator %s'
+                                           % (root_filename, acc.directory))
+        hists = [(a.definition['expression'], a.definition['nbins'], a.definition['xlim'])
+                 for a in accumulators]
+        if cache is not None:
+            filled = cache.get_hists(root_filename, tree, hists, selection, weighted)
+        else:
+            branches = tree_cache.get_tree(root_filename, tree)
+            filled = hist_cache.fill_hists(branches, hists, selection, weighted)
+        HistAccumulator._add_all(accumulators, filled, [source])
+
+    def merge(self, other):
+        """Add another accumulator's contents to this one.
+
+        Raises
+        ------
+        ValueError
+            If they hold different histograms.
+        AlreadyIncludedError
+            If they have any files in common.
+        """
+        if other.definition != self.definition:
+            raise ValueError('Cannot merge accumulators of different histograms: %s, %s'
+                             % (self.directory, other.directory))
+        self.add(np.array(other.counts), np.array(other.sumw2), other.sources)
+
+
+class _Lock(object):
+    """Exclusive lock on one or more accumulators, for use in a with
+    statement, so several processes can add to them safely. Locks are taken
+    in order of directory, so processes locking the same ones can't deadlock."""
+
+    def __init__(self, *directories):
+        self.filenames = sorted(set(os.path.join(os.path.abspath(d), '.lock')
+                                    for d in directories))
+        self._files = []
+
+    def __enter__(self):
+        try:
+            for filename in self.filenames:
+                f = open(filename, 'a')
+                self._files.append(f)
+                fcntl.flock(f, fcntl.LOCK_EX)
+        except Exception:
+            self.__exit__()
+            raise
+        return self
+
+    def __exit__(self, *args):
+        for f in reversed(self._files):
+            fcntl.flock(f, fcntl.LOCK_UN)
+            f.close()
+        self._files = []
+
+
+def _array_filename(directory, name, version):
+    """Get the filename of one version of an array, e.g. counts.3.npy"""
+    if version is None:
+        # made before arrays were versioned
+        return os.path.join(directory, '%s.npy' % name)
+    return os.path.join(directory, '%s.%d.npy' % (name, version))
+
+
+def _write_info(directory, info):
+    """Write accumulator.json, replacing any old one in one step."""
+    filename = os.path.join(directory, ACCUMULATOR_INFO)
+    tmp_name = filename + '.tmp'
+    with open(tmp_name, 'w') as f:
+        json.dump(info, f, indent=2, sort_keys=True)
+    os.rename(tmp_name, filename)
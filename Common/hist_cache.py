@@ -0,0 +1,255 @@
+"""
+On-disk cache of filled histograms, so that re-making plots with only
+cosmetic changes (titles, colours, ...) doesn't fill anything again.
+
+Each histogram is stored as a .npz file of bin contents and sum of weights
+squared, named by a hash of the input file checksum, tree, expression,
+selection, binning, and whether it is weighted. Changing any of these, or
+the file itself, gives a new entry. When the cache is bigger than its
+maximum size, the least recently used entries are deleted.
+
+For example:
+>>> cache = HistCache()
+>>> counts, sumw2 = cache.get_hist('out.root', 'hVars', 'hPt', 50, [0, 200],
+...                                selection='abs(hEta) < 2.4')
+"""
+
+
+import os
+import json
+import hashlib
+import zipfile
+import numpy as np
+import tree_cache
+
+
+DEFAULT_CACHE_DIR = os.environ.get('NMSSM_HIST_CACHE',
+                                   os.path.expanduser('~/.cache/NMSSMPheno/hists'))
+
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+# Functions that can be used in expressions & selections, as well as branch names
+EXPRESSION_FUNCS = {
+    'abs': np.abs,
+    'sqrt': np.sqrt,
+    'exp': np.exp,
+    'log': np.log,
+    'cos': np.cos,
+    'sin': np.sin,
+    'hypot': np.hypot,
+    'minimum': np.minimum,
+    'maximum': np.maximum,
+    'pi': np.pi,
+}
+
+
+def evaluate(branches, expression):
+    """Evaluate an expression of branches, e.g. 'abs(hEta) < 2.4'.
+
+    Expressions are python, using branch names, the functions in
+    EXPRESSION_FUNCS, and numpy operators (& | ~ for and, or, not).
+
+    Parameters
+    ----------
+    branches : dict
+        Arrays for each branch, from tree_cache.get_tree.
+    expression : str
+        Expression to evaluate.
+
+    Returns
+    -------
+    numpy.ndarray
+    """
+    if expression in branches:
+        return branches[expression]
+    namespace = dict(EXPRESSION_FUNCS)
+    namespace['__builtins__'] = {}
+    return eval(expression, namespace, branches)
+
+
+def fill_hists(branches, hists, selection=None, weighted=True):
+    """Fill several histograms from the branches of a tree.
+
+    Parameters
+    ----------
+    branches : dict
+        Arrays for each branch, from tree_cache.get_tree.
+    hists : list[(str, int, [float, float])]
+        Expression, number of bins & limits for each histogram.
+    selection : str, optional
+        Only fill entries where this expression is True.
+    weighted : bool, optional
+        Weight entries by the weight branch, if there is one.
+
+    Returns
+    -------
+    list[(numpy.ndarray, numpy.ndarray)]
+        Sum of weights, and sum of weights squared, for each histogram.
+    """
+    weights = branches.get('weight') if weighted else None
+    mask = None
+    if selection:
+        mask = np.asarray(evaluate(branches, selection), dtype=bool)
+        if weights is not None:
+            weights = weights[mask]
+    results = []
+    for expr, nbins, xlim in hists:
+        values = evaluate(branches, expr)
+        if mask is not None:
+            values = values[mask]
+        results.append(tree_cache.fill_hist(values, nbins, xlim, weights))
+    return results
+
+
+class HistCache(object):
+    """Cache of filled histograms, from trees in ROOT files.
+
+    Parameters
+    ----------
+    cache_dir : str, optional
+        Directory to store histograms in.
+    max_bytes : int, optional
+        Maximum total size of the cache.
+    tree_cache_dir : str, optional
+        Directory of tree_cache, used to fill histograms that aren't cached.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 tree_cache_dir=tree_cache.DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.tree_cache_dir = tree_cache_dir
+        self.n_hits = 0
+        self.n_misses = 0
+
+    def key(self, root_filename, tree, expression, nbins, xlim, selection=None, weighted=True):
+        """Get the cache key for a histogram."""
+        description = json.dumps([tree_cache.get_checksum(root_filename), tree, expression,
+                                  selection, nbins, list(xlim), weighted])
+        return hashlib.sha1(description).hexdigest()
+
+    def _filename(self, key):
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def load(self, key):
+        """Get a histogram from the cache.
+
+        Returns
+        -------
+        (numpy.ndarray, numpy.ndarray) or None
+            Sum of weights & sum of weights squared, or None if not cached
+            or unreadable (in which case it is filled & saved again).
+        """
+        filename = self._filename(key)
+        try:
+            with np.load(filename) as data:
+                hist = data['counts'], data['sumw2']
+        except (IOError, KeyError, ValueError, zipfile.BadZipfile):
+            return None
+        try:
+            os.utime(filename, None)  # mark as recently used
+        except OSError:
+            pass  # evicted by someone else since we read it
+        return hist
+
+    def save(self, key, counts, sumw2):
+        """Add a histogram to the cache. Call evict afterwards (once, after
+        saving several) to keep the cache below its maximum size."""
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        filename = self._filename(key)
+        tmp_name = filename + '.tmp%d.npz' % os.getpid()
+        np.savez(tmp_name, counts=counts, sumw2=sumw2)
+        os.rename(tmp_name, filename)
+
+    def evict(self):
+        """Delete the least recently used entries until the cache is below
+        its maximum size."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if '.tmp' in name:
+                continue  # being written
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # deleted by someone else
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(e[1] for e in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def get_hist(self, root_filename, tree, expression, nbins, xlim, selection=None,
+                 weighted=True):
+        """Get a histogram, filling it from the tree if it isn't cached.
+
+        Parameters
+        ----------
+        root_filename : str
+            ROOT file from generateMC.
+        tree : str
+            Name of tree.
+        expression : str
+            Branch, or expression of branches, to plot.
+        nbins : int
+            Number of bins.
+        xlim : [float, float]
+            Lower & upper edges.
+        selection : str, optional
+            Only fill entries where this expression is True.
+        weighted : bool, optional
+            Weight entries by the weight branch, if the tree has one.
+
+        Returns
+        -------
+        numpy.ndarray, numpy.ndarray
+            Sum of weights, and sum of weights squared, as from tree_cache.fill_hist
+        """
+        return self.get_hists(root_filename, tree, [(expression, nbins, xlim)],
+                              selection, weighted)[0]
+
+    def get_hists(self, root_filename, tree, hists, selection=None, weighted=True):
+        """Get several histograms from the same tree, only reading the tree
+        if any of them aren't cached.
+
+        Parameters
+        ----------
+        root_filename : str
+            ROOT file from generateMC.
+        tree : str
+            Name of tree.
+        hists : list[(str, int, [float, float])]
+            Expression, number of bins & limits for each histogram.
+        selection : str, optional
+            Only fill entries where this expression is True.
+        weighted : bool, optional
+            Weight entries by the weight branch, if the tree has one.
+
+        Returns
+        -------
+        list[(numpy.ndarray, numpy.ndarray)]
+            Sum of weights, and sum of weights squared, for each histogram.
+        """
+        keys = [self.key(root_filename, tree, expr, nbins, xlim, selection, weighted)
+                for expr, nbins, xlim in hists]
+        results = [self.load(k) for k in keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        self.n_hits += len(results) - len(missing)
+        self.n_misses += len(missing)
+        if not missing:
+            return results
+
+        branches = tree_cache.get_tree(root_filename, tree, self.tree_cache_dir)
+        filled = fill_hists(branches, [hists[i] for i in missing], selection, weighted)
+        for i, hist in zip(missing, filled):
+            results[i] = hist
+            self.save(keys[i], *hist)
+        # only once, as it looks at every entry in the cache
+        self.evict()
+        return results
@@ -0,0 +1,285 @@
+"""
+Vectorised kinematics for arrays of particles, e.g. from hepmc_reader,
+lhe_reader, or event_store.
+
+Four-momenta are anything with 'px', 'py', 'pz', 'e' fields: a structured
+array of particles, an EventStore, or a P4_DTYPE array made by four_vectors.
+Every function works on whole arrays at once, so derived variables (like
+a1Dr in generateMC.cc) can be recomputed from stored particles without
+regenerating MC. Definitions follow Pythia's Vec4, so results match the
+trees from generateMC.
+
+Particles in a batch or store are grouped into events by offsets: event i has
+particles [offsets[i]:offsets[i + 1]]. pair_indices and cross_pair_indices
+give all the pairs of particles within each event.
+
+For example, the dR between each pair of a1 in each event:
+>>> store = EventStore('store/out_seed1')
+>>> a1 = np.flatnonzero(np.asarray(store['pdgid']) == 36)
+>>> p = four_vectors(store, a1)
+>>> a1_offsets = np.searchsorted(a1, store.offsets)
+>>> first, second, event = pair_indices(a1_offsets)
+>>> dr = delta_r(p[first], p[second])
+>>> min_dr = reduce_events(dr, event, store.n_events, np.minimum)
+"""
+
+
+import numpy as np
+
+
+# A four-momentum
+P4_DTYPE = np.dtype([('px', np.float64), ('py', np.float64), ('pz', np.float64),
+                     ('e', np.float64)])
+
+
+def four_vectors(particles, index=None):
+    """Make a P4_DTYPE array from anything with px, py, pz, e fields.
+
+    Parameters
+    ----------
+    particles : numpy.ndarray, EventStore, dict
+        Source of px, py, pz, e arrays.
+    index : numpy.ndarray, optional
+        Only take these entries (indices or boolean mask).
+
+    Returns
+    -------
+    numpy.ndarray
+    """
+    n = None
+    p4 = None
+    for field in P4_DTYPE.names:
+        values = np.asarray(particles[field])
+        if index is not None:
+            values = values[index]
+        if p4 is None:
+            n = len(values)
+            p4 = np.empty(n, dtype=P4_DTYPE)
+        p4[field] = values
+    return p4
+
+
+def add(*p4s):
+    """Add four-momenta, e.g. to get the parent of two decay products.
+
+    Returns
+    -------
+    numpy.ndarray
+        P4_DTYPE array of the sums.
+    """
+    total = np.zeros(len(np.asarray(p4s[0]['px'])), dtype=P4_DTYPE)
+    for p in p4s:
+        for field in P4_DTYPE.names:
+            total[field] += p[field]
+    return total
+
+
+def pt(p):
+    """Transverse momentum."""
+    return np.hypot(p['px'], p['py'])
+
+
+def p_abs(p):
+    """Magnitude of the 3-momentum."""
+    return np.sqrt(np.square(p['px']) + np.square(p['py']) + np.square(p['pz']))
+
+
+def phi(p):
+    """Azimuthal angle, in [-pi, pi]."""
+    return np.arctan2(p['py'], p['px'])
+
+
+def eta(p):
+    """Pseudorapidity. Particles along the beam get +-inf."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.arcsinh(np.true_divide(p['pz'], pt(p)))
+
+
+def rapidity(p):
+    """Rapidity, 0.5 * ln((E + pz) / (E - pz))."""
+    e = np.asarray(p['e'], dtype=np.float64)
+    pz = np.asarray(p['pz'], dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 0.5 * np.log((e + pz) / (e - pz))
+
+
+def mass(p):
+    """Invariant mass. Like Pythia, negative for spacelike vectors
+    (i.e. -sqrt(-m^2)), to show rounding errors rather than hide them."""
+    m2 = (np.square(p['e']) - np.square(p['px']) - np.square(p['py'])
+          - np.square(p['pz']))
+    return np.sign(m2) * np.sqrt(np.abs(m2))
+
+
+def delta_phi(phi1, phi2):
+    """Difference in azimuthal angle, phi1 - phi2, wrapped into [-pi, pi)."""
+    return np.mod(np.subtract(phi1, phi2) + np.pi, 2 * np.pi) - np.pi
+
+
+def abs_delta_phi(p1, p2):
+    """Absolute difference in azimuthal angle between two sets of four-momenta,
+    in [0, pi]. Same as Pythia's phi(v1, v2), i.e. a1DPhi in generateMC."""
+    return np.abs(delta_phi(phi(p1), phi(p2)))
+
+
+def delta_r(p1, p2):
+    """Distance in (eta, phi) between two sets of four-momenta.
+    Same as Pythia's REtaPhi(v1, v2), i.e. a1Dr in generateMC."""
+    return np.hypot(eta(p1) - eta(p2), delta_phi(phi(p1), phi(p2)))
+
+
+def invariant_mass(*p4s):
+    """Invariant mass of the sum of several sets of four-momenta,
+    e.g. invariant_mass(mu1, mu2)."""
+    return mass(add(*p4s))
+
+
+def transverse_mass(p1, p2):
+    """Transverse mass of two sets of four-momenta, e.g. a lepton & neutrino.
+
+    mT^2 = (ET1 + ET2)^2 - |pT1 + pT2|^2, with ET = sqrt(m^2 + pT^2).
+    For massless particles this is 2 pT1 pT2 (1 - cos(dphi)).
+    """
+    et1 = np.sqrt(np.maximum(np.square(p1['e']) - np.square(p1['pz']), 0))
+    et2 = np.sqrt(np.maximum(np.square(p2['e']) - np.square(p2['pz']), 0))
+    px = np.add(p1['px'], p2['px'])
+    py = np.add(p1['py'], p2['py'])
+    return np.sqrt(np.maximum(np.square(et1 + et2) - np.square(px) - np.square(py), 0))
+
+
+def boost(p, beta):
+    """Boost four-momenta by velocity beta.
+
+    Parameters
+    ----------
+    p : numpy.ndarray
+        Four-momenta to boost.
+    beta : (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        x, y, z components of the boost velocity, for each four-momentum.
+
+    Returns
+    -------
+    numpy.ndarray
+        P4_DTYPE array of boosted four-momenta.
+    """
+    bx, by, bz = [np.asarray(b, dtype=np.float64) for b in beta]
+    b2 = bx * bx + by * by + bz * bz
+    gamma = 1. / np.sqrt(1. - b2)
+    bp = bx * p['px'] + by * p['py'] + bz * p['pz']
+    # (gamma - 1) / b2, which goes to gamma^2 / (1 + gamma) as b2 -> 0
+    gamma2 = gamma * gamma / (1. + gamma)
+    factor = gamma2 * bp + gamma * p['e']
+    boosted = np.empty(len(bx), dtype=P4_DTYPE)
+    boosted['px'] = p['px'] + factor * bx
+    boosted['py'] = p['py'] + factor * by
+    boosted['pz'] = p['pz'] + factor * bz
+    boosted['e'] = gamma * (p['e'] + bp)
+    return boosted
+
+
+def boost_to_rest_frame(p, parent):
+    """Boost four-momenta into the rest frame of their parents,
+    e.g. tau decay products into the tau rest frame.
+
+    Parameters
+    ----------
+    p : numpy.ndarray
+        Four-momenta to boost.
+    parent : numpy.ndarray
+        Four-momentum of the frame for each entry of p.
+
+    Returns
+    -------
+    numpy.ndarray
+        P4_DTYPE array of boosted four-momenta.
+    """
+    e = np.asarray(parent['e'], dtype=np.float64)
+    return boost(p, (-parent['px'] / e, -parent['py'] / e, -parent['pz'] / e))
+
+
+def event_index(offsets):
+    """Get the event index of each particle from event offsets."""
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+
+def pair_indices(offsets):
+    """Get all the pairs of different particles in each event.
+
+    Parameters
+    ----------
+    offsets : numpy.ndarray
+        Particles for event i are [offsets[i]:offsets[i + 1]].
+
+    Returns
+    -------
+    numpy.ndarray, numpy.ndarray, numpy.ndarray
+        Index of first & second particle (first < second) and event index,
+        for each pair. Pairs are in order of event.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    events = event_index(offsets)
+    # particle i pairs with all the particles after it in its event
+    n_partners = offsets[1:][events] - np.arange(offsets[0], offsets[-1]) - 1
+    first = np.repeat(np.arange(offsets[0], offsets[-1]), n_partners)
+    starts = np.cumsum(n_partners) - n_partners
+    second = first + 1 + np.arange(len(first)) - np.repeat(starts, n_partners)
+    return first, second, np.repeat(events, n_partners)
+
+
+def cross_pair_indices(offsets1, offsets2):
+    """Get all the pairs of one particle from each of two collections,
+    in each event, e.g. each tau with each of its candidate decay products.
+
+    Parameters
+    ----------
+    offsets1, offsets2 : numpy.ndarray
+        Event offsets for each collection, for the same events.
+
+    Returns
+    -------
+    numpy.ndarray, numpy.ndarray, numpy.ndarray
+        Index in the first collection, index in the second collection, and
+        event index, for each pair. Pairs are in order of event.
+    """
+    offsets1 = np.asarray(offsets1, dtype=np.int64)
+    offsets2 = np.asarray(offsets2, dtype=np.int64)
+    if len(offsets1) != len(offsets2):
+        raise ValueError('Collections have different numbers of events')
+    events = event_index(offsets1)
+    n_partners = np.diff(offsets2)[events]
+    first = np.repeat(np.arange(offsets1[0], offsets1[-1]), n_partners)
+    starts = np.cumsum(n_partners) - n_partners
+    second = (np.repeat(offsets2[:-1][events], n_partners)
+              + np.arange(len(first)) - np.repeat(starts, n_partners))
+    return first, second, np.repeat(events, n_partners)
+
+
+def reduce_events(values, events, n_events, ufunc=np.add, empty=np.nan):
+    """Combine values per event, e.g. the smallest dR of all pairs.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Values to combine.
+    events : numpy.ndarray
+        Event index of each value, in increasing order.
+    n_events : int
+        Total number of events.
+    ufunc : numpy.ufunc, optional
+        How to combine values, e.g. np.add, np.minimum, np.maximum.
+    empty : float, optional
+        Result for events with no values.
+
+    Returns
+    -------
+    numpy.ndarray
+        One value per event.
+    """
+    values = np.asarray(values)
+    counts = np.bincount(events, minlength=n_events)
+    result = np.full(n_events, empty, dtype=np.result_type(values, np.float64))
+    filled = counts > 0
+    if values.size:
+        starts = np.cumsum(counts) - counts
+        result[filled] = ufunc.reduceat(values, starts[filled])
+    return result
@@ -0,0 +1,520 @@
+#!/usr/bin/env python
+"""
+Streaming tools for Les Houches Event (LHE) files, e.g. events.lhe.gz from
+run_mg5.py, or the output of generateMC --lhe. Files can be gzipped.
+Everything works one event at a time, so memory use does not depend on the
+size of the files.
+
+- LHEReader: read events in batches, with particles & weights as NumPy arrays
+- merge_lhe_files: merge files (e.g. from different seeds) into one,
+  with the combined cross section in the <init> block
+- split_lhe_file: split a file into N files with equal numbers of events
+
+For example:
+>>> for batch in LHEReader('events.lhe.gz', batch_size=1000, status=[1]):
+...     print batch.events['weight'].sum(), len(batch.particles)
+
+It can also be run as a script:
+
+    ./lhe_reader.py merge merged.lhe.gz seed1.lhe.gz seed2.lhe.gz ...
+    ./lhe_reader.py split events.lhe.gz 4
+"""
+
+
+import os
+import re
+import sys
+import gzip
+import argparse
+import logging
+from math import sqrt
+import numpy as np
+from hepmc_reader import HepMCBatch
+import common
+
+
+logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+PARTICLE_DTYPE = np.dtype([('event', np.int32),  # index of event in batch
+                           ('pdgid', np.int32),
+                           ('status', np.int32),
+                           ('mother1', np.int32),  # 1-based index in event, 0 if none
+                           ('mother2', np.int32),
+                           ('color1', np.int32),
+                           ('color2', np.int32),
+                           ('px', np.float64),
+                           ('py', np.float64),
+                           ('pz', np.float64),
+                           ('e', np.float64),
+                           ('m', np.float64),
+                           ('lifetime', np.float64),
+                           ('spin', np.float64)])
+
+EVENT_DTYPE = np.dtype([('process_id', np.int32),
+                        ('weight', np.float64),
+                        ('scale', np.float64),
+                        ('alpha_qed', np.float64),
+                        ('alpha_qcd', np.float64),
+                        ('n_particles', np.int32)])  # before any filtering
+
+WGT_RE = re.compile(r"<wgt[^>]*>\s*([^<\s]+)\s*</wgt>")
+
+
+def _opens(line, tag):
+    """Check if a (left-stripped) line starts with the opening tag, e.g. <init>
+    or <event id="1">, but not a longer tag like <initrwgt>."""
+    return re.match(r'<%s[\s>]' % tag, line) is not None
+
+
+def _closes(line, tag):
+    """Check if a (left-stripped) line starts with the closing tag, e.g. </init>."""
+    return re.match(r'</%s\s*>' % tag, line) is not None
+
+
+def open_lhe(filename, mode='rb'):
+    """Open a LHE file, gzipped or not."""
+    if filename.endswith('.gz'):
+        return gzip.open(filename, mode)
+    return open(filename, mode)
+
+
+def iter_lhe_blocks(filename):
+    """Iterate through the parts of a LHE file, one at a time.
+
+    Yields
+    ------
+    str, str
+        Type of block, and its text (including the tags, and newlines).
+        Types are 'header' (everything before <init>), 'init',
+        'event', and 'footer' (everything after the last event).
+    """
+    block_type = 'header'
+    lines = []
+    with open_lhe(filename) as f:
+        for line in f:
+            stripped = line.lstrip()
+            if block_type in ('header', 'between') and _opens(stripped, 'init'):
+                if lines:
+                    yield 'header', ''.join(lines)
+                block_type, lines = 'init', []
+            elif block_type == 'between' and _opens(stripped, 'event'):
+                if lines:
+                    yield 'header', ''.join(lines)
+                block_type, lines = 'event', []
+            elif block_type == 'between' and _closes(stripped, 'LesHouchesEvents'):
+                if lines:
+                    yield 'header', ''.join(lines)
+                block_type, lines = 'footer', []
+            lines.append(line)
+            if block_type in ('init', 'event') and _closes(stripped, block_type):
+                yield block_type, ''.join(lines)
+                block_type, lines = 'between', []
+    if lines:
+        yield 'footer' if block_type == 'between' else block_type, ''.join(lines)
+
+
+class LHEInit(object):
+    """Contents of the <init> block.
+
+    Attributes
+    ----------
+    beam : list[str]
+        Fields of the beam info line
+        (IDBMUP(2) EBMUP(2) PDFGUP(2) PDFSUP(2) IDWTUP NPRUP)
+    processes : list[dict]
+        For each process, 'xsec', 'xerr', 'xmax' (in pb), and 'id' (LPRUP)
+    extra : list[str]
+        Any other lines, e.g. <generator> tags
+    """
+
+    def __init__(self, text):
+        lines = [l for l in text.splitlines() if l.strip()]
+        # drop <init> & </init>
+        body = lines[1:-1]
+        self.beam = body[0].split()
+        n_processes = int(self.beam[9])
+        self.processes = []
+        for line in body[1:1 + n_processes]:
+            parts = line.split()
+            self.processes.append({'xsec': float(parts[0]), 'xerr': float(parts[1]),
+                                   'xmax': float(parts[2]), 'id': int(parts[3])})
+        self.extra = body[1 + n_processes:]
+
+    @property
+    def xsec(self):
+        """Total cross section of all processes, in pb"""
+        return sum(p['xsec'] for p in self.processes)
+
+    def to_text(self):
+        lines = ['<init>', ' ' + ' '.join(self.beam)]
+        for p in self.processes:
+            lines.append(' %.7e %.7e %.7e %d' % (p['xsec'], p['xerr'], p['xmax'], p['id']))
+        lines.extend(self.extra)
+        lines.append('</init>')
+        return '\n'.join(lines) + '\n'
+
+
+class LHEBatch(HepMCBatch):
+    """A batch of events read from a LHE file.
+
+    Attributes
+    ----------
+    events : numpy.ndarray
+        One entry per event, with dtype EVENT_DTYPE
+    particles : numpy.ndarray
+        Particles from all events in the batch that pass the filters,
+        with dtype PARTICLE_DTYPE.
+    offsets : numpy.ndarray
+        Particles for event i are particles[offsets[i]:offsets[i + 1]]
+    weights : numpy.ndarray
+        Extra weights (e.g. MG5 <rwgt> block), shape (n events, n weights).
+        NaN where an event has fewer weights than the others.
+    """
+
+    def __init__(self, events, particles, offsets, weights):
+        super(LHEBatch, self).__init__(events, particles, offsets)
+        self.weights = weights
+
+
+class LHEReader(object):
+    """Read a LHE file in batches of events.
+
+    Parameters
+    ----------
+    filename : str
+        LHE file, can be gzipped (.gz).
+    batch_size : int, optional
+        Number of events per batch.
+    status : list[int], optional
+        Only keep particles with one of these statuses, e.g. [1] for outgoing.
+    pdgid : list[int], optional
+        Only keep particles with one of these PDGIDs. Antiparticles are
+        included, e.g. [13] keeps mu+ and mu-.
+    max_events : int, optional
+        Stop after this many events. -1 for all.
+
+    Attributes
+    ----------
+    init : LHEInit
+        Contents of the <init> block, available once iteration has started.
+    """
+
+    def __init__(self, filename, batch_size=1000, status=None, pdgid=None, max_events=-1):
+        if batch_size < 1:
+            raise ValueError('batch_size must be >= 1')
+        self.filename = filename
+        self.batch_size = batch_size
+        self.status = set(status) if status else None
+        self.pdgid = set(abs(p) for p in pdgid) if pdgid else None
+        self.max_events = max_events
+        self.n_events = 0
+        self.init = None
+
+    def __iter__(self):
+        events, particles, offsets, weights = [], [], [], []
+
+        def make_batch():
+            n_weights = max(len(w) for w in weights)
+            weight_arr = np.full((len(weights), n_weights), np.nan)
+            for i, w in enumerate(weights):
+                weight_arr[i, :len(w)] = w
+            return LHEBatch(np.array(events, dtype=EVENT_DTYPE),
+                            np.array(particles, dtype=PARTICLE_DTYPE),
+                            np.array(offsets + [len(particles)], dtype=np.int64),
+                            weight_arr)
+
+        for block_type, text in iter_lhe_blocks(self.filename):
+            if block_type == 'init':
+                self.init = LHEInit(text)
+            if block_type != 'event':
+                continue
+            if self.n_events == self.max_events:
+                break
+            if len(events) == self.batch_size:
+                yield make_batch()
+                events, particles, offsets, weights = [], [], [], []
+            offsets.append(len(particles))
+            events.append(self._parse_event(text, len(events), particles))
+            weights.append([float(w) for w in WGT_RE.findall(text)])
+            self.n_events += 1
+        if events:
+            yield make_batch()
+
+    def _parse_event(self, text, event_index, particles):
+        """Parse the text of one event, adding its particles to particles.
+
+        Returns
+        -------
+        tuple
+            Event info, for EVENT_DTYPE
+        """
+        lines = text.splitlines()
+        # skip the <event> tag, and any blank lines
+        i_line = 1
+        while not lines[i_line].strip():
+            i_line += 1
+        parts = lines[i_line].split()
+        n_particles = int(parts[0])
+        for line in lines[i_line + 1:i_line + 1 + n_particles]:
+            p = line.split()
+            pdg = int(p[0])
+            if self.pdgid is not None and abs(pdg) not in self.pdgid:
+                continue
+            status = int(p[1])
+            if self.status is not None and status not in self.status:
+                continue
+            particles.append((event_index, pdg, status, int(p[2]), int(p[3]),
+                              int(p[4]), int(p[5]), float(p[6]), float(p[7]),
+                              float(p[8]), float(p[9]), float(p[10]),
+                              float(p[11]), float(p[12])))
+        return (int(parts[1]), float(parts[2]), float(parts[3]),
+                float(parts[4]), float(parts[5]), n_particles)
+
+
+def count_lhe_events(filename):
+    """Count the events in a LHE file, using its sidecar if it has one.
+
+    Parameters
+    ----------
+    filename : str
+        LHE file.
+
+    Returns
+    -------
+    int
+        Number of events.
+    """
+    n_events = common.get_n_events(filename)
+    if n_events is not None:
+        return n_events
+    n_events = 0
+    with open_lhe(filename) as f:
+        for line in f:
+            if _opens(line.lstrip(), 'event'):
+                n_events += 1
+    return n_events
+
+
+def scale_event_weights(text, factor):
+    """Multiply the weights of an event (XWGTUP & any <wgt>) by a factor.
+
+    Parameters
+    ----------
+    text : str
+        Text of the event, from iter_lhe_blocks.
+    factor : float
+        Factor to scale weights by.
+
+    Returns
+    -------
+    str
+        Text of the event with the new weights.
+    """
+    lines = text.split('\n')
+    i_line = 1
+    while not lines[i_line].strip():
+        i_line += 1
+    parts = lines[i_line].split()
+    parts[2] = '%.7e' % (float(parts[2]) * factor)
+    lines[i_line] = ' ' + ' '.join(parts)
+    new_text = '\n'.join(lines)
+    if '<wgt' in new_text:
+        def scale(match):
+            value = match.group(1)
+            return match.group(0).replace(value, '%.7e' % (float(value) * factor), 1)
+        new_text = WGT_RE.sub(scale, new_text)
+    return new_text
+
+
+def combine_inits(inits, n_events):
+    """Combine the <init> blocks of several files, i.e. the cross section
+    for each process is averaged, weighted by the number of events in each file.
+
+    Parameters
+    ----------
+    inits : list[LHEInit]
+        <init> blocks for each file.
+    n_events : list[int]
+        Number of events in each file.
+
+    Returns
+    -------
+    LHEInit
+        Combined <init> block, based on the first one.
+
+    Raises
+    ------
+    RuntimeError
+        If the files have different processes.
+    """
+    combined = inits[0]
+    total = float(sum(n_events))
+    for i_proc, proc in enumerate(combined.processes):
+        procs = []
+        for init in inits:
+            match = [p for p in init.processes if p['id'] == proc['id']]
+            if not match:
+                raise RuntimeError('Process %d missing from some files, cannot merge' % proc['id'])
+            procs.append(match[0])
+        proc['xsec'] = sum(n * p['xsec'] for n, p in zip(n_events, procs)) / total
+        proc['xerr'] = sqrt(sum((n * p['xerr']) ** 2 for n, p in zip(n_events, procs))) / total
+        proc['xmax'] = max(p['xmax'] for p in procs)
+    return combined
+
+
+def merge_lhe_files(inputs, output, scale_weights=False):
+    """Merge several LHE files (e.g. same process, different seeds) into one.
+
+    The header of the first file is kept, and the cross section of each
+    process in <init> is the average over the files, weighted by the number
+    of events in each file.
+
+    Parameters
+    ----------
+    inputs : list[str]
+        LHE files to merge.
+    output : str
+        Output filename. Gzipped if it ends in .gz.
+    scale_weights : bool, optional
+        Multiply each event weight by (events in its file / total events).
+        Use this if the event weights in each file sum to the cross section
+        (as for MG5_aMC), so the merged weights do too.
+
+    Returns
+    -------
+    int
+        Number of events written.
+    """
+    n_events = [count_lhe_events(f) for f in inputs]
+    total = sum(n_events)
+    if total == 0:
+        raise RuntimeError('No events to merge')
+
+    # 1st pass: get all the <init> blocks
+    inits = []
+    for filename in inputs:
+        for block_type, text in iter_lhe_blocks(filename):
+            if block_type == 'init':
+                inits.append(LHEInit(text))
+                break
+        else:
+            raise RuntimeError('No <init> block in %s' % filename)
+    combined = combine_inits(inits, n_events)
+
+    # 2nd pass: write events
+    n_written = 0
+    footer = '</LesHouchesEvents>\n'
+    with open_lhe(output, 'wb') as out:
+        for i_file, filename in enumerate(inputs):
+            factor = n_events[i_file] / float(total)
+            for block_type, text in iter_lhe_blocks(filename):
+                if i_file == 0 and block_type == 'header':
+                    out.write(text)
+                elif i_file == 0 and block_type == 'init':
+                    out.write(combined.to_text())
+                elif block_type == 'event':
+                    out.write(scale_event_weights(text, factor) if scale_weights else text)
+                    n_written += 1
+                elif i_file == 0 and block_type == 'footer':
+                    footer = text
+        out.write(footer)
+    log.info('Merged %d events from %d files into %s, cross section %.5g pb',
+             n_written, len(inputs), output, combined.xsec)
+    return n_written
+
+
+def split_lhe_file(filename, n_chunks, output_stem=None, scale_weights=False):
+    """Split a LHE file into several files with (nearly) equal numbers of events.
+
+    Each file has the header & <init> block of the original.
+
+    Parameters
+    ----------
+    filename : str
+        LHE file to split.
+    n_chunks : int
+        Number of files to split into.
+    output_stem : str, optional
+        Outputs are <output_stem>_<i>.lhe(.gz). Defaults to the input filename
+        without .lhe(.gz), so the outputs are next to the input.
+    scale_weights : bool, optional
+        Multiply each event weight by (total events / events in its chunk).
+        Use this if the event weights sum to the cross section
+        (as for MG5_aMC), so the weights in each chunk do too.
+
+    Returns
+    -------
+    list[str]
+        Output filenames.
+    """
+    n_events = count_lhe_events(filename)
+    n_chunks = max(1, min(n_chunks, n_events))
+    chunk_sizes = [n_events // n_chunks + (1 if i < n_events % n_chunks else 0)
+                   for i in range(n_chunks)]
+    if output_stem is None:
+        output_stem = common.strip_extensions(filename, ['.gz', '.lhe'])
+    ext = '.lhe.gz' if filename.endswith('.gz') else '.lhe'
+    outputs = ['%s_%d%s' % (output_stem, i, ext) for i in range(n_chunks)]
+
+    preamble = []  # header & init, written to the start of each chunk
+    i_chunk = -1
+    n_in_chunk = 0
+    out = None
+    footer = '</LesHouchesEvents>\n'
+    try:
+        for block_type, text in iter_lhe_blocks(filename):
+            if block_type in ('header', 'init'):
+                preamble.append(text)
+            elif block_type == 'footer':
+                footer = text
+            elif block_type == 'event':
+                if out is None or n_in_chunk == chunk_sizes[i_chunk]:
+                    if out:
+                        out.write(footer)
+                        out.close()
+                    i_chunk += 1
+                    n_in_chunk = 0
+                    out = open_lhe(outputs[i_chunk], 'wb')
+                    out.write(''.join(preamble))
+                factor = n_events / float(chunk_sizes[i_chunk])
+                out.write(scale_event_weights(text, factor) if scale_weights else text)
+                n_in_chunk += 1
+    finally:
+        if out:
+            out.write(footer)
+            out.close()
+    log.info('Split %s into %d files: %s', filename, n_chunks, ', '.join(outputs))
+    return outputs
+
+
+def main(in_args=sys.argv[1:]):
+    """Merge or split LHE files."""
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command')
+    merge_parser = subparsers.add_parser('merge', help='Merge LHE files')
+    merge_parser.add_argument('output', help='Output filename')
+    merge_parser.add_argument('inputs', nargs='+', help='LHE files to merge')
+    split_parser = subparsers.add_parser('split', help='Split a LHE file')
+    split_parser.add_argument('input', help='LHE file to split')
+    split_parser.add_argument('nChunks', type=int, help='Number of files to split into')
+    split_parser.add_argument('--stem',
+                              help='Stem for output filenames, '
+                              'default is the input without .lhe(.gz)')
+    for p in [merge_parser, split_parser]:
+        p.add_argument('--scaleWeights', action='store_true',
+                       help='Rescale event weights, for files where the weights '
+                       'sum to the cross section (e.g. MG5_aMC)')
+    args = parser.parse_args(in_args)
+
+    if args.command == 'merge':
+        merge_lhe_files(args.inputs, args.output, args.scaleWeights)
+    else:
+        split_lhe_file(args.input, args.nChunks, args.stem, args.scaleWeights)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+"""
+Cache of the flat TTrees from generateMC ROOT files (hVars, a1Vars, ...)
+as NumPy arrays, for fast repeated plotting.
+
+Each ROOT file is converted once, into one .npy file per branch, stored in
+<cache dir>/<file checksum>/. The checksum is taken from the file's sidecar
+if it has one, so a changed file is converted again, and renaming or
+copying a file does not. Cached branches are memory-mapped when used.
+
+For example:
+>>> hvars = get_tree('out.root', 'hVars')
+>>> counts, sumw2 = fill_hist(hvars['hPt'], 50, [0, 200], weights=hvars['weight'])
+>>> h = make_th1('hPt', ';H p_{T} [GeV];N', counts, sumw2, 50, [0, 200])
+
+Convert files ahead of time from the command line:
+
+    ./tree_cache.py *.root [--cacheDir DIR]
+"""
+
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import logging
+import numpy as np
+from event_store import ColumnWriter
+import common
+
+
+logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+DEFAULT_CACHE_DIR = os.environ.get('NMSSM_TREE_CACHE',
+                                   os.path.expanduser('~/.cache/NMSSMPheno/trees'))
+
+CACHE_INFO = 'cache.json'
+
+# Types of ROOT leaves, for the arrays
+LEAF_DTYPES = {
+    'Float_t': np.float32,
+    'Double_t': np.float64,
+    'Int_t': np.int32,
+    'UInt_t': np.uint32,
+    'Long64_t': np.int64,
+    'Short_t': np.int16,
+    'Bool_t': np.bool_,
+}
+
+# Number of entries to get from ROOT at a time
+CHUNK_SIZE = 1000000
+
+
+# Checksums already worked out, keyed by (filename, size, modification time)
+_checksums = {}
+
+
+def get_checksum(root_filename):
+    """Get the checksum of a file, from its sidecar if it has an up-to-date one.
+
+    Returns
+    -------
+    str
+        Checksum, e.g. crc32:1234abcd
+    """
+    stat = os.stat(root_filename)
+    file_id = (os.path.abspath(root_filename), stat.st_size, stat.st_mtime)
+    if file_id not in _checksums:
+        metadata = common.read_sidecar(root_filename)
+        if metadata and metadata.get('bytes') == stat.st_size:
+            _checksums[file_id] = metadata['checksum']
+        else:
+            _checksums[file_id] = common.file_checksum(root_filename)[1]
+    return _checksums[file_id]
+
+
+def cache_location(root_filename, cache_dir=DEFAULT_CACHE_DIR):
+    """Get the cache directory for a ROOT file."""
+    return os.path.join(cache_dir, get_checksum(root_filename).replace(':', '_'))
+
+
+def tree_to_columns(tree, out_dir, chunk_size=CHUNK_SIZE):
+    """Write all the branches of a flat TTree to .npy files.
+
+    Uses TTree::Draw, 4 branches at a time, so it only needs PyROOT.
+
+    Parameters
+    ----------
+    tree : ROOT.TTree
+        Tree with one value per branch per entry.
+    out_dir : str
+        Directory for the .npy files, named <tree>.<branch>.npy
+    chunk_size : int, optional
+        Number of entries to get at a time.
+
+    Returns
+    -------
+    list[str]
+        Names of the branches.
+    """
+    branches = [b.GetName() for b in tree.GetListOfBranches()]
+    n_entries = tree.GetEntries()
+    tree.SetEstimate(min(n_entries, chunk_size) + 1)
+    for i in range(0, len(branches), 4):
+        group = branches[i:i + 4]
+        writers = []
+        for name in group:
+            dtype = LEAF_DTYPES.get(tree.GetLeaf(name).GetTypeName(), np.float64)
+            writers.append(ColumnWriter(os.path.join(out_dir, '%s.%s.npy' % (tree.GetName(), name)),
+                                        dtype))
+        for first in range(0, n_entries, chunk_size):
+            n_rows = tree.Draw(':'.join(group), '', 'goff', chunk_size, first)
+            getters = [tree.GetV1, tree.GetV2, tree.GetV3, tree.GetV4]
+            for writer, getter in zip(writers, getters):
+                buf = getter()
+                if hasattr(buf, 'SetSize'):
+                    buf.SetSize(n_rows)
+                writer.write(np.frombuffer(buf, dtype=np.float64, count=n_rows))
+        for writer in writers:
+            writer.close()
+    return branches
+
+
+def _read_info(location):
+    """Read the cache info for a file, or None if it has not been cached."""
+    info_filename = os.path.join(location, CACHE_INFO)
+    if not os.path.isfile(info_filename):
+        return None
+    with open(info_filename) as f:
+        return json.load(f)
+
+
+def _write_info(location, info):
+    """Write the cache info for a file, replacing any old info in one step."""
+    tmp_filename = os.path.join(location, CACHE_INFO + '.tmp%d' % os.getpid())
+    with open(tmp_filename, 'w') as f:
+        json.dump(info, f, indent=2, sort_keys=True)
+    os.rename(tmp_filename, os.path.join(location, CACHE_INFO))
+
+
+def cache_file(root_filename, cache_dir=DEFAULT_CACHE_DIR, trees=None):
+    """Convert the trees in a ROOT file to cached arrays, if not already cached.
+
+    Trees that are missing from an existing cache, e.g. because it was made
+    with a different list of trees, are converted and added to it.
+
+    Parameters
+    ----------
+    root_filename : str
+        ROOT file from generateMC.
+    cache_dir : str, optional
+        Top directory of cache.
+    trees : list[str], optional
+        Trees to convert. Default is all the trees in the file.
+        Trees that are not in the file are ignored.
+
+    Returns
+    -------
+    str
+        Cache directory for this file.
+
+    Raises
+    ------
+    IOError
+        If the ROOT file cannot be opened.
+    """
+    location = cache_location(root_filename, cache_dir)
+    info = _read_info(location)
+    if info and 'allTrees' in info:
+        wanted = [t for t in (trees or info['allTrees']) if t in info['allTrees']]
+        if all(t in info['trees'] for t in wanted):
+            return location
+
+    # ROOT is only needed to make the cache, not to use it
+    import ROOT
+    ROOT.PyConfig.IgnoreCommandLineOptions = True
+    rf = ROOT.TFile(root_filename, 'READ')
+    if not rf or rf.IsZombie():
+        raise IOError('Cannot open file %s' % root_filename)
+
+    # write to a temporary directory, so a failed conversion is never used
+    tmp_location = location + '.tmp%d' % os.getpid()
+    common.check_create_dir(tmp_location)
+    all_trees = [key.GetName() for key in rf.GetListOfKeys() if key.GetClassName() == 'TTree']
+    cached = info['trees'] if info else {}
+    new_trees = {}
+    for name in all_trees:
+        if (trees and name not in trees) or name in cached:
+            continue
+        tree = rf.Get(name)
+        new_trees[name] = {'branches': tree_to_columns(tree, tmp_location),
+                           'nEntries': tree.GetEntries()}
+    rf.Close()
+
+    if not os.path.isdir(location):
+        with open(os.path.join(tmp_location, CACHE_INFO), 'w') as f:
+            json.dump({'source': os.path.abspath(root_filename), 'allTrees': all_trees,
+                       'trees': new_trees}, f, indent=2, sort_keys=True)
+        try:
+            os.rename(tmp_location, location)
+            log.info('Cached %s in %s', root_filename, location)
+            return location
+        except OSError:
+            # someone else made it at the same time, so add to theirs
+            pass
+
+    # add the new trees to the existing cache, arrays first so the info
+    # never lists a tree that isn't there
+    for filename in os.listdir(tmp_location):
+        if filename.endswith('.npy'):
+            os.rename(os.path.join(tmp_location, filename), os.path.join(location, filename))
+    shutil.rmtree(tmp_location)
+    info = _read_info(location) or {'source': os.path.abspath(root_filename), 'trees': {}}
+    info['allTrees'] = all_trees
+    info['trees'].update(new_trees)
+    _write_info(location, info)
+    if new_trees:
+        log.info('Cached %s from %s in %s', ', '.join(sorted(new_trees)), root_filename,
+                 location)
+    return location
+
+
+def get_tree(root_filename, tree_name, cache_dir=DEFAULT_CACHE_DIR):
+    """Get the branches of a tree as arrays, caching the file first if needed.
+
+    Parameters
+    ----------
+    root_filename : str
+        ROOT file from generateMC.
+    tree_name : str
+        Name of tree, e.g. hVars
+    cache_dir : str, optional
+        Top directory of cache.
+
+    Returns
+    -------
+    dict
+        Read-only memory-mapped array for each branch, keyed by branch name.
+
+    Raises
+    ------
+    KeyError
+        If the tree is not in the file.
+    """
+    location = cache_file(root_filename, cache_dir, [tree_name])
+    info = _read_info(location)
+    if tree_name not in info['trees']:
+        raise KeyError('No tree %s in %s' % (tree_name, root_filename))
+    return {b: np.load(os.path.join(location, '%s.%s.npy' % (tree_name, b)), mmap_mode='r')
+            for b in info['trees'][tree_name]['branches']}
+
+
+def fill_hist(values, nbins, xlim, weights=None):
+    """Fill a 1D histogram from an array of values.
+
+    Like TH1, values outside the range go into underflow & overflow bins.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Values to histogram.
+    nbins : int
+        Number of bins.
+    xlim : [float, float]
+        Lower & upper edges.
+    weights : numpy.ndarray, optional
+        Weight for each value.
+
+    Returns
+    -------
+    numpy.ndarray, numpy.ndarray
+        Sum of weights, and sum of weights squared, in each bin.
+        Both have nbins + 2 entries: [underflow, bins..., overflow].
+    """
+    values = np.asarray(values)
+    width = (xlim[1] - xlim[0]) / float(nbins)
+    index = np.floor((values - xlim[0]) / width).astype(np.int64) + 1
+    np.clip(index, 0, nbins + 1, out=index)
+    if weights is None:
+        counts = np.bincount(index, minlength=nbins + 2).astype(np.float64)
+        return counts, counts.copy()
+    weights = np.asarray(weights, dtype=np.float64)
+    return (np.bincount(index, weights=weights, minlength=nbins + 2),
+            np.bincount(index, weights=weights * weights, minlength=nbins + 2))
+
+
+def fill_hist_2d(xvalues, yvalues, nbins, xlim, ybins, ylim, weights=None):
+    """Fill a 2D histogram. Values outside the range are dropped.
+
+    Returns
+    -------
+    numpy.ndarray, numpy.ndarray
+        Sum of weights, and sum of weights squared, with shape (nbins, ybins).
+    """
+    bins = [nbins, ybins]
+    hist_range = [xlim, ylim]
+    counts = np.histogram2d(xvalues, yvalues, bins, hist_range, weights=weights)[0]
+    if weights is None:
+        return counts, counts.copy()
+    weights = np.asarray(weights, dtype=np.float64)
+    sumw2 = np.histogram2d(xvalues, yvalues, bins, hist_range, weights=weights * weights)[0]
+    return counts, sumw2
+
+
+def make_th1(name, title, counts, sumw2, nbins, xlim):
+    """Make a ROOT TH1D from the output of fill_hist, e.g. for drawing.
+
+    Returns
+    -------
+    ROOT.TH1D
+    """
+    import ROOT
+    h = ROOT.TH1D(name, title, nbins, xlim[0], xlim[1])
+    h.Sumw2()
+    for i in range(nbins + 2):
+        h.SetBinContent(i, counts[i])
+        h.SetBinError(i, np.sqrt(sumw2[i]))
+    h.SetEntries(counts.sum())
+    return h
+
+
+def make_th2(name, title, counts, sumw2, nbins, xlim, ybins, ylim):
+    """Make a ROOT TH2D from the output of fill_hist_2d.
+
+    Returns
+    -------
+    ROOT.TH2D
+    """
+    import ROOT
+    h = ROOT.TH2D(name, title, nbins, xlim[0], xlim[1], ybins, ylim[0], ylim[1])
+    h.Sumw2()
+    for i in range(nbins):
+        for j in range(ybins):
+            h.SetBinContent(i + 1, j + 1, counts[i, j])
+            h.SetBinError(i + 1, j + 1, np.sqrt(sumw2[i, j]))
+    h.SetEntries(counts.sum())
+    return h
+
+
+def main(in_args=sys.argv[1:]):
+    """Cache the trees in ROOT files."""
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+',
+                        help='ROOT files to cache')
+    parser.add_argument('--cacheDir',
+                        default=DEFAULT_CACHE_DIR,
+                        help='Cache directory')
+    parser.add_argument('--trees',
+                        nargs='+',
+                        help='Only cache these trees')
+    args = parser.parse_args(in_args)
+
+    for filename in args.inputs:
+        cache_file(filename, args.cacheDir, args.trees)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""
+Fill histograms from TTrees in fixed-size chunks, so trees of any size can be
+histogrammed with NumPy in a bounded amount of memory.
+
+Only the branches used by the histograms are read, a chunk of entries at a
+time, into the same buffers each time. The chunk size is set from a memory
+limit. Only flat trees, with one value per branch per entry (like those from
+generateMC), are supported; trees with array branches, e.g. from Delphes,
+raise a ValueError. For example:
+
+>>> counts = fill_tree_hists('merged.root', 'hVars',
+...                          [('hPt', 50, [0, 200]), ('abs(hEta)', 25, [0, 5])],
+...                          selection='hPt > 20', max_bytes=500 * 1024**2)
+INFO: Filled 2 histograms from 12000000 entries of hVars in 20.1 s (597015 entries/s)
+
+or with the cached arrays from tree_cache, which are already on disk:
+
+>>> chunks = ArrayChunks(tree_cache.get_tree('merged.root', 'hVars'))
+>>> counts = fill_chunked(chunks, [('hPt', 50, [0, 200])])
+"""
+
+
+import time
+import logging
+import numpy as np
+import hist_cache
+
+
+log = logging.getLogger(__name__)
+
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Approximate number of extra float64 arrays per entry, on top of the branch
+# buffers: TTree::Draw's own 4 buffers, and temporaries made evaluating
+# expressions & selections.
+EXTRA_ARRAYS = 8
+
+
+def chunk_size_for(n_branches, max_bytes=DEFAULT_MAX_BYTES):
+    """Get the number of entries per chunk that keeps memory use below max_bytes.
+
+    Parameters
+    ----------
+    n_branches : int
+        Number of branches read per entry.
+    max_bytes : int, optional
+        Memory limit for the chunk buffers and temporaries.
+
+    Returns
+    -------
+    int
+
+    Raises
+    ------
+    ValueError
+        If max_bytes is too small for even a small chunk.
+    """
+    chunk_size = int(max_bytes // (8 * (n_branches + EXTRA_ARRAYS)))
+    if chunk_size < 1000:
+        raise ValueError('Memory limit of %d bytes is too small to read %d branches'
+                         % (max_bytes, n_branches))
+    return chunk_size
+
+
+def branches_used(expressions, branches):
+    """Get the branches used in some expressions, e.g. 'abs(hEta) < 2.4'.
+
+    Parameters
+    ----------
+    expressions : list[str]
+        Expressions, as for hist_cache.evaluate. None entries are ignored.
+    branches : list[str]
+        All the branches in the tree.
+
+    Returns
+    -------
+    list[str]
+        Branches used, in the order of branches.
+    """
+    names = set()
+    for expr in expressions:
+        if expr:
+            names.update(compile(expr, '<expression>', 'eval').co_names)
+    return [b for b in branches if b in names]
+
+
+class TreeChunks(object):
+    """Read branches from a TTree in chunks, for iteration.
+
+    Uses TTree::Draw, 4 branches at a time, like tree_cache.tree_to_columns.
+    Each chunk is a dict of float64 arrays, keyed by branch name. The arrays
+    are views of buffers that are reused for the next chunk, so copy
+    anything that needs to be kept.
+
+    Iterating raises ValueError if any branch has more than one value per
+    entry, e.g. an array branch, as TTree::Draw then gives one row per value.
+
+    Parameters
+    ----------
+    tree : ROOT.TTree
+        Flat tree, with one value per branch per entry.
+    branches : list[str]
+        Branches to read.
+    chunk_size : int, optional
+        Number of entries per chunk. Default is set from max_bytes.
+    max_bytes : int, optional
+        Memory limit, used to set the chunk size.
+    """
+
+    def __init__(self, tree, branches, chunk_size=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.tree = tree
+        self.branches = list(branches)
+        self.chunk_size = chunk_size or chunk_size_for(len(self.branches), max_bytes)
+        self.n_entries = tree.GetEntries()
+        self._buffers = {b: np.empty(min(self.chunk_size, self.n_entries), dtype=np.float64)
+                         for b in self.branches}
+
+    def __iter__(self):
+        getters = [self.tree.GetV1, self.tree.GetV2, self.tree.GetV3, self.tree.GetV4]
+        self.tree.SetEstimate(min(self.chunk_size, self.n_entries) + 1)
+        for first in range(0, self.n_entries, self.chunk_size):
+            n_rows = min(self.chunk_size, self.n_entries - first)
+            for i in range(0, len(self.branches), 4):
+                group = self.branches[i:i + 4]
+                n_selected = self.tree.Draw(':'.join(group), '', 'goff', n_rows, first)
+                if n_selected != n_rows:
+                    raise ValueError('Got %d values of %s for entries %d-%d of %s; only flat '
+                                     'trees, with one value per branch per entry, are supported'
+                                     % (n_selected, ', '.join(group), first, first + n_rows - 1,
+                                        self.tree.GetName()))
+                for name, getter in zip(group, getters):
+                    buf = getter()
+                    if hasattr(buf, 'SetSize'):
+                        buf.SetSize(n_rows)
+                    self._buffers[name][:n_rows] = np.frombuffer(buf, dtype=np.float64,
+                                                                 count=n_rows)
+            yield {b: self._buffers[b][:n_rows] for b in self.branches}
+
+
+class ArrayChunks(object):
+    """Iterate over arrays, e.g. the memory-mapped ones from tree_cache,
+    in chunks, like TreeChunks.
+
+    Parameters
+    ----------
+    arrays : dict
+        Array for each branch, all the same length.
+    branches : list[str], optional
+        Branches to use. Default is all.
+    chunk_size : int, optional
+        Number of entries per chunk. Default is set from max_bytes.
+    max_bytes : int, optional
+        Memory limit, used to set the chunk size.
+    """
+
+    def __init__(self, arrays, branches=None, chunk_size=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.arrays = arrays
+        self.branches = list(branches or arrays.keys())
+        self.chunk_size = chunk_size or chunk_size_for(len(self.branches), max_bytes)
+        self.n_entries = len(arrays[self.branches[0]]) if self.branches else 0
+
+    def __iter__(self):
+        for first in range(0, self.n_entries, self.chunk_size):
+            yield {b: self.arrays[b][first:first + self.chunk_size] for b in self.branches}
+
+
+def fill_chunked(chunks, hists, selection=None, weighted=True, name=''):
+    """Fill histograms chunk by chunk, and log the throughput.
+
+    Parameters
+    ----------
+    chunks : TreeChunks or ArrayChunks
+        Chunks of branches to fill from.
+    hists : list[(str, int, [float, float])]
+        Expression, number of bins & limits for each histogram.
+    selection : str, optional
+        Only fill entries where this expression is True.
+    weighted : bool, optional
+        Weight entries by the weight branch, if it is one of the chunk's branches.
+    name : str, optional
+        Name of the tree, for logging.
+
+    Returns
+    -------
+    list[(numpy.ndarray, numpy.ndarray)]
+        Sum of weights, and sum of weights squared, for each histogram,
+        as from tree_cache.fill_hist.
+    """
+    results = [(np.zeros(nbins + 2), np.zeros(nbins + 2)) for _, nbins, _ in hists]
+    n_entries = 0
+    start = time.time()
+    for chunk in chunks:
+        for (counts, sumw2), filled in zip(results, hist_cache.fill_hists(chunk, hists,
+                                                                          selection, weighted)):
+            counts += filled[0]
+            sumw2 += filled[1]
+        n_entries += len(chunk.values()[0]) if chunk else 0
+    duration = time.time() - start
+    log.info('Filled %d histograms from %d entries of %s in %.1f s (%.0f entries/s)',
+             len(hists), n_entries, name or 'tree', duration,
+             n_entries / duration if duration > 0 else 0)
+    return results
+
+
+def fill_tree_hists(root_filename, tree_name, hists, selection=None, weighted=True,
+                    max_bytes=DEFAULT_MAX_BYTES):
+    """Fill histograms from a tree in a ROOT file, reading only the branches
+    needed, a chunk at a time.
+
+    Parameters
+    ----------
+    root_filename : str
+        ROOT file, e.g. from generateMC.
+    tree_name : str
+        Name of tree.
+    hists : list[(str, int, [float, float])]
+        Expression, number of bins & limits for each histogram.
+    selection : str, optional
+        Only fill entries where this expression is True.
+    weighted : bool, optional
+        Weight entries by the weight branch, if the tree has one.
+    max_bytes : int, optional
+        Memory limit for reading the tree.
+
+    Returns
+    -------
+    list[(numpy.ndarray, numpy.ndarray)]
+        Sum of weights, and sum of weights squared, for each histogram.
+
+    Raises
+    ------
+    IOError
+        If the ROOT file cannot be opened.
+    KeyError
+        If the tree is not in the file.
+    """
+    import ROOT
+    ROOT.PyConfig.IgnoreCommandLineOptions = True
+    rf = ROOT.TFile(root_filename, 'READ')
+    if not rf or rf.IsZombie():
+        raise IOError('Cannot open file %s' % root_filename)
+    tree = rf.Get(tree_name)
+    if not tree:
+        raise KeyError('No tree %s in %s' % (tree_name, root_filename))
+    all_branches = [b.GetName() for b in tree.GetListOfBranches()]
+    expressions = [h[0] for h in hists] + [selection]
+    if weighted:
+        expressions.append('weight')
+    branches = branches_used(expressions, all_branches)
+    chunks = TreeChunks(tree, branches, max_bytes=max_bytes)
+    log.debug('Reading %s from %s in chunks of %d entries', ', '.join(branches),
+              root_filename, chunks.chunk_size)
+    results = fill_chunked(chunks, hists, selection, weighted, tree_name)
+    rf.Close()
+    return results
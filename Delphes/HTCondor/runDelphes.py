@@ -8,6 +8,9 @@ This is mainly responsible for:
 - copying necessary inputs from hdfs
 - running program
 - copying various outputs to hdfs
+- writing a sidecar file for each output, describing its contents
+- processing only a range of events from a file, and merging the outputs
+  of several event ranges back together
 """
 
 
@@ -15,7 +18,10 @@ import os
 import argparse
 import sys
 import shutil
-from subprocess import check_call
+import json
+from subprocess import check_call, call
+sys.path.append('../Common')
+import common
 
 
 def runDelphes(in_args=sys.argv[1:]):
@@ -29,20 +35,36 @@ def runDelphes(in_args=sys.argv[1:]):
     parser.add_argument('--process', nargs=2, action='append',
                         help='File for Delphes to process, of the form: '
                         '<input file> <output file>')
+    parser.add_argument('--eventRange', nargs=2, type=int,
+                        help='Only process events [FIRST, LAST) of each input file')
+    parser.add_argument('--merge', nargs='+', action='append',
+                        help='Merge ROOT files with hadd, of the form: '
+                        '<output file> <input file> [<input file> ...]. '
+                        'The input files are deleted afterwards.')
     args = parser.parse_args(args=in_args)
     print args
 
     # Setting up Delphes, etc is handled in setupDelphes.sh
     os.chdir('delphes')
 
+    for merge_files in args.merge or []:
+        merge_outputs(merge_files[0], merge_files[1:])
+
     # Run Delphes over files
     # -------------------------------------------------------------------------
     # To save disk space, we copy over a single file, process it,
     # then copy the result to its destination.
-    for input_file, output_file in args.process:
+    for input_file, output_file in args.process or []:
         in_local = os.path.basename(input_file)
 
         copy_to_local(input_file, in_local)
+        in_metadata = get_input_sidecar(input_file)
+
+        if args.eventRange:
+            first, last = args.eventRange
+            in_local = extract_chunk(input_file, in_local, first, last)
+            if in_metadata is not None:
+                in_metadata.update({'nEvents': last - first, 'eventRange': [first, last]})
 
         # unzip if necessary
         if need_unzip(in_local):
@@ -56,6 +78,12 @@ def runDelphes(in_args=sys.argv[1:]):
         check_call([exe, os.path.join('..', args.card), out_local, in_local])
 
         copy_from_local(out_local, output_file)
+        if in_metadata is not None:
+            # Same events as the input, so start from its sidecar
+            in_metadata.update({'format': 'root', 'source': os.path.basename(input_file)})
+            out_sidecar = common.write_sidecar(out_local, in_metadata)
+            copy_from_local(out_sidecar, common.sidecar_filename(output_file))
+            os.remove(out_sidecar)
         os.remove(out_local)
         os.remove(in_local)
 
@@ -74,6 +102,134 @@ def copy_to_local(source, dest):
             shutil.copytree(source, dest)
 
 
+def get_input_sidecar(input_file):
+    """Get the contents of the sidecar for an input file, if it has one.
+
+    Parameters
+    ----------
+    input_file : str
+        Input filename on /hdfs, /storage, etc
+
+    Returns
+    -------
+    dict or None
+        Sidecar contents, or None if the input has no sidecar.
+    """
+    sidecar_local = fetch_optional(common.sidecar_filename(input_file))
+    if sidecar_local is None:
+        return None
+    with open(sidecar_local) as f:
+        metadata = json.load(f)
+    os.remove(sidecar_local)
+    return metadata
+
+
+def extract_chunk(input_file, in_local, first, last):
+    """Extract a range of events from an input file, to run Delphes on.
+
+    If the input has a BGZF index, the compressed blocks are copied directly,
+    otherwise the file is decompressed up to the last event wanted.
+
+    Parameters
+    ----------
+    input_file : str
+        Input filename on /hdfs, /storage, etc
+    in_local : str
+        Local copy of input_file. Deleted once the events are extracted.
+    first : int
+        Index of first event to keep.
+    last : int
+        Index of event after the last one to keep.
+
+    Returns
+    -------
+    str
+        Filename of local file with the events.
+    """
+    fmt = common.get_event_format(input_file)
+    stem = os.path.basename(input_file).split('.')[0]
+    chunk_stem = '%s_events%dto%d.%s' % (stem, first, last, fmt)
+    index_local = fetch_optional(common.bgzf_index_filename(input_file))
+    chunk_local = None
+    if index_local:
+        index = common.read_bgzf_index(index_local)
+        os.remove(index_local)
+        try:
+            chunk_local = chunk_stem + '.gz'
+            common.extract_bgzf_event_range(in_local, index, first, last, chunk_local)
+            print 'Copied events %d-%d from BGZF blocks' % (first, last)
+        except ValueError as err:
+            print err
+            chunk_local = None
+    if not chunk_local:
+        chunk_local = chunk_stem
+        n_events = common.extract_event_range(in_local, first, last, chunk_local, fmt)
+        print 'Extracted %d events from %d-%d' % (n_events, first, last)
+    os.remove(in_local)
+    return chunk_local
+
+
+def merge_outputs(output_file, input_files):
+    """Merge the ROOT outputs of several event ranges with hadd, and
+    combine their sidecars. The input files are deleted afterwards.
+
+    Parameters
+    ----------
+    output_file : str
+        Merged output filename on /hdfs, /storage, etc
+    input_files : list[str]
+        Filenames to merge, on /hdfs, /storage, etc
+    """
+    in_locals = [os.path.basename(f) for f in input_files]
+    for in_file, in_local in zip(input_files, in_locals):
+        copy_to_local(in_file, in_local)
+    out_local = os.path.basename(output_file)
+    check_call(['hadd', '-f', out_local] + in_locals)
+    copy_from_local(out_local, output_file)
+
+    metadatas = [get_input_sidecar(f) for f in input_files]
+    if metadatas and all(m is not None for m in metadatas):
+        metadata = metadatas[0]
+        metadata.pop('eventRange', None)
+        metadata['nEvents'] = sum(m['nEvents'] for m in metadatas)
+        out_sidecar = common.write_sidecar(out_local, metadata)
+        copy_from_local(out_sidecar, common.sidecar_filename(output_file))
+        os.remove(out_sidecar)
+
+    os.remove(out_local)
+    for in_file, in_local, in_metadata in zip(input_files, in_locals, metadatas):
+        os.remove(in_local)
+        remove_remote(in_file)
+        if in_metadata is not None:
+            remove_remote(common.sidecar_filename(in_file))
+
+
+def fetch_optional(source):
+    """Copy a file from /hdfs, /storage, etc to the local area, if it exists.
+
+    Returns
+    -------
+    str or None
+        Local filename, or None if the file doesn't exist.
+    """
+    if source.startswith('/hdfs'):
+        if call(['hadoop', 'fs', '-test', '-e', source.replace('/hdfs', '')]) != 0:
+            return None
+    elif not os.path.isfile(source):
+        return None
+    dest = os.path.basename(source)
+    copy_to_local(source, dest)
+    return dest
+
+
+def remove_remote(filename):
+    """Delete a file on /hdfs, /storage, etc"""
+    if filename.startswith('/hdfs'):
+        call(['hadoop', 'fs', '-rm', filename.replace('/hdfs', '')])
+    elif os.path.isfile(filename):
+        os.remove(filename)
+
+
 def copy_from_local(source, dest):
     """Copy file from local area to e.g. /hdfs, /storage, etc"""
     if not os.path.isdir(os.path.dirname(dest)):
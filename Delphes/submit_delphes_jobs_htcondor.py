@@ -63,6 +63,20 @@ def submit_delphes_jobs_htcondor(in_args=sys.argv[1:], delphes_dir=DELPHES_DIR,
                         help='Output directory for ROOT files. If one is not '
                         'specified, one will be created automatically at '
                         '<iDir>/../<card>_<type>')
+    parser.add_argument('--eventsPerJob',
+                        type=int,
+                        help='Group input files so each job processes up to '
+                        'this many events, using the sidecar (<file>.json) '
+                        'written alongside each input file. Files without a '
+                        'sidecar get a job each. If not specified, each job '
+                        'processes a fixed number of files.')
+    parser.add_argument('--eventsPerChunk',
+                        type=int,
+                        help='Split input files with more than this many events '
+                        'into event ranges, each processed by a separate job, '
+                        'with the outputs merged back into one file per input '
+                        'afterwards. Needs the sidecar or BGZF index (<file>.idx) '
+                        'for each input, and is much faster with the index.')
     # Some generic script options
     parser.add_argument("--dry",
                         help="Dry run, don't submit to queue.",
@@ -198,7 +212,7 @@ def create_dag(dag_filename, status_filename, condor_filename, log_dir, delphes_
 
     log.debug(os.listdir(args.iDir))
     abs_idir = os.path.realpath(args.iDir)
-    input_files = [os.path.join(abs_idir, f) for f in os.listdir(abs_idir)
+    input_files = [os.path.join(abs_idir, f) for f in sorted(os.listdir(abs_idir))
                    if accept_file(os.path.join(abs_idir, f), args.type)]
     log.debug(input_files)
     if not input_files:
@@ -215,18 +229,33 @@ def create_dag(dag_filename, status_filename, condor_filename, log_dir, delphes_
                                out_dir=log_dir, err_dir=log_dir, log_dir=log_dir,
                                memory='100MB', disk='2GB',
                                share_exe_setup=True,
-                               common_input_files=[delphes_zip, args.card],
+                               common_input_files=[delphes_zip, args.card,
+                                                   '../Common/common.py'],
                                transfer_hdfs_input=True,
                                hdfs_store=os.path.join(args.oDir, 'materials'))
 
     exe_dict = {'hepmc': './DelphesHepMC', 'lhe': './DelphesLHEF'}
     delphes_exe = exe_dict[args.type]
 
-    # We assign each job to run over a certain number of input files.
-    files_per_job = 2
-    for ind, input_files in enumerate(common.grouper(input_files, files_per_job)):
-        input_files = filter(None, input_files)
+    # Split large files into event ranges, so they can be processed in parallel
+    event_ranges = {}
+    if args.eventsPerChunk:
+        for in_file in input_files:
+            ranges = plan_event_ranges(in_file, args.eventsPerChunk)
+            if len(ranges) > 1:
+                event_ranges[in_file] = ranges
+    whole_files = [f for f in input_files if f not in event_ranges]
+
+    # We assign each job to run over a certain number of input files,
+    # or events if we know how many events are in each file
+    if args.eventsPerJob:
+        file_groups = common.group_by_events(whole_files, args.eventsPerJob)
+    else:
+        files_per_job = 2
+        file_groups = [filter(None, group) for group in common.grouper(whole_files, files_per_job)]
+    log.info('%d input files split into %d jobs', len(whole_files), len(file_groups))
 
+    for ind, input_files in enumerate(file_groups):
         job_args = ['--card', os.path.basename(args.card), '--exe', delphes_exe]
 
         # Add --process commands to job opts
@@ -240,9 +269,66 @@ def create_dag(dag_filename, status_filename, condor_filename, log_dir, delphes_
         delphes_jobset.add_job(job)
         delphes_dag.add_job(job)
 
+    # One job per event range, then a job to merge the outputs for each input
+    for ind, in_file in enumerate(sorted(event_ranges)):
+        log.info('%s split into %d jobs', os.path.basename(in_file), len(event_ranges[in_file]))
+        chunk_jobs = []
+        chunk_files = []
+        for first, last in event_ranges[in_file]:
+            chunk_file = os.path.join(args.oDir, 'chunks',
+                                      '%s_events%dto%d.root' % (stem(in_file), first, last))
+            job_args = ['--card', os.path.basename(args.card), '--exe', delphes_exe,
+                        '--process', in_file, chunk_file,
+                        '--eventRange', str(first), str(last)]
+            job = ht.Job(name='delphesChunk%d_%d' % (ind, first), args=job_args)
+            delphes_jobset.add_job(job)
+            delphes_dag.add_job(job)
+            chunk_jobs.append(job)
+            chunk_files.append(chunk_file)
+
+        out_file = os.path.join(args.oDir, stem(in_file)) + '.root'
+        merge_args = ['--card', os.path.basename(args.card), '--merge', out_file] + chunk_files
+        merge_job = ht.Job(name='delphesMerge%d' % ind, args=merge_args)
+        delphes_jobset.add_job(merge_job)
+        delphes_dag.add_job(merge_job, requires=chunk_jobs)
+
     return delphes_dag
 
 
+def plan_event_ranges(filename, events_per_chunk):
+    """Split the events in a file into ranges, to be processed by separate jobs.
+
+    The number of events comes from the file's sidecar, or its BGZF index.
+    If the file has a BGZF index, ranges start at indexed events, so
+    the events can be extracted without decompressing the file.
+
+    Parameters
+    ----------
+    filename : str
+        Input file.
+    events_per_chunk : int
+        Target number of events per range.
+
+    Returns
+    -------
+    list[(int, int)]
+        (first, last) for each range, with last not included. Empty if the
+        number of events in the file is unknown.
+    """
+    index = None
+    index_filename = common.bgzf_index_filename(filename)
+    if os.path.isfile(index_filename):
+        index = common.read_bgzf_index(index_filename)
+    n_events = common.get_n_events(filename)
+    if n_events is None and index:
+        n_events = index['nEvents']
+    if n_events is None:
+        log.warning('Cannot split %s, number of events unknown (no sidecar or index)',
+                    os.path.basename(filename))
+        return []
+    return common.split_event_ranges(n_events, events_per_chunk, index)
+
+
 def stem(filename):
     """Get rid of any .gz or .tar.gz"""
     return '.'.join(os.path.basename(filename).split('.')[0:1])
@@ -11,6 +11,8 @@ import re
 import logging
 from subprocess import check_call
 import shutil
+sys.path.append('../Common')
+import common
 
 
 logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
@@ -103,22 +105,37 @@ def run_mg5(in_args=sys.argv[1:]):
         log.debug(mg5_cmds)
         check_call(mg5_cmds)
 
+        channel = get_value_from_card(new_card, 'output')
+        output_dir = os.path.join(channel, 'Events', 'run_01')
+        lhe_file = os.path.join(output_dir, 'events.lhe.gz')
+        hepmc_file = os.path.join(output_dir, 'events_PYTHIA8_0.hepmc.gz')
+        summary_file = os.path.join(output_dir, 'summary.txt')
+
         if args.newstem:
             # rename output files to avoid generic names - can MG do this already?
-            channel = get_value_from_card(new_card, 'output')
             print os.listdir(channel)
             print os.listdir(channel + '/Events')
             print os.listdir(channel + '/Events/run_01')
 
-            output_dir = os.path.join(channel, 'Events', 'run_01')
-            shutil.move(os.path.join(output_dir, 'events.lhe.gz'),
-                        os.path.join(output_dir, args.newstem + '.lhe.gz'))
-            shutil.move(os.path.join(output_dir, 'events_PYTHIA8_0.hepmc.gz'),
-                        os.path.join(output_dir, args.newstem + '.hepmc.gz'))
+            new_lhe_file = os.path.join(output_dir, args.newstem + '.lhe.gz')
+            shutil.move(lhe_file, new_lhe_file)
+            lhe_file = new_lhe_file
+            new_hepmc_file = os.path.join(output_dir, args.newstem + '.hepmc.gz')
+            shutil.move(hepmc_file, new_hepmc_file)
+            hepmc_file = new_hepmc_file
             shutil.move(os.path.join(output_dir, 'RunMaterial.tar.gz'),
                         os.path.join(output_dir, 'RunMaterial_' + args.newstem + '.tar.gz'))
-            shutil.move(os.path.join(output_dir, 'summary.txt'),
-                        os.path.join(output_dir, 'summary_' + args.newstem + '.txt'))
+            new_summary_file = os.path.join(output_dir, 'summary_' + args.newstem + '.txt')
+            shutil.move(summary_file, new_summary_file)
+            summary_file = new_summary_file
+
+        # Describe each output in a sidecar, so nothing downstream
+        # needs to open the files to know what's in them
+        metadata = make_sidecar_metadata(summary_file, new_card, args)
+        for fmt, filename in [('lhe', lhe_file), ('hepmc', hepmc_file)]:
+            if os.path.isfile(filename):
+                metadata['format'] = fmt
+                log.info('Writing sidecar %s' % common.write_sidecar(filename, metadata))
     return 0
 
 
@@ -172,6 +189,77 @@ def make_card(in_card, out_card, fields):
         out_file.write(''.join(card_template))
 
 
+def parse_mg5_summary(summary_file):
+    """Get the number of events and cross section from a MG5_aMC summary file.
+
+    Parameters
+    ----------
+    summary_file : str
+        Filename of summary.txt from the run.
+
+    Returns
+    -------
+    dict
+        With keys nEvents, sigma_pb, sigmaErr_pb. Any that cannot be found
+        in the summary are None.
+    """
+    results = {'nEvents': None, 'sigma_pb': None, 'sigmaErr_pb': None}
+    if not os.path.isfile(summary_file):
+        log.warning('No summary file %s' % summary_file)
+        return results
+    number = r'([-+0-9.eE]+)'
+    p_xsec = re.compile(r'(?:Total cross[- ]section|Cross-section)\s*:\s*' +
+                        number + r'\s*\+-\s*' + number + r'\s*pb', re.IGNORECASE)
+    p_nevents = re.compile(r'(?:Number of events generated|Nb of events)\s*:\s*(\d+)',
+                           re.IGNORECASE)
+    with open(summary_file) as f:
+        for line in f:
+            m = p_xsec.search(line)
+            if m:
+                results['sigma_pb'] = float(m.group(1))
+                results['sigmaErr_pb'] = float(m.group(2))
+            m = p_nevents.search(line)
+            if m:
+                results['nEvents'] = int(m.group(1))
+    return results
+
+
+def make_sidecar_metadata(summary_file, card, args):
+    """Make the metadata for the sidecar files of the outputs, in the same
+    format as generateMC (see Common/common.py).
+
+    Parameters
+    ----------
+    summary_file : str
+        Filename of summary.txt from the run.
+    card : str
+        Card used for the run.
+    args : argparse.Namespace
+        User's args.
+
+    Returns
+    -------
+    dict
+        Metadata common to all outputs of the run.
+    """
+    summary = parse_mg5_summary(summary_file)
+    n_events = summary['nEvents'] if summary['nEvents'] is not None else args.nevents
+    pb_to_mb = 1E-9
+
+    def to_mb(value):
+        return value * pb_to_mb if value is not None else None
+
+    return {
+        'generator': 'MG5_aMC',
+        'nEvents': n_events,
+        'sigmaGen_mb': to_mb(summary['sigma_pb']),
+        'sigmaErr_mb': to_mb(summary['sigmaErr_pb']),
+        'seed': args.iseed,
+        'card': os.path.basename(card),
+        'cardHash': common.file_checksum(card)[1]
+    }
+
+
 def get_value_from_card(card, field):
     """Get value of field from card.
 
@@ -205,7 +205,8 @@ def create_dag(dag_filename, condor_filename, status_filename, zip_filename, log
                            filename=condor_filename,
                            out_dir=log_dir, err_dir=log_dir, log_dir=log_dir,
                            memory="100MB", disk="2GB", share_exe_setup=True,
-                           common_input_files=[mg5_args.card, zip_filename],
+                           common_input_files=[mg5_args.card, zip_filename,
+                                               '../Common/common.py'],
                            hdfs_store=os.path.join(args.oDir, 'materials'))
 
     for job_ind in xrange(args.jobIdRange[0], args.jobIdRange[1] + 1):
@@ -263,6 +264,8 @@ def generate_mg5_job(args, mg5_args, zip_filename, job_index):
     job_opts.extend(['--newstem', name_stem])
     output_files = [os.path.join(output_dir, name_stem + '.lhe.gz'),
                     os.path.join(output_dir, name_stem + '.hepmc.gz'),
+                    os.path.join(output_dir, name_stem + '.lhe.gz.json'),
+                    os.path.join(output_dir, name_stem + '.hepmc.gz.json'),
                     os.path.join(output_dir, 'RunMaterial_' + name_stem + '.tar.gz'),
                     os.path.join(output_dir, 'summary_' + name_stem + '.txt')]
 
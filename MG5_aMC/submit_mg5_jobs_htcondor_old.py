@@ -162,6 +162,11 @@ def submit_mc_jobs_htcondor(in_args=sys.argv[1:], mg5_dir=MG5_DIR):
     if not args.dry:
         log.debug('Copying across exe...')
         shutil.copy2('run_mg5.py', sandbox_script)
+    # run_mg5.py needs the common module to write sidecar files
+    sandbox_common = os.path.join(args.oDir, 'common.py')
+    copy_to_local[sandbox_common] = 'common.py'
+    if not args.dry:
+        shutil.copy2('../Common/common.py', sandbox_common)
 
     # Setup log directory
     # -------------------------------------------------------------------------
@@ -258,6 +263,11 @@ def write_dag_file(dag_filename, condor_filename, status_filename, log_dir,
 
             job_opts.extend(['--copyFromLocal', lhe_zip, os.path.join(args.oDir, 'lhe', lhe_final_zip)])
             job_opts.extend(['--copyFromLocal', hepmc_zip, os.path.join(args.oDir, 'hepmc', hepmc_final_zip)])
+            # sidecars describing the contents of each file
+            job_opts.extend(['--copyFromLocal', lhe_zip + '.json',
+                             os.path.join(args.oDir, 'lhe', lhe_final_zip + '.json')])
+            job_opts.extend(['--copyFromLocal', hepmc_zip + '.json',
+                             os.path.join(args.oDir, 'hepmc', hepmc_final_zip + '.json')])
             # Supplementary materials
             job_opts.extend(['--copyFromLocal', os.path.join(output_dir, 'RunMaterial.tar.gz'),
                              os.path.join(args.oDir, 'other', 'RunMaterial_%d.tar.gz' % job_ind)])
@@ -13,6 +13,8 @@ import argparse
 import json
 import logging
 from subprocess import check_call
+sys.path.append('../Common')
+import common
 
 
 logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
@@ -173,7 +175,10 @@ def create_filelist(channel, chan_dict, out_dir):
     channel : str
         Name of the channel. Used for the filelist filename.
     chan_dict : dict
-        Dictionary of info corresponding to each channel
+        Dictionary of info corresponding to each channel. 'num' is the
+        maximum number of files (<= 0 for all), and the optional 'nevents' is
+        the number of events wanted, counted using the sidecar (<file>.json)
+        of each file. Files stop being added once either is reached.
     out_dir : str
         Output directory for filelist.
 
@@ -193,10 +198,22 @@ def create_filelist(channel, chan_dict, out_dir):
     with open(filename, 'w') as flist:
         log.debug('Writing filelist %s', channel)
         n_files = chan_dict['num']
+        n_events_wanted = chan_dict.get('nevents', -1)
+        n_events = 0
         for i, f in enumerate(dir_file_iter(chan_dict['dirs'], '.root')):
             if i >= n_files and n_files > 0:
                 break
+            if n_events >= n_events_wanted and n_events_wanted > 0:
+                break
             flist.write('%s\n' % f)
+            if n_events_wanted > 0:
+                n_events_file = common.get_n_events(f)
+                if n_events_file is None:
+                    log.warning('No sidecar for %s, cannot count its events', f)
+                else:
+                    n_events += n_events_file
+        if n_events_wanted > 0:
+            log.info('%s: %d events from sidecars', channel, n_events)
 
     return os.path.realpath(filename)
 
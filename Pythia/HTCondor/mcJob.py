@@ -6,10 +6,12 @@ User should not run this script directly!
 
 
 import argparse
-from subprocess import call
+from subprocess import call, Popen
 import sys
 import shutil
 import os
+import signal
+import errno
 
 
 def main(in_args=sys.argv[1:]):
@@ -53,10 +55,22 @@ def main(in_args=sys.argv[1:]):
 
     # Run the program
     # -------------------------------------------------------------------------
+    # If the job is evicted, condor sends us SIGTERM. Pass it on to the
+    # program so it stops cleanly, then carry on and copy back the partial
+    # output as usual.
     os.chmod(args.exe, 0555)
     cmds = ["./" + args.exe] + args.args
     print cmds
-    call(cmds)
+    proc = Popen(cmds)
+
+    def forward_signal(signum, frame):
+        print 'Received signal %d, passing on to program' % signum
+        proc.send_signal(signum)
+
+    signal.signal(signal.SIGTERM, forward_signal)
+    signal.signal(signal.SIGINT, forward_signal)
+    wait_for_process(proc)
+    print 'Program exited with code %d' % proc.returncode
 
     print os.listdir(os.getcwd())
 
@@ -64,6 +78,10 @@ def main(in_args=sys.argv[1:]):
     # -------------------------------------------------------------------------
     for (source, dest) in args.copyFromLocal:
         print source, dest
+        if not os.path.exists(source):
+            # e.g. mass points not reached before being stopped
+            print 'Output %s does not exist, skipping' % source
+            continue
         if dest.startswith('/hdfs'):
             dest = dest.replace('/hdfs', '')
             call(['hadoop', 'fs', '-copyFromLocal', '-f', source, dest])
@@ -74,5 +92,23 @@ def main(in_args=sys.argv[1:]):
                 shutil.copytree(source, dest)
 
 
+def wait_for_process(proc):
+    """Wait for a process to finish, even if interrupted by signals.
+
+    Parameters
+    ----------
+    proc : subprocess.Popen
+        Process to wait for.
+    """
+    while True:
+        try:
+            proc.wait()
+            return
+        except OSError as err:
+            # wait() gets interrupted if we receive a signal
+            if err.errno != errno.EINTR:
+                raise
+
+
 if __name__ == "__main__":
     main()
@@ -22,6 +22,10 @@ readable on a small screen, and allows for side-by-side windows.
 # Here we load both standard and third-party packages.
 import sys  # allows us to get any commandline options
 import ROOT
+# Our own modules live in Common, so tell python where to find them
+sys.path.append('../../Common')
+import tree_cache
+import tree_chunks
 
 
 # ROOT likes to screw up the user's arguments, stop this:
@@ -288,6 +292,38 @@ def print_tree_vars(filename):
     rf.Close()
 
 
+def make_chunked_plot(filename, fmt='pdf'):
+    """
+    Looping over every entry like in print_tree_vars is very slow for big
+    trees (e.g. merged files with millions of entries). Instead we can fill
+    histograms with NumPy, a chunk of entries at a time.
+
+    filename: str
+        Name of file to be processed.
+    fmt: str
+        Output file format for plots.
+    """
+
+    # Each histogram is (expression, number of bins, [lower edge, upper edge])
+    # Expressions are python, and can use numpy functions like abs(), hypot()
+    hists = [('a1Pt', 50, [0, 100]),
+             ('a1Phi * 180. / pi', 36, [-180, 180])]
+
+    # Only the branches used are read, in chunks small enough to stay below
+    # max_bytes of memory. It prints how many entries/s it managed.
+    results = tree_chunks.fill_tree_hists(filename, 'a1Vars', hists,
+                                          selection='a1Pt > 10',
+                                          max_bytes=100 * 1024 * 1024)
+
+    # We get back the bin contents & errors, so turn them into ROOT histograms
+    # to draw them
+    canv = ROOT.TCanvas('c1', 'Chunked Plot', 800, 600)
+    for i, ((expr, nbins, xlim), (counts, sumw2)) in enumerate(zip(hists, results)):
+        h = tree_cache.make_th1('h_chunked_%d' % i, ';%s;N' % expr, counts, sumw2, nbins, xlim)
+        h.Draw('HISTE')
+        canv.SaveAs('chunked_plot_%d.%s' % (i, fmt))
+
+
 if __name__ == "__main__":
     """
     This part only runs if script is executed.
@@ -306,3 +342,4 @@ if __name__ == "__main__":
     make_easy_2d_plot(filename=sys.argv[1], fmt='png')  # We can use the argument name when calling it! Make things SO much clearer
     make_harder_plot(sys.argv[1])
     print_tree_vars(sys.argv[1])
+    make_chunked_plot(sys.argv[1])
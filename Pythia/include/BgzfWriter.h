@@ -0,0 +1,117 @@
+#ifndef BGZFWRITER_H
+#define BGZFWRITER_H
+
+#include <cstdint>
+#include <fstream>
+#include <string>
+#include <vector>
+
+/**
+ * @brief Writes blocked gzip (BGZF) files, as used by samtools/htslib.
+ * @details The output is a series of gzip members ("blocks"), each holding
+ * up to ~64 KB of uncompressed data, so it can be read by any gzip reader.
+ * Since each block can be decompressed on its own, reading can start at the
+ * start of any block. Positions are given as "virtual offsets":
+ * (compressed offset of block << 16) | offset within uncompressed block.
+ *
+ * e.g.
+ *   BgzfWriter writer("out.hepmc.gz");
+ *   writer.write(header);
+ *   writer.flush();  // start a new block
+ *   uint64_t offset = writer.tell();
+ *   writer.write(event);
+ *   writer.close();
+ */
+class BgzfWriter
+{
+  public:
+    /**
+     * @brief Ctor, opens the output file.
+     *
+     * @param filename Output filename
+     * @param level zlib compression level (1-9)
+     */
+    BgzfWriter(const std::string & filename, int level = 6);
+
+    virtual ~BgzfWriter();
+
+    /**
+     * @brief Maximum number of uncompressed bytes per block.
+     * @details Same as htslib, small enough that the compressed block
+     * always fits in 64 KB, even if the data is incompressible.
+     */
+    static const size_t kMaxBlockSize = 0xff00;
+
+    bool isOpen() const { return out_.is_open(); }
+
+    /**
+     * @brief Add data to the file. Blocks are written out as they fill up.
+     */
+    void write(const std::string & data);
+
+    /**
+     * @brief Write out the current block, if it has any data,
+     * so the next data starts a new block.
+     */
+    void flush();
+
+    /**
+     * @brief Size of the current (unwritten) block in bytes
+     */
+    size_t blockSize() const { return buffer_.size(); }
+
+    /**
+     * @brief Virtual offset of the next byte to be written
+     */
+    uint64_t tell() const { return (blockOffset_ << 16) | buffer_.size(); }
+
+    /**
+     * @brief Write out the last block and the empty end-of-file block,
+     * and close the file.
+     *
+     * @return true if all writes succeeded
+     */
+    bool close();
+
+  private:
+    void writeBlock(const char * data, size_t size);
+
+    std::ofstream out_;
+    int level_;
+    std::string buffer_;
+    std::vector<unsigned char> compressed_;
+    uint64_t blockOffset_;  // compressed offset of the current block
+};
+
+
+/**
+ * @brief Compress a text file of events (HepMC or LHE) into BGZF, with
+ * an index of the virtual offsets of every Nth event.
+ * @details Events are never split across blocks unless a single event is
+ * larger than a block. Every indexed event, and the text after the last
+ * event (e.g. the end tag), starts a new block, so the file can be split
+ * at any indexed event just by copying blocks.
+ *
+ * The index is a text file, with lines:
+ *   event <event number, from 0> <virtual offset>
+ *   footer <virtual offset of text after the last event>
+ *   nEvents <total number of events>
+ *
+ * @param input Uncompressed input file
+ * @param output BGZF output file
+ * @param indexFilename Output file for the index
+ * @param eventStart Lines starting with this start a new event,
+ * e.g. "E " for HepMC, "<event" for LHE
+ * @param footerStart Lines starting with this start the text after the
+ * last event, e.g. "HepMC::IO_GenEvent-END" for HepMC,
+ * "</LesHouchesEvents>" for LHE
+ * @param indexInterval Index every this many events
+ *
+ * @return true if compressed successfully
+ */
+bool bgzfCompressEvents(const std::string & input, const std::string & output,
+                        const std::string & indexFilename,
+                        const std::string & eventStart, const std::string & footerStart,
+                        int indexInterval);
+
+#endif
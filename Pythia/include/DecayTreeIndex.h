@@ -0,0 +1,123 @@
+#ifndef DECAYTREEINDEX_H
+#define DECAYTREEINDEX_H
+
+#include <vector>
+
+#include "Pythia8/Pythia.h"
+
+/**
+ * @brief A contiguous range of particle indices, e.g. the children or
+ * descendants of a particle. Iterating over it gives the index of each
+ * particle in the event record.
+ * @details Holds a pointer to the underlying buffer, not to its data, so it
+ * stays valid if the buffer grows (e.g. when looking up the descendants of
+ * another particle inside a loop over this range).
+ */
+class ParticleRange
+{
+  public:
+    class const_iterator
+    {
+      public:
+        const_iterator(const std::vector<int> * buffer, int pos) : buffer_(buffer), pos_(pos) {}
+        int operator*() const { return buffer_ ? (*buffer_)[pos_] : pos_; }
+        const_iterator & operator++() { ++pos_; return *this; }
+        bool operator!=(const const_iterator & other) const { return pos_ != other.pos_; }
+      private:
+        const std::vector<int> * buffer_;
+        int pos_;
+    };
+
+    /**
+     * @brief Range of consecutive particle indices [begin, end)
+     */
+    ParticleRange(int begin, int end) : buffer_(nullptr), begin_(begin), end_(end) {}
+
+    /**
+     * @brief Range of entries [begin, end) in a buffer of particle indices
+     */
+    ParticleRange(const std::vector<int> * buffer, int begin, int end) :
+      buffer_(buffer), begin_(begin), end_(end) {}
+
+    const_iterator begin() const { return const_iterator(buffer_, begin_); }
+
+    const_iterator end() const { return const_iterator(buffer_, end_); }
+
+    int size() const { return end_ - begin_; }
+
+    bool empty() const { return end_ == begin_; }
+
+  private:
+    const std::vector<int> * buffer_;
+    int begin_;
+    int end_;
+};
+
+
+/**
+ * @brief Index of the decay tree of a Pythia8::Event, to quickly loop over
+ * the children or descendants of a particle.
+ * @details build() makes one pass over the event to store the range of
+ * children of each particle. Descendants are found on demand, and stored so
+ * asking again for the same particle costs nothing. All buffers are reused
+ * between events, so after the first few events no memory is allocated.
+ *
+ * Only ranges of children (daughter1 <= daughter2) are followed, as in
+ * the decays we're interested in.
+ *
+ * The event must not change between build() and any lookups.
+ */
+class DecayTreeIndex
+{
+  public:
+    DecayTreeIndex();
+
+    virtual ~DecayTreeIndex();
+
+    /**
+     * @brief Index a new event, replacing any previous one.
+     *
+     * @param event Event to index
+     */
+    void build(const Pythia8::Event & event);
+
+    /**
+     * @brief Get the children of a particle.
+     *
+     * @param iParticle Index of particle in the event record
+     *
+     * @return Range of children indices
+     */
+    ParticleRange children(int iParticle) const;
+
+    /**
+     * @brief Get all descendants of a particle. Iterates through all the
+     * generations of children, until they are all final state (status > 0).
+     * Descendants are ordered generation by generation.
+     *
+     * @param iParticle Index of particle in the event record
+     * @param finalStateOnly If true, returns only descendants which are final
+     * state. Otherwise, returns all intermediate children as well.
+     *
+     * @return Range of descendant indices
+     */
+    ParticleRange descendants(int iParticle, bool finalStateOnly);
+
+  private:
+    // Children of particle i are [childBegin_[i], childEnd_[i])
+    std::vector<int> childBegin_;
+    std::vector<int> childEnd_;
+    std::vector<bool> isFinal_;
+
+    // Descendants of particle i are [descBegin_[k][i], descEnd_[k][i]) in
+    // descendants_, where k = 1 for final state only, 0 otherwise.
+    // descBegin_ < 0 if not yet found.
+    std::vector<int> descBegin_[2];
+    std::vector<int> descEnd_[2];
+    std::vector<int> descendants_;
+
+    // Queue for the breadth-first search of descendants
+    std::vector<int> queue_;
+};
+
+#endif
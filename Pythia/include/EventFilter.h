@@ -0,0 +1,177 @@
+#ifndef EVENTFILTER_H
+#define EVENTFILTER_H
+
+#include <memory>
+#include <string>
+#include <vector>
+
+#include "Pythia8/Pythia.h"
+
+#include "JsonObject.h"
+
+/**
+ * @brief Base class for generator-level event filters.
+ * @details To add a new filter, inherit from this class, implement pass(),
+ * and add it to a FilterChain.
+ */
+class EventFilter
+{
+  public:
+    EventFilter(const std::string & name);
+
+    virtual ~EventFilter();
+
+    /**
+     * @brief Decide whether to keep an event.
+     *
+     * @param event Event to test
+     *
+     * @return true if event should be kept
+     */
+    virtual bool pass(const Pythia8::Event & event) = 0;
+
+    std::string name() const { return name_; }
+
+  private:
+    std::string name_;
+};
+
+
+/**
+ * @brief Requirements on final-state leptons, shared by the lepton filters.
+ */
+struct LeptonSelection {
+  std::vector<int> pdgIds;  // absolute PDGIDs of leptons to consider
+  double ptMin;  // minimum pT in GeV
+  double etaMax;  // maximum |eta|
+
+  /**
+   * @brief Check if a particle is a final-state lepton passing the requirements.
+   */
+  bool select(const Pythia8::Particle & p) const;
+};
+
+
+/**
+ * @brief Require at least N final-state leptons.
+ * @details Stops looking through the event once N leptons are found.
+ */
+class NLeptonFilter : public EventFilter
+{
+  public:
+    NLeptonFilter(const std::string & name, int nLeptons, const LeptonSelection & selection);
+
+    virtual ~NLeptonFilter();
+
+    virtual bool pass(const Pythia8::Event & event);
+
+  private:
+    int nLeptons_;
+    LeptonSelection selection_;
+};
+
+
+/**
+ * @brief Require at least one pair of same-sign final-state leptons.
+ * @details Stops looking through the event once a pair is found.
+ */
+class SameSignPairFilter : public EventFilter
+{
+  public:
+    SameSignPairFilter(const std::string & name, const LeptonSelection & selection);
+
+    virtual ~SameSignPairFilter();
+
+    virtual bool pass(const Pythia8::Event & event);
+
+  private:
+    LeptonSelection selection_;
+};
+
+
+/**
+ * @brief Number of events passing/failing a filter stage, and time spent in it.
+ */
+struct FilterStageSummary {
+  std::string name;
+  long nPass;
+  long nFail;
+  double seconds;
+};
+
+
+/**
+ * @brief Runs a set of filters in order, stopping at the first one an
+ * event fails. Keeps count of events passing & failing each stage,
+ * and the time spent in each.
+ */
+class FilterChain
+{
+  public:
+    FilterChain();
+
+    virtual ~FilterChain();
+
+    /**
+     * @brief Add a filter to the end of the chain. The chain takes ownership.
+     */
+    void addFilter(std::unique_ptr<EventFilter> filter);
+
+    /**
+     * @brief Run the event through the filters.
+     *
+     * @param event Event to test
+     *
+     * @return true if the event passes all filters (or there are none)
+     */
+    bool pass(const Pythia8::Event & event);
+
+    bool empty() const { return filters_.empty(); }
+
+    /**
+     * @brief Number of events passed to pass()
+     */
+    long nEvents() const { return nEvents_; }
+
+    /**
+     * @brief Number of events passing all filters
+     */
+    long nPassed() const { return nPassed_; }
+
+    std::vector<FilterStageSummary> stages() const { return stages_; }
+
+    /**
+     * @brief Combine stage summaries from several chains with the same
+     * filters, e.g. one per thread.
+     *
+     * @param chains Stage summaries from each chain
+     *
+     * @return Summed stage summaries
+     */
+    static std::vector<FilterStageSummary> combine(
+      const std::vector<std::vector<FilterStageSummary>> & chains);
+
+    /**
+     * @brief Summarise stages as JSON, e.g. for the sidecar file.
+     *
+     * @param nEvents Number of events passed to the chain
+     * @param stages Stage summaries
+     */
+    static JsonObject toJson(long nEvents, const std::vector<FilterStageSummary> & stages);
+
+    /**
+     * @brief Print a table of stage summaries to STDOUT.
+     *
+     * @param nEvents Number of events passed to the chain
+     * @param stages Stage summaries
+     */
+    static void print(long nEvents, const std::vector<FilterStageSummary> & stages);
+
+  private:
+    std::vector<std::unique_ptr<EventFilter>> filters_;
+    std::vector<FilterStageSummary> stages_;
+    long nEvents_;
+    long nPassed_;
+};
+
+#endif
@@ -0,0 +1,86 @@
+#ifndef GENJETCLUSTERER_H
+#define GENJETCLUSTERER_H
+
+#include <string>
+#include <vector>
+
+#include "Pythia8/Pythia.h"
+#include "fastjet/PseudoJet.hh"
+#include "fastjet/JetDefinition.hh"
+
+/**
+ * @brief Cluster the visible final state particles of a Pythia8::Event into
+ * generator-level jets with FastJet, e.g. for quick jet studies without
+ * running Delphes.
+ * @details Neutrinos (and any other invisible particles) are not clustered.
+ * Each jet is flavour tagged by ghost association: the last b hadrons in the
+ * decay chain are added with a tiny momentum, so they don't change the jets,
+ * and the number of them in each jet is counted.
+ *
+ * The input & output buffers are reused between events, so after the first
+ * few events only FastJet's own ClusterSequence allocates memory.
+ */
+class GenJetClusterer
+{
+  public:
+    /**
+     * @brief Ctor
+     *
+     * @param algorithm Jet algorithm: antikt, kt, or cambridge
+     * @param R Jet radius parameter
+     * @param ptMin Minimum jet pT in GeV
+     * @param etaMax Maximum |eta| of jets
+     */
+    GenJetClusterer(const std::string & algorithm, double R, double ptMin, double etaMax);
+
+    virtual ~GenJetClusterer();
+
+    /**
+     * @brief Convert the name of a jet algorithm to its FastJet enum.
+     *
+     * @param name antikt, kt, or cambridge
+     *
+     * @return FastJet jet algorithm
+     * @throws std::runtime_error if the name is not recognised
+     */
+    static fastjet::JetAlgorithm algorithmFromName(const std::string & name);
+
+    /**
+     * @brief Cluster an event into jets.
+     *
+     * @param event Event record (after hadronisation & decays)
+     *
+     * @return Jets passing the pT & eta cuts, ordered by decreasing pT.
+     * Only valid until the next call.
+     */
+    const std::vector<fastjet::PseudoJet> & cluster(const Pythia8::Event & event);
+
+    /**
+     * @brief Get the number of ghost b hadrons in a jet from the last cluster()
+     *
+     * @param iJet Index of jet in the vector returned by cluster()
+     */
+    int nBHadrons(unsigned int iJet) const { return nBHadrons_.at(iJet); }
+
+    /**
+     * @brief Description of the jet definition & cuts, e.g. for printing
+     */
+    std::string description() const;
+
+  private:
+    /**
+     * @brief Check if a PDGID is a hadron containing a b quark
+     */
+    static bool isBHadron(int idAbs);
+
+    fastjet::JetDefinition jetDef_;
+    double ptMin_;
+    double etaMax_;
+
+    // Reused for every event
+    std::vector<fastjet::PseudoJet> particles_;
+    std::vector<fastjet::PseudoJet> jets_;
+    std::vector<int> nBHadrons_;
+};
+
+#endif
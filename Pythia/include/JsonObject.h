@@ -0,0 +1,76 @@
+#ifndef JSONOBJECT_H
+#define JSONOBJECT_H
+
+#include <string>
+#include <utility>
+#include <vector>
+
+/**
+ * @brief Minimal builder for JSON objects, used for writing sidecar files
+ * alongside the outputs. Keys are kept in the order they are added.
+ * @details Each value is serialised when it is added, so nested objects
+ * should be complete before adding them to their parent.
+ *
+ * e.g.
+ *   JsonObject obj;
+ *   obj.add("nEvents", 100).add("filename", "out.hepmc");
+ *   obj.write("out.json");
+ */
+class JsonObject
+{
+  public:
+    JsonObject();
+
+    virtual ~JsonObject();
+
+    JsonObject & add(const std::string & key, const std::string & value);
+
+    JsonObject & add(const std::string & key, const char * value);
+
+    JsonObject & add(const std::string & key, int value);
+
+    JsonObject & add(const std::string & key, long value);
+
+    JsonObject & add(const std::string & key, long long value);
+
+    JsonObject & add(const std::string & key, unsigned long value);
+
+    /**
+     * @brief Add a floating point value. Non-finite values are stored as null.
+     */
+    JsonObject & add(const std::string & key, double value);
+
+    JsonObject & add(const std::string & key, bool value);
+
+    JsonObject & add(const std::string & key, const JsonObject & value);
+
+    JsonObject & add(const std::string & key, const std::vector<JsonObject> & values);
+
+    JsonObject & add(const std::string & key, const std::vector<double> & values);
+
+    /**
+     * @brief Get the object as a single line of JSON
+     */
+    std::string str() const;
+
+    /**
+     * @brief Write the object to file, replacing any existing file.
+     * @details Written to a temporary file first, then renamed, so readers
+     * never see a partially written file.
+     *
+     * @param filename Name of output file
+     *
+     * @return true if written successfully
+     */
+    bool write(const std::string & filename) const;
+
+  private:
+    static std::string quote(const std::string & str);
+
+    static std::string number(double value);
+
+    // key, serialised value
+    std::vector<std::pair<std::string, std::string>> entries_;
+};
+
+#endif
@@ -0,0 +1,76 @@
+#ifndef OUTPUTMERGER_H
+#define OUTPUTMERGER_H
+
+#include <string>
+#include <vector>
+
+/**
+ * Functions to handle the per-thread output files when running generateMC
+ * with several threads. Each thread writes to its own "part" file, and these
+ * are merged (in thread order, so the result is reproducible) into the final
+ * output file once all threads have finished.
+ */
+
+/**
+ * @brief Get the name of the part file a thread should write to.
+ * @details If only 1 thread is used, the filename is returned unchanged.
+ * Otherwise "_thread<index>" is inserted before the file extension,
+ * e.g. out.hepmc -> out_thread2.hepmc
+ *
+ * @param filename Final output filename
+ * @param threadIndex Index of thread
+ * @param nThreads Total number of threads
+ *
+ * @return Filename for this thread
+ */
+std::string threadFilename(const std::string & filename, int threadIndex, int nThreads);
+
+/**
+ * @brief Merge HepMC IO_GenEvent files into one file.
+ * @details Only the header of the first file is kept, and the event listings
+ * of all files are concatenated. Events are renumbered 0, 1, 2, ... in the
+ * merged file, as each thread numbers its own events from 0.
+ *
+ * @param inputs Filenames to merge, in order
+ * @param output Filename of merged file
+ *
+ * @return true if merged successfully
+ */
+bool mergeHepMCFiles(const std::vector<std::string> & inputs, const std::string & output);
+
+/**
+ * @brief Merge LHE files into one file.
+ * @details The header and <init> block of the first file are kept, with
+ * the process cross section and error replaced by the combined values.
+ * The <event> blocks of all files are concatenated.
+ *
+ * @param inputs Filenames to merge, in order
+ * @param output Filename of merged file
+ * @param sigma Combined cross section (in pb)
+ * @param sigmaErr Error on combined cross section (in pb)
+ *
+ * @return true if merged successfully
+ */
+bool mergeLHEFiles(const std::vector<std::string> & inputs, const std::string & output,
+                   double sigma, double sigmaErr);
+
+/**
+ * @brief Merge ROOT files into one file, using TFileMerger.
+ *
+ * @param inputs Filenames to merge, in order
+ * @param output Filename of merged file
+ * @param compression ROOT compression setting for merged file
+ *
+ * @return true if merged successfully
+ */
+bool mergeROOTFiles(const std::vector<std::string> & inputs, const std::string & output,
+                    int compression = 1);
+
+/**
+ * @brief Delete files, e.g. part files after merging.
+ *
+ * @param filenames Files to delete.
+ */
+void removeFiles(const std::vector<std::string> & filenames);
+
+#endif
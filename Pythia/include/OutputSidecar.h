@@ -0,0 +1,49 @@
+#ifndef OUTPUTSIDECAR_H
+#define OUTPUTSIDECAR_H
+
+#include <string>
+
+#include "JsonObject.h"
+
+/**
+ * Functions to write a small JSON "sidecar" file next to each output file,
+ * e.g. out.hepmc.gz -> out.hepmc.gz.json, holding the number of events,
+ * cross section, seed, etc. This lets job planners and analysis scripts
+ * know what is in a file without having to read (and unzip) it.
+ * Common/common.py reads & writes the same format.
+ */
+
+/**
+ * @brief Get the name of the sidecar file for an output file.
+ *
+ * @param filename Output filename
+ *
+ * @return filename + ".json"
+ */
+std::string sidecarFilename(const std::string & filename);
+
+/**
+ * @brief Get the checksum of a file, as "crc32:<8 hex digits>".
+ * @details CRC32 as calculated by zlib, so it can be checked in python
+ * with zlib.crc32.
+ *
+ * @param filename File to checksum
+ * @param nBytes Set to the size of the file in bytes
+ *
+ * @return Checksum string, empty if the file couldn't be read
+ */
+std::string fileChecksum(const std::string & filename, unsigned long & nBytes);
+
+/**
+ * @brief Write the sidecar file for an output file.
+ * @details The size & checksum of the output file are added to the
+ * metadata, so it must be complete (e.g. zipped) before calling this.
+ *
+ * @param filename Output filename
+ * @param metadata Info about the contents of the file, e.g. number of events
+ *
+ * @return true if written successfully
+ */
+bool writeSidecar(const std::string & filename, JsonObject metadata);
+
+#endif
@@ -0,0 +1,126 @@
+#ifndef PROGRESSMONITOR_H
+#define PROGRESSMONITOR_H
+
+#include <chrono>
+#include <string>
+#include <utility>
+#include <vector>
+
+#include "JsonObject.h"
+
+/**
+ * @brief Keeps track of the progress of event generation: time spent in each
+ * phase of the event loop, output file sizes, memory use, and when progress
+ * reports are due.
+ * @details Used to write one JSON object per line to the progress file
+ * every reportInterval seconds, and a short line to STDOUT every
+ * printInterval seconds, so job logs stay small.
+ */
+class ProgressMonitor
+{
+  public:
+    /**
+     * @brief Phases of the event loop that are timed
+     */
+    enum Phase { kGenerate = 0, kConvert, kWrite, kAnalysis, kNPhases };
+
+    /**
+     * @brief Ctor
+     *
+     * @param reportInterval Seconds between progress reports
+     * @param printInterval Seconds between printouts to STDOUT. 0 = never.
+     */
+    ProgressMonitor(double reportInterval, double printInterval);
+
+    virtual ~ProgressMonitor();
+
+    /**
+     * @brief Add an output file, whose size is included in reports.
+     *
+     * @param label Label for the output in reports, e.g. "hepmc"
+     * @param filename Name of file
+     */
+    void addOutput(const std::string & label, const std::string & filename);
+
+    /**
+     * @brief Add time spent in a phase of the event loop.
+     */
+    void addTime(Phase phase, double seconds) { phaseSeconds_[phase] += seconds; }
+
+    /**
+     * @brief Check if a progress report is due. Always true for the first call.
+     */
+    bool reportDue();
+
+    /**
+     * @brief Check if a printout to STDOUT is due. Always true for the first call.
+     */
+    bool printDue();
+
+    /**
+     * @brief Make a progress report, and reset the time until the next one.
+     *
+     * @param nEvents Number of events kept so far
+     * @param nGenerated Number of events generated so far, before filters
+     * @param nTried Number of events tried by Pythia so far
+     *
+     * @return JSON object with the report
+     */
+    JsonObject report(long nEvents, long nGenerated, long nTried);
+
+    /**
+     * @brief Seconds since the monitor was created
+     */
+    double elapsed() const;
+
+    /**
+     * @brief Get the resident set size of this process in bytes,
+     * or -1 if it can't be determined.
+     */
+    static long currentRSS();
+
+  private:
+    typedef std::chrono::steady_clock Clock;
+
+    double reportInterval_;
+    double printInterval_;
+    Clock::time_point startTime_;
+    Clock::time_point lastReport_;
+    Clock::time_point lastPrint_;
+    bool reported_;
+    bool printed_;
+    long lastEvents_;
+    std::vector<std::pair<std::string, std::string>> outputs_;  // label, filename
+    double phaseSeconds_[kNPhases];
+};
+
+
+/**
+ * @brief Adds the time from its creation to its destruction to a phase
+ * of a ProgressMonitor, e.g.
+ *   {
+ *     PhaseTimer timer(monitor, ProgressMonitor::kGenerate);
+ *     pythia.next();
+ *   }
+ */
+class PhaseTimer
+{
+  public:
+    PhaseTimer(ProgressMonitor & monitor, ProgressMonitor::Phase phase):
+      monitor_(monitor),
+      phase_(phase),
+      start_(std::chrono::steady_clock::now())
+    {}
+
+    ~PhaseTimer() {
+      std::chrono::duration<double> elapsed = std::chrono::steady_clock::now() - start_;
+      monitor_.addTime(phase_, elapsed.count());
+    }
+
+  private:
+    ProgressMonitor & monitor_;
+    ProgressMonitor::Phase phase_;
+    std::chrono::steady_clock::time_point start_;
+};
+
+#endif
@@ -2,6 +2,7 @@
 #define PYTHIAPROGRAMOPTS_H
 
 #include <iostream>
+#include <vector>
 #include <boost/program_options.hpp>
 
 using std::cout;
@@ -22,7 +23,7 @@ class PythiaProgramOpts
 
     int nEvents() { return nEvents_; }
 
-    double mass() { return mass_; }
+    std::vector<double> masses() { return masses_; }
 
     int seed() { return seed_; }
 
@@ -30,17 +31,51 @@ class PythiaProgramOpts
 
     bool diMuFilter() { return diMuFilter_; }
 
+    int filterNLeptons() { return filterNLeptons_; }
+
+    std::string filterFlavour() { return filterFlavour_; }
+
+    double filterPtMin() { return filterPtMin_; }
+
+    double filterEtaMax() { return filterEtaMax_; }
+
+    bool filterSameSign() { return filterSameSign_; }
+
+    double tauMuBias() { return tauMuBias_; }
+
+    bool genJets() { return genJets_; }
+
+    std::string jetAlgo() { return jetAlgo_; }
+
+    double jetR() { return jetR_; }
+
+    double jetPtMin() { return jetPtMin_; }
+
+    double jetEtaMax() { return jetEtaMax_; }
+
+    /**
+     * @brief Check if any generator-level filters are enabled
+     */
+    bool useFilters() { return diMuFilter_ || filterNLeptons_ > 0 || filterSameSign_; }
+
     bool writeToHEPMC() { return writeToHEPMC_; }
 
-    std::string filenameHEPMC() { return filenameHEPMC_; }
+    std::string filenameHEPMC(double mass) { return massFilename(filenameHEPMC_, mass, ".hepmc"); }
 
     bool writeToLHE() { return writeToLHE_; }
 
-    std::string filenameLHE() { return filenameLHE_; }
+    std::string filenameLHE(double mass) { return massFilename(filenameLHE_, mass, ".lhe"); }
 
     bool writeToROOT() { return writeToROOT_; }
 
-    std::string filenameROOT() { return filenameROOT_; }
+    std::string filenameROOT(double mass) { return massFilename(filenameROOT_, mass, ".root"); }
+
+    /**
+     * @brief Filename for the JSON summary of the run for a given mass point
+     * (number of events, cross section, filter efficiency, etc).
+     * @details <stem>_summary.json, in the same directory as the output files.
+     */
+    std::string filenameSummary(double mass);
 
     bool printEvent() { return printEvent_; }
 
@@ -48,6 +83,31 @@ class PythiaProgramOpts
 
     bool zip() { return zip_; }
 
+    bool bgzf() { return bgzf_; }
+
+    int bgzfIndexInterval() { return bgzfIndexInterval_; }
+
+    /**
+     * @brief Whether LHE/HepMC outputs are compressed, either with --zip or --bgzf
+     */
+    bool compressOutput() { return zip_ || bgzf_; }
+
+    int threads() { return threads_; }
+
+    double maxSeconds() { return maxSeconds_; }
+
+    double progressInterval() { return progressInterval_; }
+
+    double printInterval() { return printInterval_; }
+
+    int rootAutoFlush() { return rootAutoFlush_; }
+
+    int rootAutoSave() { return rootAutoSave_; }
+
+    int rootBasketSize() { return rootBasketSize_; }
+
+    int rootCompression() { return rootCompression_; }
+
     /**
      * @brief Prints a summary of program options to STDOUT.
      * Useful for start of program.
@@ -56,7 +116,17 @@ class PythiaProgramOpts
 
     /**
      * @brief Generate a filename stem.
-     * @details <channel>_ma1_<mass>_n<number of events>_seed<seed>
+     * @details <channel>_ma1_<mass>_<energy>TeV_n<number of events>_seed<seed>
+     *
+     * @param mass Mass of a1 to use in the stem.
+     */
+    std::string generateFilenameStem(double mass);
+
+    /**
+     * @brief Generate a filename stem for things common to all mass points
+     * (e.g. progress file).
+     * @details Same as generateFilenameStem(mass), but if several masses are
+     * used, the mass part is <first mass>to<last mass>.
      */
     std::string generateFilenameStem();
 
@@ -82,12 +152,39 @@ class PythiaProgramOpts
      */
     static bool checkExtension(std::string filename, std::string ext) ;
 
+    /**
+     * @brief Get the output filename for a given mass point.
+     * @details If the user didn't specify a filename, the default
+     * <stem>.<ext> is used. If they did, and there is more than one mass
+     * point, "_ma1_<mass>" is inserted before the extension to keep the
+     * files for each mass separate.
+     *
+     * @param filename Filename specified by the user (or empty)
+     * @param mass Mass of a1
+     * @param ext Extension for default filename, including the "."
+     *
+     * @return Filename for this mass point
+     */
+    std::string massFilename(std::string filename, double mass, std::string ext);
+
     std::string cardName_;
     int nEvents_;
-    double mass_;
+    std::vector<double> masses_;
     int seed_;
     double energy_;
     bool diMuFilter_;
+    int filterNLeptons_;
+    std::string filterFlavour_;
+    double filterPtMin_;
+    double filterEtaMax_;
+    bool filterSameSign_;
+    double tauMuBias_;
+
+    bool genJets_;
+    std::string jetAlgo_;
+    double jetR_;
+    double jetPtMin_;
+    double jetEtaMax_;
 
     bool writeToHEPMC_;
     std::string filenameHEPMC_;
@@ -103,6 +200,21 @@ class PythiaProgramOpts
 
     bool zip_;
 
+    bool bgzf_;
+    int bgzfIndexInterval_;
+
+    int threads_;
+
+    double maxSeconds_;
+
+    double progressInterval_;
+    double printInterval_;
+
+    int rootAutoFlush_;
+    int rootAutoSave_;
+    int rootBasketSize_;
+    int rootCompression_;
+
     po::options_description desc_;
 };
 
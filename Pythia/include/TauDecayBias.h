@@ -0,0 +1,65 @@
+#ifndef TAUDECAYBIAS_H
+#define TAUDECAYBIAS_H
+
+#include "Pythia8/Pythia.h"
+
+/**
+ * @brief Bias tau decays towards tau -> mu nu nu, and calculate the event
+ * weight that undoes the bias.
+ * @details The branching ratio (BR) of the tau -> mu channel(s) is changed
+ * from its original value b to the biased value B, and all other tau decay
+ * channels are scaled down to keep the total BR at 1.
+ * Each tau decay in an event then contributes a factor b/B (decay to mu) or
+ * (1-b)/(1-B) (any other decay) to the event weight, so weighted
+ * distributions match those without the bias.
+ *
+ * B = 1 forces all taus to decay to muons.
+ */
+class TauDecayBias
+{
+  public:
+    /**
+     * @brief Ctor
+     *
+     * @param biasedBR BR for tau -> mu after biasing. 0 = no biasing.
+     */
+    TauDecayBias(double biasedBR);
+
+    virtual ~TauDecayBias();
+
+    bool enabled() const { return biasedBR_ > 0; }
+
+    /**
+     * @brief Change the tau decay channel BRs. Must be called after the
+     * cards are read, and before Pythia::init().
+     *
+     * @param pythia Pythia instance to modify
+     */
+    void apply(Pythia8::Pythia & pythia);
+
+    /**
+     * @brief Calculate the weight needed to undo the bias for an event.
+     *
+     * @param event Event record (after hadronisation & decays)
+     *
+     * @return Product of weights for all tau decays in the event.
+     * 1 if biasing is disabled.
+     */
+    double weight(const Pythia8::Event & event) const;
+
+    /**
+     * @brief BR for tau -> mu as set in the cards, before biasing
+     */
+    double originalBR() const { return originalBR_; }
+
+    /**
+     * @brief BR for tau -> mu after biasing
+     */
+    double biasedBR() const { return biasedBR_; }
+
+  private:
+    double biasedBR_;
+    double originalBR_;
+};
+
+#endif
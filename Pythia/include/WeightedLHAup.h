@@ -0,0 +1,36 @@
+#ifndef WEIGHTEDLHAUP_H
+#define WEIGHTEDLHAUP_H
+
+#include <vector>
+
+#include "Pythia8/Pythia.h"
+
+/**
+ * @brief Same as LHAupFromPYTHIA8, but allows the event weight written to
+ * the LHE file to be scaled, e.g. to undo biasing of decays.
+ */
+class WeightedLHAup : public Pythia8::LHAupFromPYTHIA8
+{
+  public:
+    WeightedLHAup(Pythia8::Event * processPtrIn, Pythia8::Info * infoPtrIn);
+
+    virtual ~WeightedLHAup();
+
+    /**
+     * @brief Set the factor to multiply the weight of the next event by.
+     * Must be called before setEvent().
+     */
+    void setWeightFactor(double factor) { weightFactor_ = factor; }
+
+    /**
+     * @brief Store the current event, with the weight from Pythia
+     * multiplied by the weight factor.
+     */
+    virtual bool setEvent(int idProcIn = 0);
+
+  private:
+    double weightFactor_;
+    std::vector<Pythia8::LHAParticle> particles_;  // reused between events
+};
+
+#endif
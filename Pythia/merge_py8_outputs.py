@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+"""
+Merge the ROOT outputs of many generateMC jobs (one per seed) into one file
+per channel, mass & energy, e.g. for diffMassPlot.py & compare_dr.py.
+
+Files are grouped using their filenames, as made by generateMC and the job
+submission scripts:
+
+<channel>_ma1_<mass>_<energy>TeV_n<n>_seed<seed>.root
+<channel>_mass<mass>_<energy>TeV_n<n>_seed<seed>[_ma1_<mass>].root
+
+Each group is merged with hadd in a tree: groups of --fanIn files are merged
+in parallel, then groups of those, and so on until one file is left. All the
+groups are merged at the same time, using --jobs processes.
+
+The output for each group is <oDir>/<channel>_ma1_<mass>_<energy>TeV_n<total>.root,
+where <total> is the total number of events. Its sidecar (<output>.json)
+records the seeds & number of events of each input file.
+
+    ./merge_py8_outputs.py /hdfs/.../root/*.root --oDir merged --jobs 4
+"""
+
+
+import os
+import re
+import sys
+import glob
+import time
+import shutil
+import argparse
+import logging
+import tempfile
+from collections import OrderedDict
+from multiprocessing import Pool
+from subprocess import check_call
+sys.path.append('../Common')
+import common
+
+
+logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+FILENAME_RE = re.compile(r'^(?P<channel>.+?)_(?:ma1_|mass)(?P<mass>[0-9.]+)_'
+                         r'(?P<energy>\d+)TeV_n(?P<n>\d+)_seed(?P<seed>\d+)'
+                         r'(?:_ma1_(?P<mass_point>[0-9.]+))?\.root$')
+
+
+def parse_filename(filename):
+    """Get the channel, mass, energy & seed from a generateMC output filename.
+
+    >>> info = parse_filename('ggh125_2a_4tau_ma1_8_13TeV_n1000_seed2.root')
+    >>> info['channel'], info['mass'], info['energy'], info['seed']
+    ('ggh125_2a_4tau', '8', 13, 2)
+
+    Returns
+    -------
+    dict or None
+        None if the filename doesn't follow the convention.
+    """
+    match = FILENAME_RE.match(os.path.basename(filename))
+    if not match:
+        return None
+    return {
+        'channel': match.group('channel'),
+        # for several mass points, the mass of this file is added at the end
+        'mass': match.group('mass_point') or match.group('mass'),
+        'energy': int(match.group('energy')),
+        'n': int(match.group('n')),
+        'seed': int(match.group('seed')),
+    }
+
+
+def group_files(filenames):
+    """Group files by (channel, mass, energy).
+
+    Returns
+    -------
+    OrderedDict
+        List of (filename, info) for each (channel, mass, energy),
+        where info is from parse_filename. Sorted by seed.
+    """
+    groups = OrderedDict()
+    for filename in sorted(filenames):
+        info = parse_filename(filename)
+        if info is None:
+            log.warning('Cannot get channel/mass/energy from %s, skipping', filename)
+            continue
+        key = (info['channel'], info['mass'], info['energy'])
+        groups.setdefault(key, []).append((filename, info))
+    for key in groups:
+        groups[key].sort(key=lambda x: x[1]['seed'])
+    return groups
+
+
+def hadd(args):
+    """Merge files with hadd, for Pool.map.
+
+    Parameters
+    ----------
+    args : (str, list[str], bool)
+        Output filename, input filenames, and whether to only merge histograms.
+    """
+    output, inputs, hists_only = args
+    cmd = ['hadd', '-f']
+    if hists_only:
+        cmd.append('-T')  # skip TTrees
+    check_call(cmd + [output] + inputs)
+    return output
+
+
+def merge_groups(groups, out_names, tmp_dir, fan_in=8, n_jobs=1, hists_only=False):
+    """Merge each group of files in a tree reduction.
+
+    At each level, every group's files are split into chunks of fan_in
+    files, and all chunks (from all groups) are merged in parallel.
+    Intermediate files are deleted once merged.
+
+    Parameters
+    ----------
+    groups : dict
+        List of filenames for each group.
+    out_names : dict
+        Output filename for each group.
+    tmp_dir : str
+        Directory for intermediate files.
+    fan_in : int, optional
+        Maximum number of files merged by each hadd.
+    n_jobs : int, optional
+        Number of hadd processes to run at once.
+    hists_only : bool, optional
+        Only merge histograms, not TTrees.
+    """
+    current = {key: list(files) for key, files in groups.iteritems()}
+    intermediate = set()
+    pool = Pool(n_jobs)
+    try:
+        level = 0
+        while True:
+            tasks = []
+            for key, files in current.iteritems():
+                if len(files) == 1 and (level > 0 or not hists_only):
+                    continue
+                chunks = [files[i:i + fan_in] for i in range(0, len(files), fan_in)]
+                if len(chunks) == 1:
+                    tasks.append((key, out_names[key], chunks[0]))
+                    continue
+                for i, chunk in enumerate(chunks):
+                    name = os.path.join(tmp_dir, '%s_level%d_%d.root'
+                                        % (os.path.splitext(os.path.basename(out_names[key]))[0],
+                                           level, i))
+                    tasks.append((key, name, chunk))
+            if not tasks:
+                break
+            start = time.time()
+            pool.map(hadd, [(name, chunk, hists_only) for _, name, chunk in tasks], chunksize=1)
+            log.info('Merge level %d: %d hadd jobs in %.1f s',
+                     level, len(tasks), time.time() - start)
+            new_current = {key: [] for key in current}
+            for key, name, chunk in tasks:
+                new_current[key].append(name)
+                for f in chunk:
+                    if f in intermediate:
+                        os.remove(f)
+                intermediate.add(name)
+            for key, files in current.iteritems():
+                if not new_current[key]:
+                    new_current[key] = files
+            current = new_current
+            level += 1
+    finally:
+        pool.close()
+        pool.join()
+
+    # groups with 1 file & all trees wanted: just copy
+    for key, files in current.iteritems():
+        if files[0] != out_names[key]:
+            shutil.copy2(files[0], out_names[key])
+
+
+def make_provenance(group_files, hists_only):
+    """Make the sidecar contents for a merged file.
+
+    Parameters
+    ----------
+    group_files : list[(str, dict)]
+        Input files and their info from parse_filename.
+    hists_only : bool
+        If only histograms were merged.
+
+    Returns
+    -------
+    dict
+    """
+    inputs = []
+    metadatas = [common.read_sidecar(f) for f, _ in group_files]
+    for (filename, info), metadata in zip(group_files, metadatas):
+        metadata = metadata or {}
+        inputs.append({
+            'file': os.path.basename(filename),
+            'seed': metadata.get('seed', info['seed']),
+            'nEvents': metadata.get('nEvents', info['n']),
+            'checksum': metadata.get('checksum'),
+        })
+    first = group_files[0][1]
+    provenance = {
+        'format': 'root',
+        'channel': first['channel'],
+        'mass': first['mass'],
+        'energy': first['energy'],
+        'nEvents': sum(i['nEvents'] for i in inputs),
+        'seeds': [i['seed'] for i in inputs],
+        'inputs': inputs,
+        'histogramsOnly': hists_only,
+    }
+    # cross section as average over inputs, weighted by number of events
+    if provenance['nEvents'] > 0 and all(m and 'sigmaGen_mb' in m for m in metadatas):
+        total = float(provenance['nEvents'])
+        provenance['sigmaGen_mb'] = sum(m['nEvents'] * m['sigmaGen_mb'] for m in metadatas) / total
+        provenance['sigmaErr_mb'] = sum((m['nEvents'] * m['sigmaErr_mb'])**2
+                                        for m in metadatas)**0.5 / total
+    return provenance
+
+
+def main(in_args=sys.argv[1:]):
+    """Merge ROOT files from generateMC jobs."""
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+',
+                        help='ROOT files to merge, or directories of them')
+    parser.add_argument('--oDir',
+                        default='.',
+                        help='Directory for merged files')
+    parser.add_argument('--fanIn',
+                        type=int, default=8,
+                        help='Maximum number of files merged by each hadd')
+    parser.add_argument('--jobs',
+                        type=int, default=1,
+                        help='Number of hadd processes to run at once')
+    parser.add_argument('--histsOnly',
+                        action='store_true',
+                        help='Only merge histograms, not TTrees')
+    parser.add_argument('--dry',
+                        action='store_true',
+                        help="Only print the groups, don't merge")
+    args = parser.parse_args(in_args)
+
+    if args.fanIn < 2:
+        parser.error('--fanIn must be >= 2')
+    if args.jobs < 1:
+        parser.error('--jobs must be >= 1')
+
+    filenames = []
+    for inp in args.inputs:
+        if os.path.isdir(inp):
+            filenames.extend(glob.glob(os.path.join(inp, '*.root')))
+        else:
+            filenames.append(inp)
+
+    groups = group_files(filenames)
+    out_names = {}
+    provenances = {}
+    for key, files in groups.iteritems():
+        provenances[key] = make_provenance(files, args.histsOnly)
+        channel, mass, energy = key
+        out_names[key] = os.path.join(args.oDir, '%s_ma1_%s_%dTeV_n%d.root'
+                                      % (channel, mass, energy, provenances[key]['nEvents']))
+        log.info('%s: %d files -> %s', key, len(files), out_names[key])
+    if args.dry or not groups:
+        return 0
+
+    common.check_create_dir(args.oDir)
+    tmp_dir = tempfile.mkdtemp(dir=args.oDir)
+    start = time.time()
+    try:
+        merge_groups({key: [f for f, _ in files] for key, files in groups.iteritems()},
+                     out_names, tmp_dir, args.fanIn, args.jobs, args.histsOnly)
+    finally:
+        shutil.rmtree(tmp_dir)
+    for key, out_name in out_names.iteritems():
+        common.write_sidecar(out_name, provenances[key])
+    log.info('Merged %d files into %d in %.1f s',
+             sum(len(g) for g in groups.values()), len(groups), time.time() - start)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
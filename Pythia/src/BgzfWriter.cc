@@ -0,0 +1,169 @@
+#include "BgzfWriter.h"
+
+#include <iostream>
+#include <stdexcept>
+
+#include <zlib.h>
+
+using std::cout;
+using std::endl;
+
+namespace {
+  // gzip header with the BGZF extra field. Bytes 16-17 are the total
+  // block size - 1, filled in for each block.
+  const unsigned char kBlockHeader[18] = {
+    0x1f, 0x8b, 8, 4, 0, 0, 0, 0, 0, 0xff, 6, 0, 'B', 'C', 2, 0, 0, 0
+  };
+  const size_t kHeaderSize = 18;
+  const size_t kFooterSize = 8;  // CRC32 + uncompressed size
+
+  // Empty block that marks the end of a BGZF file
+  const unsigned char kEOFBlock[28] = {
+    0x1f, 0x8b, 8, 4, 0, 0, 0, 0, 0, 0xff, 6, 0, 'B', 'C', 2, 0,
+    0x1b, 0, 3, 0, 0, 0, 0, 0, 0, 0, 0, 0
+  };
+
+  void packUInt32(unsigned char * buf, uint32_t value) {
+    buf[0] = value & 0xff;
+    buf[1] = (value >> 8) & 0xff;
+    buf[2] = (value >> 16) & 0xff;
+    buf[3] = (value >> 24) & 0xff;
+  }
+
+  bool startsWith(const std::string & line, const std::string & prefix) {
+    return line.compare(0, prefix.size(), prefix) == 0;
+  }
+}
+
+
+BgzfWriter::BgzfWriter(const std::string & filename, int level):
+  out_(filename, std::ios::binary),
+  level_(level),
+  buffer_(),
+  compressed_(kHeaderSize + compressBound(kMaxBlockSize) + kFooterSize),
+  blockOffset_(0)
+{
+  buffer_.reserve(kMaxBlockSize);
+}
+
+
+BgzfWriter::~BgzfWriter() {
+  if (out_.is_open()) close();
+}
+
+
+void BgzfWriter::write(const std::string & data) {
+  size_t pos = 0;
+  while (pos < data.size()) {
+    size_t n = std::min(kMaxBlockSize - buffer_.size(), data.size() - pos);
+    buffer_.append(data, pos, n);
+    pos += n;
+    if (buffer_.size() == kMaxBlockSize) flush();
+  }
+}
+
+
+void BgzfWriter::flush() {
+  if (buffer_.empty()) return;
+  writeBlock(buffer_.data(), buffer_.size());
+  buffer_.clear();
+}
+
+
+bool BgzfWriter::close() {
+  flush();
+  out_.write(reinterpret_cast<const char*>(kEOFBlock), sizeof(kEOFBlock));
+  bool ok = out_.good();
+  out_.close();
+  return ok;
+}
+
+
+void BgzfWriter::writeBlock(const char * data, size_t size) {
+  // raw deflate stream, the gzip header & footer are written by hand
+  z_stream zs;
+  zs.zalloc = Z_NULL;
+  zs.zfree = Z_NULL;
+  zs.opaque = Z_NULL;
+  if (deflateInit2(&zs, level_, Z_DEFLATED, -15, 8, Z_DEFAULT_STRATEGY) != Z_OK)
+    throw std::runtime_error("Could not initialise zlib for BGZF block");
+  zs.next_in = reinterpret_cast<Bytef*>(const_cast<char*>(data));
+  zs.avail_in = size;
+  zs.next_out = compressed_.data() + kHeaderSize;
+  zs.avail_out = compressed_.size() - kHeaderSize - kFooterSize;
+  int ret = deflate(&zs, Z_FINISH);
+  size_t compressedSize = zs.total_out;
+  deflateEnd(&zs);
+  if (ret != Z_STREAM_END)
+    throw std::runtime_error("Could not compress BGZF block");
+
+  size_t blockSize = kHeaderSize + compressedSize + kFooterSize;
+  std::copy(kBlockHeader, kBlockHeader + kHeaderSize, compressed_.begin());
+  compressed_[16] = (blockSize - 1) & 0xff;
+  compressed_[17] = ((blockSize - 1) >> 8) & 0xff;
+  uLong crc = crc32(crc32(0L, Z_NULL, 0), reinterpret_cast<const Bytef*>(data), size);
+  packUInt32(&compressed_[kHeaderSize + compressedSize], crc);
+  packUInt32(&compressed_[kHeaderSize + compressedSize + 4], size);
+
+  out_.write(reinterpret_cast<const char*>(compressed_.data()), blockSize);
+  blockOffset_ += blockSize;
+}
+
+
+bool bgzfCompressEvents(const std::string & input, const std::string & output,
+                        const std::string & indexFilename,
+                        const std::string & eventStart, const std::string & footerStart,
+                        int indexInterval) {
+  std::ifstream in(input);
+  if (!in) {
+    cout << "Cannot open " << input << " to compress" << endl;
+    return false;
+  }
+  BgzfWriter writer(output);
+  std::ofstream index(indexFilename);
+  if (!writer.isOpen() || !index) {
+    cout << "Cannot open " << output << " or " << indexFilename << " to write" << endl;
+    return false;
+  }
+
+  // Buffer each event (or the header/footer) so it can be kept in one block
+  long nEvents = 0;
+  bool inFooter = false;
+  std::string chunk, line;
+  auto writeChunk = [&]() {
+    if (writer.blockSize() + chunk.size() > BgzfWriter::kMaxBlockSize) writer.flush();
+    writer.write(chunk);
+    chunk.clear();
+  };
+  while (std::getline(in, line)) {
+    bool newEvent = !inFooter && startsWith(line, eventStart);
+    bool newFooter = !inFooter && startsWith(line, footerStart);
+    if (newEvent || newFooter) {
+      writeChunk();
+      if (newFooter) {
+        inFooter = true;
+        writer.flush();
+        index << "footer " << writer.tell() << "\n";
+      } else {
+        if (nEvents % indexInterval == 0) {
+          writer.flush();
+          index << "event " << nEvents << " " << writer.tell() << "\n";
+        }
+        ++nEvents;
+      }
+    }
+    chunk += line;
+    if (!in.eof()) chunk += '\n';
+  }
+  writeChunk();
+  if (!inFooter) {
+    // no footer, e.g. output stopped early, but still record where it would go
+    writer.flush();
+    index << "footer " << writer.tell() << "\n";
+  }
+  index << "nEvents " << nEvents << "\n";
+
+  bool ok = !in.bad() && writer.close();
+  index.close();
+  return ok && index.good();
+}
@@ -0,0 +1,64 @@
+#include "DecayTreeIndex.h"
+
+
+DecayTreeIndex::DecayTreeIndex() {}
+
+
+DecayTreeIndex::~DecayTreeIndex() {}
+
+
+void DecayTreeIndex::build(const Pythia8::Event & event) {
+  int nParticles = event.size();
+  // assign() keeps the capacity, so no allocations once the buffers are big enough
+  childBegin_.assign(nParticles, 0);
+  childEnd_.assign(nParticles, 0);
+  isFinal_.assign(nParticles, false);
+  for (int k = 0; k < 2; ++k) {
+    descBegin_[k].assign(nParticles, -1);
+    descEnd_[k].assign(nParticles, -1);
+  }
+  descendants_.clear();
+
+  for (int i = 0; i < nParticles; ++i) {
+    const Pythia8::Particle & p = event[i];
+    isFinal_[i] = p.isFinal();
+    int d1 = p.daughter1();
+    int d2 = p.daughter2();
+    if (d1 > 0 && d2 >= d1 && d2 < nParticles) {
+      childBegin_[i] = d1;
+      childEnd_[i] = d2 + 1;
+    }
+  }
+}
+
+
+ParticleRange DecayTreeIndex::children(int iParticle) const {
+  return ParticleRange(childBegin_[iParticle], childEnd_[iParticle]);
+}
+
+
+ParticleRange DecayTreeIndex::descendants(int iParticle, bool finalStateOnly) {
+  int k = finalStateOnly ? 1 : 0;
+  if (descBegin_[k][iParticle] >= 0) {
+    return ParticleRange(&descendants_, descBegin_[k][iParticle], descEnd_[k][iParticle]);
+  }
+
+  // Breadth-first search, so descendants come out generation by generation
+  int begin = descendants_.size();
+  queue_.clear();
+  queue_.push_back(iParticle);
+  for (unsigned int head = 0; head < queue_.size(); ++head) {
+    int parent = queue_[head];
+    if (isFinal_[parent]) continue;
+    for (int child = childBegin_[parent]; child < childEnd_[parent]; ++child) {
+      if (!finalStateOnly || isFinal_[child]) {
+        descendants_.push_back(child);
+      }
+      queue_.push_back(child);
+    }
+  }
+
+  descBegin_[k][iParticle] = begin;
+  descEnd_[k][iParticle] = descendants_.size();
+  return ParticleRange(&descendants_, begin, descEnd_[k][iParticle]);
+}
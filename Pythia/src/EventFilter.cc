@@ -0,0 +1,166 @@
+#include "EventFilter.h"
+
+#include <chrono>
+#include <cmath>
+#include <iomanip>
+#include <iostream>
+
+using std::cout;
+using std::endl;
+
+
+EventFilter::EventFilter(const std::string & name):
+  name_(name)
+{}
+
+
+EventFilter::~EventFilter() {}
+
+
+bool LeptonSelection::select(const Pythia8::Particle & p) const {
+  if (!p.isFinal()) return false;
+  bool match = false;
+  for (const auto & id : pdgIds) {
+    if (p.idAbs() == id) {
+      match = true;
+      break;
+    }
+  }
+  return match && p.pT() >= ptMin && fabs(p.eta()) <= etaMax;
+}
+
+
+NLeptonFilter::NLeptonFilter(const std::string & name, int nLeptons,
+                             const LeptonSelection & selection):
+  EventFilter(name),
+  nLeptons_(nLeptons),
+  selection_(selection)
+{}
+
+
+NLeptonFilter::~NLeptonFilter() {}
+
+
+bool NLeptonFilter::pass(const Pythia8::Event & event) {
+  int nFound = 0;
+  for (int i = 0; i < event.size(); ++i) {
+    if (selection_.select(event[i])) {
+      nFound++;
+      if (nFound >= nLeptons_) return true;
+    }
+  }
+  return nFound >= nLeptons_;
+}
+
+
+SameSignPairFilter::SameSignPairFilter(const std::string & name,
+                                       const LeptonSelection & selection):
+  EventFilter(name),
+  selection_(selection)
+{}
+
+
+SameSignPairFilter::~SameSignPairFilter() {}
+
+
+bool SameSignPairFilter::pass(const Pythia8::Event & event) {
+  int nPos = 0;
+  int nNeg = 0;
+  for (int i = 0; i < event.size(); ++i) {
+    if (selection_.select(event[i])) {
+      if (event[i].charge() > 0) {
+        nPos++;
+      } else {
+        nNeg++;
+      }
+      if (nPos >= 2 || nNeg >= 2) return true;
+    }
+  }
+  return false;
+}
+
+
+FilterChain::FilterChain():
+  nEvents_(0),
+  nPassed_(0)
+{}
+
+
+FilterChain::~FilterChain() {}
+
+
+void FilterChain::addFilter(std::unique_ptr<EventFilter> filter) {
+  FilterStageSummary stage = {filter->name(), 0, 0, 0.};
+  stages_.push_back(stage);
+  filters_.push_back(std::move(filter));
+}
+
+
+bool FilterChain::pass(const Pythia8::Event & event) {
+  nEvents_++;
+  for (unsigned int i = 0; i < filters_.size(); ++i) {
+    auto start = std::chrono::steady_clock::now();
+    bool result = filters_[i]->pass(event);
+    std::chrono::duration<double> elapsed = std::chrono::steady_clock::now() - start;
+    stages_[i].seconds += elapsed.count();
+    if (!result) {
+      stages_[i].nFail++;
+      return false;
+    }
+    stages_[i].nPass++;
+  }
+  nPassed_++;
+  return true;
+}
+
+
+std::vector<FilterStageSummary> FilterChain::combine(
+  const std::vector<std::vector<FilterStageSummary>> & chains) {
+  std::vector<FilterStageSummary> total;
+  if (chains.empty()) return total;
+  total = chains.front();
+  for (unsigned int iChain = 1; iChain < chains.size(); ++iChain) {
+    for (unsigned int i = 0; i < total.size() && i < chains[iChain].size(); ++i) {
+      total[i].nPass += chains[iChain][i].nPass;
+      total[i].nFail += chains[iChain][i].nFail;
+      total[i].seconds += chains[iChain][i].seconds;
+    }
+  }
+  return total;
+}
+
+
+JsonObject FilterChain::toJson(long nEvents, const std::vector<FilterStageSummary> & stages) {
+  // events that get through all stages
+  long nPassed = stages.empty() ? nEvents : stages.back().nPass;
+  std::vector<JsonObject> stageObjs;
+  for (const auto & stage : stages) {
+    JsonObject stageObj;
+    stageObj.add("name", stage.name)
+            .add("nPass", stage.nPass)
+            .add("nFail", stage.nFail)
+            .add("seconds", stage.seconds);
+    stageObjs.push_back(stageObj);
+  }
+  JsonObject obj;
+  obj.add("nEvents", nEvents)
+     .add("nPassed", nPassed)
+     .add("efficiency", (nEvents > 0) ? nPassed / static_cast<double>(nEvents) : 0.)
+     .add("stages", stageObjs);
+  return obj;
+}
+
+
+void FilterChain::print(long nEvents, const std::vector<FilterStageSummary> & stages) {
+  cout << "Filter summary: " << nEvents << " events generated" << endl;
+  cout << std::left << std::setw(24) << "Stage" << std::right
+       << std::setw(12) << "Pass" << std::setw(12) << "Fail"
+       << std::setw(12) << "Eff" << std::setw(12) << "Time [s]" << endl;
+  for (const auto & stage : stages) {
+    long nIn = stage.nPass + stage.nFail;
+    cout << std::left << std::setw(24) << stage.name << std::right
+         << std::setw(12) << stage.nPass << std::setw(12) << stage.nFail
+         << std::setw(12) << ((nIn > 0) ? stage.nPass / static_cast<double>(nIn) : 0.)
+         << std::setw(12) << stage.seconds << endl;
+  }
+}
@@ -0,0 +1,91 @@
+#include "GenJetClusterer.h"
+
+#include <cmath>
+#include <stdexcept>
+#include <sstream>
+
+#include "fastjet/ClusterSequence.hh"
+
+using namespace Pythia8;
+
+// Ghost b hadrons are scaled down by this, so they don't change the jets
+const double ghostScale = 1E-18;
+
+
+GenJetClusterer::GenJetClusterer(const std::string & algorithm, double R,
+                                 double ptMin, double etaMax):
+  jetDef_(algorithmFromName(algorithm), R),
+  ptMin_(ptMin),
+  etaMax_(etaMax)
+{
+  if (R <= 0)
+    throw std::range_error("Jet radius must be > 0");
+}
+
+
+GenJetClusterer::~GenJetClusterer() {}
+
+
+fastjet::JetAlgorithm GenJetClusterer::algorithmFromName(const std::string & name) {
+  if (name == "antikt") return fastjet::antikt_algorithm;
+  if (name == "kt") return fastjet::kt_algorithm;
+  if (name == "cambridge") return fastjet::cambridge_algorithm;
+  throw std::runtime_error("Unknown jet algorithm \"" + name + "\", must be one of antikt, kt, cambridge");
+}
+
+
+bool GenJetClusterer::isBHadron(int idAbs) {
+  // mesons have quarks in the 100s & 10s digits, baryons in the 1000s too.
+  // Diquarks (e.g. 5101, 5503) have 0 in the 10s digit, and aren't hadrons
+  if (idAbs < 100 || (idAbs / 10) % 10 == 0) return false;
+  return (idAbs / 1000) % 10 == 5 || (idAbs / 100) % 10 == 5 || (idAbs / 10) % 10 == 5;
+}
+
+
+const std::vector<fastjet::PseudoJet> & GenJetClusterer::cluster(const Event & event) {
+  particles_.clear();
+  for (int i = 0; i < event.size(); ++i) {
+    const Particle & p = event[i];
+    if (p.isFinal() && p.isVisible()) {
+      particles_.push_back(fastjet::PseudoJet(p.px(), p.py(), p.pz(), p.e()));
+      particles_.back().set_user_index(i);
+    } else if (isBHadron(p.idAbs())) {
+      // only the last b hadron in a chain, e.g. not the B* in B* -> B gamma
+      int d1 = p.daughter1();
+      int d2 = p.daughter2();
+      bool lastB = true;
+      if (d2 > d1) {
+        for (int d = d1; d <= d2; ++d) {
+          if (isBHadron(event[d].idAbs())) lastB = false;
+        }
+      } else {
+        if (d1 > 0 && isBHadron(event[d1].idAbs())) lastB = false;
+        if (d2 > 0 && isBHadron(event[d2].idAbs())) lastB = false;
+      }
+      if (!lastB) continue;
+      particles_.push_back(fastjet::PseudoJet(p.px(), p.py(), p.pz(), p.e()) * ghostScale);
+      particles_.back().set_user_index(-1);
+    }
+  }
+
+  jets_.clear();
+  nBHadrons_.clear();
+  fastjet::ClusterSequence clusterSeq(particles_, jetDef_);
+  for (const auto & jet : fastjet::sorted_by_pt(clusterSeq.inclusive_jets(ptMin_))) {
+    if (std::fabs(jet.eta()) > etaMax_) continue;
+    int nB = 0;
+    for (const auto & constituent : jet.constituents()) {
+      if (constituent.user_index() < 0) nB++;
+    }
+    jets_.push_back(jet);
+    nBHadrons_.push_back(nB);
+  }
+  return jets_;
+}
+
+
+std::string GenJetClusterer::description() const {
+  std::ostringstream os;
+  os << jetDef_.description() << ", pT >= " << ptMin_ << " GeV, |eta| <= " << etaMax_;
+  return os.str();
+}
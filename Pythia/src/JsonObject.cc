@@ -0,0 +1,145 @@
+#include "JsonObject.h"
+
+#include <cmath>
+#include <cstdio>
+#include <fstream>
+#include <iomanip>
+#include <sstream>
+
+
+JsonObject::JsonObject() {}
+
+
+JsonObject::~JsonObject() {}
+
+
+JsonObject & JsonObject::add(const std::string & key, const std::string & value) {
+  entries_.push_back(std::make_pair(key, quote(value)));
+  return *this;
+}
+
+
+JsonObject & JsonObject::add(const std::string & key, const char * value) {
+  return add(key, std::string(value));
+}
+
+
+JsonObject & JsonObject::add(const std::string & key, int value) {
+  entries_.push_back(std::make_pair(key, std::to_string(value)));
+  return *this;
+}
+
+
+JsonObject & JsonObject::add(const std::string & key, long value) {
+  entries_.push_back(std::make_pair(key, std::to_string(value)));
+  return *this;
+}
+
+
+JsonObject & JsonObject::add(const std::string & key, long long value) {
+  entries_.push_back(std::make_pair(key, std::to_string(value)));
+  return *this;
+}
+
+
+JsonObject & JsonObject::add(const std::string & key, unsigned long value) {
+  entries_.push_back(std::make_pair(key, std::to_string(value)));
+  return *this;
+}
+
+
+JsonObject & JsonObject::add(const std::string & key, double value) {
+  entries_.push_back(std::make_pair(key, number(value)));
+  return *this;
+}
+
+
+JsonObject & JsonObject::add(const std::string & key, bool value) {
+  entries_.push_back(std::make_pair(key, value ? "true" : "false"));
+  return *this;
+}
+
+
+JsonObject & JsonObject::add(const std::string & key, const JsonObject & value) {
+  entries_.push_back(std::make_pair(key, value.str()));
+  return *this;
+}
+
+
+JsonObject & JsonObject::add(const std::string & key, const std::vector<JsonObject> & values) {
+  std::string arr = "[";
+  for (unsigned int i = 0; i < values.size(); ++i) {
+    if (i > 0) arr += ", ";
+    arr += values[i].str();
+  }
+  arr += "]";
+  entries_.push_back(std::make_pair(key, arr));
+  return *this;
+}
+
+
+JsonObject & JsonObject::add(const std::string & key, const std::vector<double> & values) {
+  std::string arr = "[";
+  for (unsigned int i = 0; i < values.size(); ++i) {
+    if (i > 0) arr += ", ";
+    arr += number(values[i]);
+  }
+  arr += "]";
+  entries_.push_back(std::make_pair(key, arr));
+  return *this;
+}
+
+
+std::string JsonObject::str() const {
+  std::string out = "{";
+  for (unsigned int i = 0; i < entries_.size(); ++i) {
+    if (i > 0) out += ", ";
+    out += quote(entries_[i].first) + ": " + entries_[i].second;
+  }
+  out += "}";
+  return out;
+}
+
+
+bool JsonObject::write(const std::string & filename) const {
+  std::string tmpName = filename + ".tmp";
+  {
+    std::ofstream outFile(tmpName);
+    if (!outFile) return false;
+    outFile << str() << std::endl;
+    if (!outFile) return false;
+  }
+  return std::rename(tmpName.c_str(), filename.c_str()) == 0;
+}
+
+
+std::string JsonObject::quote(const std::string & str) {
+  std::ostringstream out;
+  out << "\"";
+  for (const auto & c : str) {
+    switch (c) {
+      case '"': out << "\\\""; break;
+      case '\\': out << "\\\\"; break;
+      case '\n': out << "\\n"; break;
+      case '\r': out << "\\r"; break;
+      case '\t': out << "\\t"; break;
+      default:
+        if (static_cast<unsigned char>(c) < 0x20) {
+          out << "\\u" << std::hex << std::setw(4) << std::setfill('0')
+              << static_cast<int>(c) << std::dec;
+        } else {
+          out << c;
+        }
+    }
+  }
+  out << "\"";
+  return out.str();
+}
+
+
+std::string JsonObject::number(double value) {
+  if (!std::isfinite(value)) return "null";
+  std::ostringstream out;
+  out << std::setprecision(10) << value;
+  return out.str();
+}
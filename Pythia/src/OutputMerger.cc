@@ -0,0 +1,147 @@
+#include "OutputMerger.h"
+
+#include <cstdio>
+#include <fstream>
+#include <iomanip>
+#include <iostream>
+#include <sstream>
+
+#include <boost/algorithm/string.hpp>
+#include <boost/filesystem.hpp>
+
+#include "TFileMerger.h"
+
+namespace fs = boost::filesystem;
+
+using std::cout;
+using std::endl;
+
+
+std::string threadFilename(const std::string & filename, int threadIndex, int nThreads) {
+  if (nThreads <= 1) return filename;
+  fs::path p(filename);
+  std::string newName = p.stem().string() + "_thread" + std::to_string(threadIndex) +
+                        p.extension().string();
+  return (p.parent_path() / newName).string();
+}
+
+
+bool mergeHepMCFiles(const std::vector<std::string> & inputs, const std::string & output) {
+  const std::string startTag = "HepMC::IO_GenEvent-START_EVENT_LISTING";
+  const std::string endTag = "HepMC::IO_GenEvent-END_EVENT_LISTING";
+
+  std::ofstream outFile(output);
+  if (!outFile) return false;
+
+  bool wroteHeader = false;
+  // each thread numbers its events from its own counter, so renumber them
+  int eventNumber = 0;
+  for (const auto & fname : inputs) {
+    std::ifstream inFile(fname);
+    if (!inFile) return false;
+    bool inListing = false;
+    std::string line;
+    while (std::getline(inFile, line)) {
+      if (boost::algorithm::starts_with(line, startTag)) {
+        inListing = true;
+        if (!wroteHeader) outFile << line << "\n";
+        wroteHeader = true;
+      } else if (boost::algorithm::starts_with(line, endTag)) {
+        inListing = false;
+      } else if (inListing && boost::algorithm::starts_with(line, "E ")) {
+        // E <event number> <rest of event info>
+        std::size_t numberEnd = line.find(' ', 2);
+        outFile << "E " << eventNumber++;
+        if (numberEnd != std::string::npos) outFile << line.substr(numberEnd);
+        outFile << "\n";
+      } else if (inListing) {
+        outFile << line << "\n";
+      } else if (!wroteHeader) {
+        // header lines before the start of the event listing (e.g. version)
+        outFile << line << "\n";
+      }
+    }
+  }
+  // IO_GenEvent only writes anything once it has an event, so do the same here
+  if (wroteHeader) outFile << endTag << "\n" << endl;
+  return true;
+}
+
+
+bool mergeLHEFiles(const std::vector<std::string> & inputs, const std::string & output,
+                   double sigma, double sigmaErr) {
+  const std::string endTag = "</LesHouchesEvents>";
+
+  std::ofstream outFile(output);
+  if (!outFile) return false;
+
+  for (unsigned int i = 0; i < inputs.size(); ++i) {
+    std::ifstream inFile(inputs[i]);
+    if (!inFile) return false;
+    bool afterInit = false;
+    bool inInit = false;
+    std::vector<std::string> initLines;
+    std::string line;
+    while (std::getline(inFile, line)) {
+      std::string trimmed = boost::algorithm::trim_copy(line);
+      if (trimmed == endTag) break;
+      if (afterInit) {
+        outFile << line << "\n";
+      } else if (i == 0) {
+        // Keep header & init block from the first file only,
+        // updating the cross section in the init block.
+        if (trimmed == "<init>") {
+          inInit = true;
+          outFile << line << "\n";
+        } else if (trimmed == "</init>") {
+          // first line is beam info, the rest are one line per process
+          for (unsigned int j = 0; j < initLines.size(); ++j) {
+            std::vector<std::string> fields;
+            std::string initLine = boost::algorithm::trim_copy(initLines[j]);
+            boost::algorithm::split(fields, initLine, boost::is_any_of(" \t"),
+                                    boost::token_compress_on);
+            if (j == 0 || initLines.size() != 2 || fields.size() != 4) {
+              // can only update if there is a single process
+              outFile << initLines[j] << "\n";
+            } else {
+              outFile << std::scientific << std::setprecision(6)
+                      << " " << sigma << " " << sigmaErr
+                      << " " << fields[2] << " " << fields[3] << "\n";
+            }
+          }
+          outFile << line << "\n";
+          inInit = false;
+          afterInit = true;
+        } else if (inInit) {
+          initLines.push_back(line);
+        } else {
+          outFile << line << "\n";
+        }
+      } else if (trimmed == "</init>") {
+        afterInit = true;
+      }
+    }
+  }
+  outFile << endTag << endl;
+  return true;
+}
+
+
+bool mergeROOTFiles(const std::vector<std::string> & inputs, const std::string & output,
+                    int compression) {
+  TFileMerger merger(false);
+  if (!merger.OutputFile(output.c_str(), "RECREATE", compression)) return false;
+  for (const auto & fname : inputs) {
+    if (!merger.AddFile(fname.c_str())) return false;
+  }
+  return merger.Merge();
+}
+
+
+void removeFiles(const std::vector<std::string> & filenames) {
+  for (const auto & fname : filenames) {
+    if (std::remove(fname.c_str()) != 0) {
+      cout << "Could not remove " << fname << endl;
+    }
+  }
+}
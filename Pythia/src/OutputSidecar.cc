@@ -0,0 +1,50 @@
+#include "OutputSidecar.h"
+
+#include <cstdio>
+#include <fstream>
+#include <iostream>
+#include <vector>
+
+#include <zlib.h>
+
+using std::cout;
+using std::endl;
+
+
+std::string sidecarFilename(const std::string & filename) {
+  return filename + ".json";
+}
+
+
+std::string fileChecksum(const std::string & filename, unsigned long & nBytes) {
+  nBytes = 0;
+  std::ifstream in(filename, std::ios::binary);
+  if (!in) return "";
+
+  uLong crc = crc32(0L, Z_NULL, 0);
+  std::vector<char> buffer(1 << 20);
+  while (in) {
+    in.read(buffer.data(), buffer.size());
+    std::streamsize nRead = in.gcount();
+    if (nRead <= 0) break;
+    crc = crc32(crc, reinterpret_cast<const Bytef*>(buffer.data()), nRead);
+    nBytes += nRead;
+  }
+  if (in.bad()) return "";
+
+  char checksum[16];
+  snprintf(checksum, sizeof(checksum), "%08lx", crc & 0xffffffffUL);
+  return "crc32:" + std::string(checksum);
+}
+
+
+bool writeSidecar(const std::string & filename, JsonObject metadata) {
+  unsigned long nBytes = 0;
+  std::string checksum = fileChecksum(filename, nBytes);
+  if (checksum.empty()) {
+    cout << "Cannot read " << filename << " to write its sidecar file" << endl;
+    return false;
+  }
+  metadata.add("bytes", nBytes).add("checksum", checksum);
+  return metadata.write(sidecarFilename(filename));
+}
@@ -0,0 +1,100 @@
+#include "ProgressMonitor.h"
+
+#include <fstream>
+#include <unistd.h>
+
+#include <boost/filesystem.hpp>
+
+namespace fs = boost::filesystem;
+
+
+ProgressMonitor::ProgressMonitor(double reportInterval, double printInterval):
+  reportInterval_(reportInterval),
+  printInterval_(printInterval),
+  startTime_(Clock::now()),
+  lastReport_(startTime_),
+  lastPrint_(startTime_),
+  reported_(false),
+  printed_(false),
+  lastEvents_(0),
+  outputs_(),
+  phaseSeconds_()
+{}
+
+
+ProgressMonitor::~ProgressMonitor() {}
+
+
+void ProgressMonitor::addOutput(const std::string & label, const std::string & filename) {
+  outputs_.push_back(std::make_pair(label, filename));
+}
+
+
+bool ProgressMonitor::reportDue() {
+  if (!reported_) return true;
+  std::chrono::duration<double> sinceReport = Clock::now() - lastReport_;
+  return sinceReport.count() >= reportInterval_;
+}
+
+
+bool ProgressMonitor::printDue() {
+  if (printInterval_ <= 0) return false;
+  Clock::time_point now = Clock::now();
+  std::chrono::duration<double> sincePrint = now - lastPrint_;
+  if (printed_ && sincePrint.count() < printInterval_) return false;
+  printed_ = true;
+  lastPrint_ = now;
+  return true;
+}
+
+
+JsonObject ProgressMonitor::report(long nEvents, long nGenerated, long nTried) {
+  Clock::time_point now = Clock::now();
+  double total = std::chrono::duration<double>(now - startTime_).count();
+  double sinceReport = std::chrono::duration<double>(now - lastReport_).count();
+
+  JsonObject phases;
+  phases.add("generate", phaseSeconds_[kGenerate])
+        .add("convert", phaseSeconds_[kConvert])
+        .add("write", phaseSeconds_[kWrite])
+        .add("analysis", phaseSeconds_[kAnalysis]);
+
+  JsonObject bytes;
+  for (const auto & output : outputs_) {
+    boost::system::error_code err;
+    long size = fs::file_size(output.second, err);
+    bytes.add(output.first, err ? -1L : size);
+  }
+
+  JsonObject obj;
+  obj.add("seconds", total)
+     .add("nEvents", nEvents)
+     .add("nGenerated", nGenerated)
+     .add("nTried", nTried)
+     .add("filterEfficiency", (nGenerated > 0) ? nEvents / static_cast<double>(nGenerated) : 0.)
+     .add("eventsPerSec", (total > 0) ? nEvents / total : 0.)
+     .add("eventsPerSecRecent", (reported_ && sinceReport > 0) ?
+                                (nEvents - lastEvents_) / sinceReport : 0.)
+     .add("rssBytes", currentRSS())
+     .add("bytesWritten", bytes)
+     .add("phaseSeconds", phases);
+
+  reported_ = true;
+  lastReport_ = now;
+  lastEvents_ = nEvents;
+  return obj;
+}
+
+
+double ProgressMonitor::elapsed() const {
+  return std::chrono::duration<double>(Clock::now() - startTime_).count();
+}
+
+
+long ProgressMonitor::currentRSS() {
+  // 2nd field of statm is resident set size in pages
+  std::ifstream statm("/proc/self/statm");
+  long pages = 0, rssPages = 0;
+  if (!(statm >> pages >> rssPages)) return -1;
+  return rssPages * sysconf(_SC_PAGESIZE);
+}
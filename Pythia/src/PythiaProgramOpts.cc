@@ -13,10 +13,21 @@ using boost::lexical_cast;
 PythiaProgramOpts::PythiaProgramOpts(int argc, char* argv[]):
   cardName_(""),
   nEvents_(1),
-  mass_(8.),
+  masses_({8.}),
   seed_(0),
   energy_(13),
   diMuFilter_(false),
+  filterNLeptons_(0),
+  filterFlavour_("mu"),
+  filterPtMin_(0.),
+  filterEtaMax_(99.),
+  filterSameSign_(false),
+  tauMuBias_(0.),
+  genJets_(false),
+  jetAlgo_("antikt"),
+  jetR_(0.4),
+  jetPtMin_(20.),
+  jetEtaMax_(5.),
   writeToHEPMC_(false),
   filenameHEPMC_(""),
   writeToLHE_(false),
@@ -26,6 +37,16 @@ PythiaProgramOpts::PythiaProgramOpts(int argc, char* argv[]):
   printEvent_(false),
   verbose_(false),
   zip_(false),
+  bgzf_(false),
+  bgzfIndexInterval_(1000),
+  threads_(1),
+  maxSeconds_(0.),
+  progressInterval_(10.),
+  printInterval_(300.),
+  rootAutoFlush_(-5000000),
+  rootAutoSave_(-50000000),
+  rootBasketSize_(32000),
+  rootCompression_(1),
   desc_("\nProduces MC for p-p collisions.\n"
     "User must specify the physics process(es) to be generated \nvia an input"
     " card (see input_cards directory for examples).\nDefaults for beams, "
@@ -37,8 +58,10 @@ PythiaProgramOpts::PythiaProgramOpts(int argc, char* argv[]):
       "Name of Pythia8 settings card to loads physics processes")
     ("number,n", po::value<int>(&nEvents_)->default_value(nEvents_),
       "Number of events to run over [default = 1]. ")
-    ("mass", po::value<double>(&mass_)->default_value(mass_),
-      "Mass of a1 boson in GeV")
+    ("mass", po::value<std::vector<double>>(&masses_)->multitoken()->default_value(masses_, "8"),
+      "Mass of a1 boson in GeV. Can specify several masses, in which case " \
+      "the cards are only read once, and each mass point is generated " \
+      "in turn with its own output files.")
     ("seed", po::value<int>(&seed_)->default_value(seed_),
       "Seed for random number generator. 0 = uses time. " \
       "WARNING: DON'T USE 0 FOR BATCH SYSTEM. " \
@@ -48,6 +71,35 @@ PythiaProgramOpts::PythiaProgramOpts(int argc, char* argv[]):
       "Center-of-mass energy (in TeV).")
     ("diMuFilter", po::bool_switch(&diMuFilter_)->default_value(diMuFilter_),
       "Enable di-muon filter, so events are guaranteed to have >=2 final state muons.")
+    ("filterNLeptons", po::value<int>(&filterNLeptons_)->default_value(filterNLeptons_),
+      "Only keep events with at least this many final state leptons " \
+      "passing --filterFlavour, --filterPtMin and --filterEtaMax. 0 = no filter.")
+    ("filterFlavour", po::value<std::string>(&filterFlavour_)->default_value(filterFlavour_),
+      "Lepton flavour used by the lepton filters: mu, e, or lep (= mu or e).")
+    ("filterPtMin", po::value<double>(&filterPtMin_)->default_value(filterPtMin_),
+      "Minimum pT (in GeV) of leptons used by the lepton filters.")
+    ("filterEtaMax", po::value<double>(&filterEtaMax_)->default_value(filterEtaMax_),
+      "Maximum |eta| of leptons used by the lepton filters.")
+    ("filterSameSign", po::bool_switch(&filterSameSign_)->default_value(filterSameSign_),
+      "Only keep events with at least one pair of same-sign final state " \
+      "leptons passing --filterFlavour, --filterPtMin and --filterEtaMax.")
+    ("tauMuBias", po::value<double>(&tauMuBias_)->default_value(tauMuBias_),
+      "Bias tau decays so that tau -> mu nu nu has this branching ratio " \
+      "(1 = force all taus to decay to muons). Each event gets a weight " \
+      "to undo the bias, stored in the HepMC, LHE and ROOT outputs. " \
+      "0 = no bias.")
+    ("genJets", po::bool_switch(&genJets_)->default_value(genJets_),
+      "Cluster the visible final state particles into generator-level jets " \
+      "with FastJet, and store them in the jetVars tree of the ROOT output. " \
+      "Requires --root.")
+    ("jetAlgo", po::value<std::string>(&jetAlgo_)->default_value(jetAlgo_),
+      "Jet algorithm for --genJets: antikt, kt, or cambridge.")
+    ("jetR", po::value<double>(&jetR_)->default_value(jetR_),
+      "Jet radius parameter for --genJets.")
+    ("jetPtMin", po::value<double>(&jetPtMin_)->default_value(jetPtMin_),
+      "Minimum pT (in GeV) of jets stored with --genJets.")
+    ("jetEtaMax", po::value<double>(&jetEtaMax_)->default_value(jetEtaMax_),
+      "Maximum |eta| of jets stored with --genJets.")
     ("hepmc", po::value<std::string>(&filenameHEPMC_)->implicit_value(filenameHEPMC_),
       "Save output in HepMC format (includes hadronisation). " \
       "Can optionally take a filename for the HepMC file. "\
@@ -69,6 +121,41 @@ PythiaProgramOpts::PythiaProgramOpts(int argc, char* argv[]):
       "Output debugging statements")
     ("zip", po::bool_switch(&zip_)->default_value(zip_),
       "Compress LHE and HepMC outputs using gzip")
+    ("bgzf", po::bool_switch(&bgzf_)->default_value(bgzf_),
+      "Compress LHE and HepMC outputs using blocked gzip (BGZF) instead, " \
+      "which any gzip reader can read, but also allows reading from any " \
+      "indexed event. An index of event offsets is written to <file>.gz.idx")
+    ("bgzfIndexInterval", po::value<int>(&bgzfIndexInterval_)->default_value(bgzfIndexInterval_),
+      "Store the offset of every this many events in the --bgzf index.")
+    ("threads", po::value<int>(&threads_)->default_value(threads_),
+      "Number of threads to generate events with. Each thread runs its own " \
+      "Pythia instance, with a seed derived from --seed, and generates an " \
+      "equal share of the events. Outputs from all threads are merged " \
+      "into the usual output files.")
+    ("maxSeconds", po::value<double>(&maxSeconds_)->default_value(maxSeconds_),
+      "Stop generating events after this many seconds, and write out the " \
+      "events generated so far, e.g. to finish before the batch system's " \
+      "walltime limit. Generating also stops cleanly on SIGTERM or SIGINT. " \
+      "0 = no limit.")
+    ("progressInterval", po::value<double>(&progressInterval_)->default_value(progressInterval_),
+      "Seconds between progress reports, written as one JSON object per " \
+      "line to <output>_progress.jsonl.")
+    ("printInterval", po::value<double>(&printInterval_)->default_value(printInterval_),
+      "Seconds between progress printouts to STDOUT. 0 = never.")
+    ("rootAutoFlush", po::value<int>(&rootAutoFlush_)->default_value(rootAutoFlush_),
+      "AutoFlush setting for the ROOT output TTrees, i.e. how often baskets " \
+      "are written to file. > 0 = number of entries, " \
+      "< 0 = number of bytes held in memory.")
+    ("rootAutoSave", po::value<int>(&rootAutoSave_)->default_value(rootAutoSave_),
+      "AutoSave setting for the ROOT output TTrees, i.e. how often the " \
+      "tree header is written to file. > 0 = number of entries, " \
+      "< 0 = number of bytes written.")
+    ("rootBasketSize", po::value<int>(&rootBasketSize_)->default_value(rootBasketSize_),
+      "Basket size (in bytes) for all branches in the ROOT output TTrees.")
+    ("rootCompression", po::value<int>(&rootCompression_)->default_value(rootCompression_),
+      "Compression setting for the ROOT output file, " \
+      "100 * algorithm + level (e.g. 101 = zlib level 1, 404 = LZ4 level 4). " \
+      "0 = no compression.")
   ;
 
   po::variables_map vm;
@@ -82,34 +169,79 @@ PythiaProgramOpts::PythiaProgramOpts(int argc, char* argv[]):
 
   po::notify(vm);
 
+  if (threads_ < 1) {
+    throw std::runtime_error("Number of threads must be >= 1");
+  }
+
+  if (filterNLeptons_ < 0) {
+    throw std::runtime_error("Number of leptons for filter must be >= 0");
+  }
+
+  if (filterFlavour_ != "mu" && filterFlavour_ != "e" && filterFlavour_ != "lep") {
+    throw std::runtime_error("Filter flavour must be one of mu, e, lep");
+  }
+
+  if (maxSeconds_ < 0) {
+    throw std::runtime_error("maxSeconds must be >= 0");
+  }
+
+  if (bgzfIndexInterval_ < 1) {
+    throw std::runtime_error("bgzfIndexInterval must be >= 1");
+  }
+
+  if (progressInterval_ <= 0) {
+    throw std::runtime_error("progressInterval must be > 0");
+  }
+
+  if (printInterval_ < 0) {
+    throw std::runtime_error("printInterval must be >= 0");
+  }
+
+  if (tauMuBias_ < 0 || tauMuBias_ > 1) {
+    throw std::runtime_error("tau -> mu bias must be between 0 and 1");
+  }
+
+  if (jetAlgo_ != "antikt" && jetAlgo_ != "kt" && jetAlgo_ != "cambridge") {
+    throw std::runtime_error("Jet algorithm must be one of antikt, kt, cambridge");
+  }
+
+  if (jetR_ <= 0) {
+    throw std::runtime_error("Jet radius must be > 0");
+  }
+
+  if (rootBasketSize_ < 1) {
+    throw std::runtime_error("ROOT basket size must be >= 1");
+  }
+
+  if (rootCompression_ < 0) {
+    throw std::runtime_error("ROOT compression setting must be >= 0");
+  }
+
   // Check input card exists
   if (!fs::exists(fs::path(cardName_))) {
     throw std::runtime_error("Input card \"" + cardName_+ "\" does not exist");
   }
 
-  // Handle output filenames for various formats
+  if (masses_.empty()) {
+    throw std::runtime_error("Must specify at least one mass");
+  }
+
+  // Handle output formats. Default filenames are generated for each mass
+  // point by massFilename() if necessary.
   if (vm.count("hepmc")) {
     writeToHEPMC_ = true;
-    // Generate default filename if necessary
-    if (filenameHEPMC_ == "") {
-      filenameHEPMC_ = generateFilenameStem() + ".hepmc";
-    }
   }
 
   if (vm.count("lhe")) {
     writeToLHE_ = true;
-    // Generate default filename if necessary
-    if (filenameLHE_ == "") {
-      filenameLHE_ = generateFilenameStem() + ".lhe";
-    }
   }
 
   if (vm.count("root")) {
     writeToROOT_ = true;
-    // Generate default filename if necessary
-    if (filenameROOT_ == "") {
-      filenameROOT_ = generateFilenameStem() + ".root";
-    }
+  }
+
+  if (genJets_ && !writeToROOT_) {
+    throw std::runtime_error("--genJets needs --root, as jets are stored in the ROOT output");
   }
 }
 
@@ -124,30 +256,90 @@ void PythiaProgramOpts::printProgramOptions() {
   cout << "PYTHIA PROGRAM OPTIONS" << endl;
   cout << "+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++" << endl;
   cout << "Reading settings from " << cardName_ << endl;
-  if (writeToHEPMC_)
-    cout << "Writing events to hepmc file " << filenameHEPMC_ << endl;
-  if (writeToLHE_)
-    cout << "Writing events to lhe file " << filenameLHE_ << endl;
-  if (writeToROOT_)
-    cout << "Saving histograms to ROOT file " << filenameROOT_ << endl;
-  cout << "Generating " << nEvents_ << " events" << endl;
+  for (const auto & mass : masses_) {
+    if (writeToHEPMC_)
+      cout << "Writing events to hepmc file " << filenameHEPMC(mass) << endl;
+    if (writeToLHE_)
+      cout << "Writing events to lhe file " << filenameLHE(mass) << endl;
+    if (writeToROOT_)
+      cout << "Saving histograms to ROOT file " << filenameROOT(mass) << endl;
+    cout << "Writing run summary to " << filenameSummary(mass) << endl;
+  }
+  cout << "Generating " << nEvents_ << " events";
+  if (masses_.size() > 1)
+    cout << " per mass point";
+  cout << endl;
   cout << "Random seed: " << seed_ << endl;
-  cout << "Mass of a1: " << mass_ << endl;
+  cout << "Mass of a1:";
+  for (const auto & mass : masses_)
+    cout << " " << mass;
+  cout << endl;
   cout << "CoM energy [TeV]: " << energy_ << endl;
+  if (threads_ > 1)
+    cout << "Using " << threads_ << " threads" << endl;
+  if (maxSeconds_ > 0)
+    cout << "Stopping after " << maxSeconds_ << " seconds" << endl;
+  if (bgzf_)
+    cout << "Compressing with BGZF, indexing every " << bgzfIndexInterval_ << " events" << endl;
   if (diMuFilter_)
     cout << "Using di-muon filter" << endl;
+  if (filterNLeptons_ > 0)
+    cout << "Using filter: >= " << filterNLeptons_ << " " << filterFlavour_
+         << " with pT >= " << filterPtMin_ << " GeV, |eta| <= " << filterEtaMax_ << endl;
+  if (filterSameSign_)
+    cout << "Using filter: same-sign " << filterFlavour_ << " pair"
+         << " with pT >= " << filterPtMin_ << " GeV, |eta| <= " << filterEtaMax_ << endl;
+  if (tauMuBias_ > 0)
+    cout << "Biasing tau decays, BR(tau -> mu) = " << tauMuBias_ << endl;
+  if (genJets_)
+    cout << "Clustering gen jets: " << jetAlgo_ << ", R = " << jetR_
+         << ", pT >= " << jetPtMin_ << " GeV, |eta| <= " << jetEtaMax_ << endl;
   cout << "+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++" << endl;
 }
 
 
+std::string PythiaProgramOpts::generateFilenameStem(double mass) {
+  std::string channel = fs::path(cardName_).stem().string();
+  return channel + "_ma1_" + lexical_cast<std::string>(mass) + "_" +
+    lexical_cast<std::string>(energy_) + "TeV_n" +
+    lexical_cast<std::string>(nEvents_) + "_seed" + lexical_cast<std::string>(seed_);
+}
+
+
 std::string PythiaProgramOpts::generateFilenameStem() {
+  if (masses_.size() == 1) return generateFilenameStem(masses_.front());
   std::string channel = fs::path(cardName_).stem().string();
-  return channel + "_ma1_" + lexical_cast<std::string>(mass_) + "_" +
+  return channel + "_ma1_" + lexical_cast<std::string>(masses_.front()) + "to" +
+    lexical_cast<std::string>(masses_.back()) + "_" +
     lexical_cast<std::string>(energy_) + "TeV_n" +
     lexical_cast<std::string>(nEvents_) + "_seed" + lexical_cast<std::string>(seed_);
 }
 
 
+std::string PythiaProgramOpts::filenameSummary(double mass) {
+  std::string outputFilename = "";
+  if (writeToHEPMC_) {
+    outputFilename = filenameHEPMC(mass);
+  } else if (writeToLHE_) {
+    outputFilename = filenameLHE(mass);
+  } else if (writeToROOT_) {
+    outputFilename = filenameROOT(mass);
+  }
+  std::string summaryName = generateFilenameStem(mass) + "_summary.json";
+  return (fs::path(outputFilename).parent_path() / summaryName).string();
+}
+
+
+std::string PythiaProgramOpts::massFilename(std::string filename, double mass, std::string ext) {
+  if (filename == "") return generateFilenameStem(mass) + ext;
+  if (masses_.size() == 1) return filename;
+  fs::path p(filename);
+  std::string newName = p.stem().string() + "_ma1_" + lexical_cast<std::string>(mass) +
+                        p.extension().string();
+  return (p.parent_path() / newName).string();
+}
+
+
 void PythiaProgramOpts::printOptionError(po::error &e, std::string message) {
   cerr << message << ": " << e.what() << endl;
   cerr << desc_ << endl;
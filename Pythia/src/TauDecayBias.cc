@@ -0,0 +1,80 @@
+#include "TauDecayBias.h"
+
+#include <stdexcept>
+#include <sstream>
+
+using namespace Pythia8;
+
+
+TauDecayBias::TauDecayBias(double biasedBR):
+  biasedBR_(biasedBR),
+  originalBR_(1.)
+{
+  if (biasedBR_ < 0 || biasedBR_ > 1)
+    throw std::range_error("Biased tau -> mu BR must be between 0 and 1");
+}
+
+
+TauDecayBias::~TauDecayBias() {}
+
+
+void TauDecayBias::apply(Pythia & pythia) {
+  if (!enabled()) return;
+
+  ParticleDataEntry * tau = pythia.particleData.particleDataEntryPtr(15);
+
+  // Get the current BR to muons, out of all the channels turned on
+  double sumMu = 0, sumAll = 0;
+  for (int i = 0; i < tau->sizeChannels(); ++i) {
+    DecayChannel & channel = tau->channel(i);
+    if (channel.onMode() == 0) continue;
+    sumAll += channel.bRatio();
+    if (channel.contains(13)) sumMu += channel.bRatio();
+  }
+  if (sumMu <= 0 || sumAll <= 0)
+    throw std::runtime_error("No tau -> mu decay channels turned on, cannot bias tau decays");
+  originalBR_ = sumMu / sumAll;
+  if (originalBR_ >= 1)
+    throw std::runtime_error("All tau decay channels turned on are to muons, nothing to bias");
+
+  // Rescale the channels, via the usual settings commands so they are
+  // handled exactly as if they were in the card
+  for (int i = 0; i < tau->sizeChannels(); ++i) {
+    DecayChannel & channel = tau->channel(i);
+    if (channel.onMode() == 0) continue;
+    double newBR = channel.bRatio() / sumAll;
+    if (channel.contains(13)) {
+      newBR *= biasedBR_ / originalBR_;
+    } else {
+      newBR *= (1 - biasedBR_) / (1 - originalBR_);
+    }
+    std::ostringstream cmd;
+    cmd << "15:" << i << ":bRatio = " << newBR;
+    pythia.readString(cmd.str());
+  }
+}
+
+
+double TauDecayBias::weight(const Event & event) const {
+  if (!enabled()) return 1.;
+
+  double w = 1.;
+  for (int i = 0; i < event.size(); ++i) {
+    const Particle & p = event[i];
+    if (p.idAbs() != 15 || p.isFinal()) continue;
+    int d1 = p.daughter1();
+    int d2 = p.daughter2();
+    if (d1 <= 0 || d2 < d1) continue;
+    // Skip taus that are just copied, or radiate a photon,
+    // as the tau appears again later
+    bool isDecay = true;
+    bool toMuon = false;
+    for (int iChild = d1; iChild <= d2; ++iChild) {
+      if (event[iChild].idAbs() == 15) isDecay = false;
+      if (event[iChild].idAbs() == 13) toMuon = true;
+    }
+    if (!isDecay) continue;
+    w *= toMuon ? originalBR_ / biasedBR_ : (1 - originalBR_) / (1 - biasedBR_);
+  }
+  return w;
+}
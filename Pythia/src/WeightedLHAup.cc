@@ -0,0 +1,44 @@
+#include "WeightedLHAup.h"
+
+using namespace Pythia8;
+
+
+WeightedLHAup::WeightedLHAup(Event * processPtrIn, Info * infoPtrIn):
+  LHAupFromPYTHIA8(processPtrIn, infoPtrIn),
+  weightFactor_(1.)
+{}
+
+
+WeightedLHAup::~WeightedLHAup() {}
+
+
+bool WeightedLHAup::setEvent(int idProcIn) {
+  if (!LHAupFromPYTHIA8::setEvent(idProcIn)) return false;
+  if (weightFactor_ == 1.) return true;
+
+  // The only way to change the weight is setProcess(), which also clears
+  // the particles, so store them and add them back afterwards.
+  // Entry 0 is an empty placeholder added by setProcess().
+  particles_.clear();
+  for (int i = 1; i < sizePart(); ++i) {
+    particles_.push_back(LHAParticle(id(i), status(i), mother1(i), mother2(i),
+                                     col1(i), col2(i), px(i), py(i), pz(i), e(i),
+                                     m(i), tau(i), spin(i), scale(i)));
+  }
+
+  // setProcess() also resets the PDF info, so store that too
+  int id1In = id1(), id2In = id2();
+  double x1In = x1(), x2In = x2();
+  int id1pdfIn = id1pdf(), id2pdfIn = id2pdf();
+  double x1pdfIn = x1pdf(), x2pdfIn = x2pdf();
+  double scalePDFIn = scalePDF(), pdf1In = pdf1(), pdf2In = pdf2();
+  bool pdfIsSetIn = pdfIsSet();
+
+  setProcess(idProcess(), weight() * weightFactor_, scale(), alphaQED(), alphaQCD());
+  for (const auto & particle : particles_) {
+    addParticle(particle);
+  }
+  setIdX(id1In, id2In, x1In, x2In);
+  setPdf(id1pdfIn, id2pdfIn, x1pdfIn, x2pdfIn, scalePDFIn, pdf1In, pdf2In, pdfIsSetIn);
+  return true;
+}
@@ -1,18 +1,24 @@
+#include <atomic>
+#include <chrono>
+#include <csignal>
 #include <iostream>
 #include <fstream>
 #include <string>
+#include <memory>
+#include <mutex>
 #include <thread>
 #include <vector>
 #include "Pythia8/Pythia.h"
-// #include "fastjet/PseudoJet.hh"
-// #include "fastjet/ClusterSequence.hh"
 #include "Pythia8Plugins/HepMC2.h"
 
 // ROOT headers
 #include "TH1.h"
 #include "TFile.h"
 #include "TMath.h"
+#include "TROOT.h"
+#include "TThread.h"
 #include "TTree.h"
+#include "RVersion.h"
 
 // BOOST headers
 #include <boost/algorithm/string.hpp>
@@ -23,6 +29,16 @@
 // Own headers
 #include "PythiaProgramOpts.h"
 #include "RootHistManager.h"
+#include "OutputMerger.h"
+#include "DecayTreeIndex.h"
+#include "EventFilter.h"
+#include "JsonObject.h"
+#include "TauDecayBias.h"
+#include "WeightedLHAup.h"
+#include "ProgressMonitor.h"
+#include "OutputSidecar.h"
+#include "BgzfWriter.h"
+#include "GenJetClusterer.h"
 
 using std::cout;
 using std::endl;
@@ -32,12 +48,65 @@ using namespace Pythia8;
 namespace fs = boost::filesystem;
 
 // Forward declare methods
-std::vector<Particle*> getChildren(Event & event, Particle * p);
-std::vector<Particle*> getAllDescendants(Event & event, Particle * p, bool finalStateOnly);
+struct ThreadSummary;
+void generateEvents(PythiaProgramOpts & opts, int threadIndex, int nEvents, int seed,
+                    ofstream & progressFile, std::vector<ThreadSummary> & summaries);
+void generateMassPoint(Pythia & pythia, PythiaProgramOpts & opts, double mass,
+                       const TauDecayBias & tauBias, int threadIndex, int nEvents,
+                       ofstream & progressFile, ThreadSummary & summary);
+ThreadSummary combineSummaries(const std::vector<ThreadSummary> & summaries);
+void mergeThreadOutputs(PythiaProgramOpts & opts, double mass, int nThreads,
+                        const ThreadSummary & combined);
+void setupFilters(PythiaProgramOpts & opts, FilterChain & filterChain);
+void writeRunSummary(PythiaProgramOpts & opts, double mass, const ThreadSummary & summary);
+void writeOutputSidecars(PythiaProgramOpts & opts, double mass, const ThreadSummary & summary);
+void writeProgress(ProgressMonitor & monitor, int threadIndex, double mass,
+                   long nEvents, long nGenerated, long nTried,
+                   const std::string & threadLabel, ofstream & progressFile);
+bool stopGenerating(PythiaProgramOpts & opts);
+extern "C" void handleStopSignal(int sig);
+std::string stopReasonName();
+int deriveSeed(int seed, int threadIndex);
+std::vector<std::string> threadFilenames(const std::string & filename, int nThreads);
 std::string getCurrentTime();
 int gzip_file(std::string filename);
+int bgzf_file(const std::string & filename, const std::string & eventStart,
+              const std::string & footerStart, int indexInterval);
 bool check_file_exists(std::string filename);
 
+/**
+ * @brief Summary info from one generator thread, needed once all threads
+ * have finished (e.g. to combine cross sections).
+ */
+struct ThreadSummary {
+  int nEvents;  // number of events kept
+  long nGenerated;  // number of events generated, before filters
+  long nTried;  // number of events tried by Pythia
+  double sigmaGen;  // estimated cross section in mb
+  double sigmaErr;  // error on estimated cross section in mb
+  std::vector<FilterStageSummary> filterStages;  // pass/fail counts for each filter
+  double sumWeights;  // sum of weights of events kept
+  double sumWeights2;  // sum of weights^2 of events kept
+  double tauMuBR;  // BR(tau -> mu) before any biasing
+  bool started;  // false if this mass point was never generated, e.g. stopped early
+};
+
+// Offset between seeds of consecutive threads
+const int threadSeedOffset = 1000000;
+
+// Protect STDOUT & progress file, since all threads write to them
+std::mutex outputMutex;
+
+// Why generating stopped before the requested number of events
+enum StopReason { kNotStopped = 0, kSignal, kTimeLimit };
+
+// Set by the signal handler or once --maxSeconds has passed,
+// checked by all threads before each event
+std::atomic<int> stopReason(kNotStopped);
+
+// For --maxSeconds
+const std::chrono::steady_clock::time_point startTime = std::chrono::steady_clock::now();
+
 /**
  * @brief Main function for generating MC events
  */
@@ -46,6 +115,132 @@ int main(int argc, char *argv[]) {
   PythiaProgramOpts opts(argc, argv);
   opts.printProgramOptions();
 
+  // Stop cleanly if the batch system wants to kill the job (e.g. eviction),
+  // so the output so far is still usable
+  std::signal(SIGTERM, handleStopSignal);
+  std::signal(SIGINT, handleStopSignal);
+
+  int nThreads = opts.threads();
+  if (nThreads > 1) {
+    // Each thread has its own TTrees/TFile, but ROOT still needs to be told
+#if ROOT_VERSION_CODE >= ROOT_VERSION(6,6,0)
+    ROOT::EnableThreadSafety();
+#else
+    TThread::Initialize();
+#endif
+  }
+
+  // Progress reports, one JSON object per line - handy for monitoring jobs
+  ofstream progressFile;
+  std::string stem = opts.generateFilenameStem();
+  progressFile.open(stem + "_progress.jsonl");
+
+  //---------------------------------------------------------------------------
+  // GENERATE EVENTS, SPLIT ACROSS THREADS
+  //---------------------------------------------------------------------------
+  // Split events as evenly as possible between threads,
+  // and derive a seed for each thread
+  int baseSeed = opts.seed();
+  if (baseSeed == 0 && nThreads > 1) {
+    // Get the seed from the time once, otherwise all threads get the same seed
+    baseSeed = time(0) % threadSeedOffset;
+  }
+  // Each thread runs over all mass points in turn, so store summaries by
+  // [thread][mass point]
+  std::vector<double> masses = opts.masses();
+  std::vector<std::vector<ThreadSummary>> summaries(nThreads,
+                                                    std::vector<ThreadSummary>(masses.size()));
+  std::vector<std::thread> threads;
+  for (int iThread = 0; iThread < nThreads; ++iThread) {
+    int nEvents = opts.nEvents() / nThreads + (iThread < opts.nEvents() % nThreads ? 1 : 0);
+    int seed = deriveSeed(baseSeed, iThread);
+    if (nThreads == 1) {
+      // Run in the main thread, keep things simple
+      generateEvents(opts, iThread, nEvents, seed, progressFile, summaries[iThread]);
+    } else {
+      threads.push_back(std::thread(generateEvents, std::ref(opts), iThread, nEvents,
+                                    seed, std::ref(progressFile),
+                                    std::ref(summaries[iThread])));
+    }
+  }
+  for (auto & thr : threads) {
+    thr.join();
+  }
+
+  progressFile.close();
+
+  //---------------------------------------------------------------------------
+  // MERGE OUTPUT FROM ALL THREADS, ZIP
+  //---------------------------------------------------------------------------
+  for (unsigned int iMass = 0; iMass < masses.size(); ++iMass) {
+    double mass = masses[iMass];
+    std::vector<ThreadSummary> massSummaries;
+    for (const auto & threadSummaries : summaries) {
+      massSummaries.push_back(threadSummaries[iMass]);
+    }
+    ThreadSummary combined = combineSummaries(massSummaries);
+    if (!combined.started) {
+      cout << "Stopped before generating ma1 = " << mass << ", no output" << endl;
+      continue;
+    }
+
+    if (nThreads > 1) {
+      mergeThreadOutputs(opts, mass, nThreads, combined);
+    }
+
+    if (opts.useFilters()) {
+      if (masses.size() > 1) cout << "[ma1 " << mass << "] ";
+      FilterChain::print(combined.nGenerated, combined.filterStages);
+    }
+    writeRunSummary(opts, mass, combined);
+
+    if (opts.bgzf()) {
+      // Blocked GZIP, so events can be read from the middle of the file
+      if (opts.writeToLHE()) {
+        int res = bgzf_file(opts.filenameLHE(mass), "<event", "</LesHouchesEvents>",
+                            opts.bgzfIndexInterval());
+        if (res != 0) return res;
+      }
+      if (opts.writeToHEPMC()) {
+        int res = bgzf_file(opts.filenameHEPMC(mass), "E ", "HepMC::IO_GenEvent-END",
+                            opts.bgzfIndexInterval());
+        if (res != 0) return res;
+      }
+    } else if (opts.zip()) {
+      // GZIP output to save space
+      std::vector<std::string> filenames;
+      if (opts.writeToLHE()) filenames.push_back(opts.filenameLHE(mass));
+      if (opts.writeToHEPMC()) filenames.push_back(opts.filenameHEPMC(mass));
+
+      for (const auto & fname : filenames) {
+        int res = gzip_file(fname);
+        if (res != 0) return res;
+      }
+    }
+
+    writeOutputSidecars(opts, mass, combined);
+  }
+
+  return 0;
+}
+
+
+/**
+ * @brief Generate events for all mass points using one Pythia instance,
+ * writing the output to the files for this thread.
+ * @details The cards are only read once. For each mass point only the a1
+ * mass is changed before re-initialising Pythia.
+ *
+ * @param opts Program options
+ * @param threadIndex Index of this thread, used for output filenames
+ * @param nEvents Number of events to generate in this thread, per mass point
+ * @param seed Seed for this thread's random number generator
+ * @param progressFile File to write progress to, shared between threads
+ * @param summaries Stores number of events, cross section, etc for each
+ * mass point once finished
+ */
+void generateEvents(PythiaProgramOpts & opts, int threadIndex, int nEvents, int seed,
+                    ofstream & progressFile, std::vector<ThreadSummary> & summaries) {
   //---------------------------------------------------------------------------
   // SETUP PYTHIA
   //---------------------------------------------------------------------------
@@ -62,118 +257,247 @@ int main(int argc, char *argv[]) {
 
   pythia.readString("Beams:eCM = " + lexical_cast<std::string>(opts.energy() * 1000));
 
-  pythia.readString("Main:numberOfEvents = " + lexical_cast<std::string>(opts.nEvents()));
-  pythia.readString("Random:seed = " + lexical_cast<std::string>(opts.seed()));
-  pythia.readString("36:m0 = " + lexical_cast<std::string>(opts.mass()));
+  pythia.readString("Main:numberOfEvents = " + lexical_cast<std::string>(nEvents));
+  pythia.readString("Random:seed = " + lexical_cast<std::string>(seed));
+
+  // only let one thread print out the init info, otherwise STDOUT is a mess
+  if (threadIndex > 0) {
+    pythia.readString("Init:showChangedSettings = off");
+    pythia.readString("Init:showChangedParticleData = off");
+    pythia.readString("Init:showProcesses = off");
+  }
+
+  // Bias tau decays if requested. Done once, as it is not changed by init()
+  TauDecayBias tauBias(opts.tauMuBias());
+  tauBias.apply(pythia);
+
+  std::vector<double> masses = opts.masses();
+  for (unsigned int iMass = 0; iMass < masses.size(); ++iMass) {
+    if (stopGenerating(opts)) break;
+    generateMassPoint(pythia, opts, masses[iMass], tauBias, threadIndex, nEvents,
+                      progressFile, summaries[iMass]);
+  }
+}
+
+
+/**
+ * @brief Generate events for one mass point, writing the output
+ * to the files for this thread & mass.
+ *
+ * @param pythia Pythia instance, with cards already read in
+ * @param opts Program options
+ * @param mass Mass of a1
+ * @param tauBias Tau decay biasing, already applied to pythia
+ * @param threadIndex Index of this thread, used for output filenames
+ * @param nEvents Number of events to generate in this thread
+ * @param progressFile File to write progress to, shared between threads
+ * @param summary Stores number of events, cross section, etc once finished
+ */
+void generateMassPoint(Pythia & pythia, PythiaProgramOpts & opts, double mass,
+                       const TauDecayBias & tauBias, int threadIndex, int nEvents,
+                       ofstream & progressFile, ThreadSummary & summary) {
+  int nThreads = opts.threads();
+  // for prefixing any output
+  std::string threadLabel = (nThreads > 1) ? "[thread " + lexical_cast<std::string>(threadIndex) + "] " : "";
+  if (opts.masses().size() > 1)
+    threadLabel += "[ma1 " + lexical_cast<std::string>(mass) + "] ";
 
+  // Only the mass changes between mass points. Pythia has to be
+  // re-initialised for the new mass to propagate to widths, phase space, etc.
+  // The random number generator is reseeded at init, so each mass point gets
+  // the same events as if it was run on its own.
+  pythia.readString("36:m0 = " + lexical_cast<std::string>(mass));
   pythia.init();
 
   // Interface for conversion from Pythia8::Event to HepMC event.
   HepMC::Pythia8ToHepMC ToHepMC;
-  HepMC::IO_GenEvent ascii_io(opts.filenameHEPMC(), std::ios::out);
+  std::unique_ptr<HepMC::IO_GenEvent> ascii_io;
+  ProgressMonitor monitor(opts.progressInterval(), opts.printInterval());
   if (opts.writeToHEPMC()) {
-    cout << "Writing HepMC to " << opts.filenameHEPMC() << endl;
+    std::string filenameHEPMC = threadFilename(opts.filenameHEPMC(mass), threadIndex, nThreads);
+    monitor.addOutput("hepmc", filenameHEPMC);
+    ascii_io.reset(new HepMC::IO_GenEvent(filenameHEPMC, std::ios::out));
+    std::lock_guard<std::mutex> lock(outputMutex);
+    cout << threadLabel << "Writing HepMC to " << filenameHEPMC << endl;
   }
 
   // Create an LHAup object that can access relevant information in pythia for writing to LHE
-  LHAupFromPYTHIA8 myLHA(&pythia.process, &pythia.info);
+  WeightedLHAup myLHA(&pythia.process, &pythia.info);
   if (opts.writeToLHE()) {
-    cout << "Writing LHE to " << opts.filenameLHE() << endl;
+    std::string filenameLHE = threadFilename(opts.filenameLHE(mass), threadIndex, nThreads);
+    monitor.addOutput("lhe", filenameLHE);
+    {
+      std::lock_guard<std::mutex> lock(outputMutex);
+      cout << threadLabel << "Writing LHE to " << filenameLHE << endl;
+    }
     // Open a file on which LHEF events should be stored, and write header.
-    myLHA.openLHEF(opts.filenameLHE());
+    myLHA.openLHEF(filenameLHE);
     // Store initialization info in the LHAup object.
     myLHA.setInit();
     // Write out this initialization info on the file.
     myLHA.initLHEF();
   }
 
-  // Text file to write progress - handy for monitoring during jobs
-  ofstream progressFile;
-  std::string stem = opts.generateFilenameStem();
-  progressFile.open(stem + "_progress.txt");
-
   //---------------------------------------------------------------------------
   // SETUP ROOT TREES/HISTOGRAMS
   //---------------------------------------------------------------------------
+  // Open the output file first, so the trees are written out to it as they
+  // are filled, instead of being held in memory until the end of the job
+  std::unique_ptr<TFile> outFile;
+  if (opts.writeToROOT()) {
+    std::string filenameROOT = threadFilename(opts.filenameROOT(mass), threadIndex, nThreads);
+    monitor.addOutput("root", filenameROOT);
+    outFile.reset(new TFile(filenameROOT.c_str(), "RECREATE", "",
+                            opts.rootCompression()));
+    if (outFile->IsZombie())
+      throw std::runtime_error("Could not open ROOT file " + filenameROOT);
+  }
+
   // need different Trees as we fill them at different rates, stop double counting
   // h1 variables
-  TTree hTree("hVars", "hVars");
+  TTree * hTree = new TTree("hVars", "hVars");
   float hPt(-1.), hEta(99.), hPhi(99.);
   float a1DPhi(99.), a1Dr(99.);
-  hTree.Branch("hPt", &hPt, "hPt/Float_t");
-  hTree.Branch("hEta", &hEta, "hEta/Float_t");
-  hTree.Branch("hPhi", &hPhi, "hPhi/Float_t");
-  hTree.Branch("a1DPhi", &a1DPhi, "a1DPhi/Float_t");
-  hTree.Branch("a1Dr", &a1Dr, "a1Dr/Float_t");
+  hTree->Branch("hPt", &hPt, "hPt/Float_t");
+  hTree->Branch("hEta", &hEta, "hEta/Float_t");
+  hTree->Branch("hPhi", &hPhi, "hPhi/Float_t");
+  hTree->Branch("a1DPhi", &a1DPhi, "a1DPhi/Float_t");
+  hTree->Branch("a1Dr", &a1Dr, "a1Dr/Float_t");
   // a1 variables
-  TTree a1Tree("a1Vars", "a1Vars");
+  TTree * a1Tree = new TTree("a1Vars", "a1Vars");
   float a1Pt(-1.), a1Eta(99.), a1Phi(99.);
   float a1DecayDPhi(99.), a1DecayDr(99.);
-  a1Tree.Branch("a1Pt", &a1Pt, "a1Pt/Float_t");
-  a1Tree.Branch("a1Eta", &a1Eta, "a1Eta/Float_t");
-  a1Tree.Branch("a1Phi", &a1Phi, "a1Phi/Float_t");
-  a1Tree.Branch("a1DecayDPhi", &a1DecayDPhi, "a1DecayDPhi/Float_t");
-  a1Tree.Branch("a1DecayDr", &a1DecayDr, "a1DecayDr/Float_t");
+  a1Tree->Branch("a1Pt", &a1Pt, "a1Pt/Float_t");
+  a1Tree->Branch("a1Eta", &a1Eta, "a1Eta/Float_t");
+  a1Tree->Branch("a1Phi", &a1Phi, "a1Phi/Float_t");
+  a1Tree->Branch("a1DecayDPhi", &a1DecayDPhi, "a1DecayDPhi/Float_t");
+  a1Tree->Branch("a1DecayDr", &a1DecayDr, "a1DecayDr/Float_t");
   // vars for a1 decay products (e.g. tau-tau)
-  TTree a1DecayTree("a1DecayVars", "a1DecayVars");
+  TTree * a1DecayTree = new TTree("a1DecayVars", "a1DecayVars");
   float a1DecayPt(-1.), a1DecayEta(99.), a1DecayPhi(99.);
-  a1DecayTree.Branch("a1DecayPt", &a1DecayPt, "a1DecayPt/Float_t");
-  a1DecayTree.Branch("a1DecayEta", &a1DecayEta, "a1DecayEta/Float_t");
-  a1DecayTree.Branch("a1DecayPhi", &a1DecayPhi, "a1DecayPhi/Float_t");
+  a1DecayTree->Branch("a1DecayPt", &a1DecayPt, "a1DecayPt/Float_t");
+  a1DecayTree->Branch("a1DecayEta", &a1DecayEta, "a1DecayEta/Float_t");
+  a1DecayTree->Branch("a1DecayPhi", &a1DecayPhi, "a1DecayPhi/Float_t");
   // vars for mu from a1 decay with cuts on 2 SS mu
-  TTree a1DecayMuTree("a1DecayMuVars", "a1DecayMuVars");
+  TTree * a1DecayMuTree = new TTree("a1DecayMuVars", "a1DecayMuVars");
   float a1DecayMuPt(-1.), a1DecayMuEta(99.), a1DecayMuPhi(99.);
-  a1DecayMuTree.Branch("a1DecayMuPt", &a1DecayMuPt, "a1DecayMuPt/Float_t");
-  a1DecayMuTree.Branch("a1DecayMuEta", &a1DecayMuEta, "a1DecayMuEta/Float_t");
-  a1DecayMuTree.Branch("a1DecayMuPhi", &a1DecayMuPhi, "a1DecayMuPhi/Float_t");
+  a1DecayMuTree->Branch("a1DecayMuPt", &a1DecayMuPt, "a1DecayMuPt/Float_t");
+  a1DecayMuTree->Branch("a1DecayMuEta", &a1DecayMuEta, "a1DecayMuEta/Float_t");
+  a1DecayMuTree->Branch("a1DecayMuPhi", &a1DecayMuPhi, "a1DecayMuPhi/Float_t");
   // vars for tau decays (all)
-  TTree tauDecayTree("tauDecayVars", "tauDecayVars");
+  TTree * tauDecayTree = new TTree("tauDecayVars", "tauDecayVars");
   float tauDecayPtRatio(-99.), tauDecayDr(99.);
-  tauDecayTree.Branch("tauDecayPtRatio", &tauDecayPtRatio, "tauDecayPtRatio/Float_t");
-  tauDecayTree.Branch("tauDecayDr", &tauDecayDr, "tauDecayDr/Float_t");
+  tauDecayTree->Branch("tauDecayPtRatio", &tauDecayPtRatio, "tauDecayPtRatio/Float_t");
+  tauDecayTree->Branch("tauDecayDr", &tauDecayDr, "tauDecayDr/Float_t");
   // vars for tau decays (charged only)
-  TTree tauDecayChargedTree("tauDecayChargedVars", "tauDecayChargedVars");
+  TTree * tauDecayChargedTree = new TTree("tauDecayChargedVars", "tauDecayChargedVars");
   float tauDecayChargedPtRatio(-99.), tauDecayChargedDr(99.);
-  tauDecayChargedTree.Branch("tauDecayChargedPtRatio", &tauDecayChargedPtRatio, "tauDecayChargedPtRatio/Float_t");
-  tauDecayChargedTree.Branch("tauDecayChargedDr", &tauDecayChargedDr, "tauDecayChargedDr/Float_t");
+  tauDecayChargedTree->Branch("tauDecayChargedPtRatio", &tauDecayChargedPtRatio, "tauDecayChargedPtRatio/Float_t");
+  tauDecayChargedTree->Branch("tauDecayChargedDr", &tauDecayChargedDr, "tauDecayChargedDr/Float_t");
+
+  // Attach trees to the output file (set explicitly, since gDirectory
+  // isn't reliable with several threads), and control how often baskets are
+  // flushed to it so memory use stays flat however many events are generated
+  std::vector<TTree*> trees = {hTree, a1Tree, a1DecayTree, a1DecayMuTree,
+                               tauDecayTree, tauDecayChargedTree};
+
+  // gen jets, one entry per jet. jetRank = 0 for the leading jet,
+  // so each event's jets start at an entry with jetRank == 0.
+  // Events with no jets get one placeholder entry with jetRank = -1 & nJets = 0,
+  // so every event has an entry with jetRank <= 0, e.g. to plot nJets
+  std::unique_ptr<GenJetClusterer> jetClusterer;
+  TTree * jetTree = nullptr;
+  float jetPt(-1.), jetEta(99.), jetPhi(99.), jetMass(-1.);
+  int jetRank(-1), nJets(0), jetNBHadrons(0);
+  if (opts.genJets()) {
+    jetClusterer.reset(new GenJetClusterer(opts.jetAlgo(), opts.jetR(),
+                                           opts.jetPtMin(), opts.jetEtaMax()));
+    jetTree = new TTree("jetVars", "jetVars");
+    jetTree->Branch("jetPt", &jetPt, "jetPt/Float_t");
+    jetTree->Branch("jetEta", &jetEta, "jetEta/Float_t");
+    jetTree->Branch("jetPhi", &jetPhi, "jetPhi/Float_t");
+    jetTree->Branch("jetMass", &jetMass, "jetMass/Float_t");
+    jetTree->Branch("jetRank", &jetRank, "jetRank/Int_t");
+    jetTree->Branch("nJets", &nJets, "nJets/Int_t");
+    jetTree->Branch("jetNBHadrons", &jetNBHadrons, "jetNBHadrons/Int_t");
+    trees.push_back(jetTree);
+    if (threadIndex == 0) {
+      std::lock_guard<std::mutex> lock(outputMutex);
+      cout << threadLabel << "Gen jets: " << jetClusterer->description() << endl;
+    }
+  }
+
+  // event weight, e.g. to undo biasing of tau decays
+  float weight(1.);
+  for (auto & tree : trees) {
+    tree->Branch("weight", &weight, "weight/Float_t");
+  }
+
+  for (auto & tree : trees) {
+    tree->SetDirectory(outFile.get());
+    tree->SetBasketSize("*", opts.rootBasketSize());
+    tree->SetAutoFlush(opts.rootAutoFlush());
+    tree->SetAutoSave(opts.rootAutoSave());
+  }
+
 
   //---------------------------------------------------------------------------
   // GENERATE EVENTS
   //---------------------------------------------------------------------------
-  int progressFreq = 50;
+  // Generator-level filters, applied before anything is stored
+  FilterChain filterChain;
+  setupFilters(opts, filterChain);
+
+  // Reused for every event, to avoid allocating memory in the event loop
+  DecayTreeIndex decayIndex;
+  std::vector<int> posMu;
+  std::vector<int> negMu;
 
-  for (int iEvent = 0; iEvent < opts.nEvents();) {
-    // output progress info
-    if (iEvent % progressFreq == 0) {
-      cout << "iEvent: " << iEvent << " - " << getCurrentTime() << endl;
-      progressFile << "iEvent: " << iEvent << " - " << getCurrentTime() << endl;
+  double sumWeights = 0, sumWeights2 = 0;
+
+  int iEvent = 0;
+  while (iEvent < nEvents) {
+    // output progress info. Only check every few events, the clock isn't free
+    if (iEvent % 10 == 0 && monitor.reportDue()) {
+      writeProgress(monitor, threadIndex, mass, iEvent, filterChain.nEvents(),
+                    pythia.info.nTried(), threadLabel, progressFile);
     }
 
-    // Generate event safely
-    if (!pythia.next()) {
+    // Stop early if out of time, or asked to by the batch system.
+    // Everything after the loop still runs, so the output is complete.
+    if (stopGenerating(opts)) {
+      std::lock_guard<std::mutex> lock(outputMutex);
+      cout << threadLabel << "Stopping early (" << stopReasonName() << ") after "
+           << iEvent << " events" << endl;
       break;
     }
 
-    Event event = pythia.event;
-
-    // Cut on number of muons
-    if (opts.diMuFilter()) {
-      int nMuons = 0;
-      for (int i = 0; i < event.size(); ++i) {
-        // check if final state and a muon
-        if (event[i].idAbs() == 13 && event[i].status() > 0)
-          nMuons++;
-        if (nMuons == 2)
-          break;
+    // Use the event record directly, no need to copy it
+    Event & event = pythia.event;
+
+    bool passed = false;
+    {
+      PhaseTimer timer(monitor, ProgressMonitor::kGenerate);
+      // Generate event safely
+      if (!pythia.next()) {
+        break;
       }
-      if (nMuons < 2)
-        continue;
+      // Apply filters, stops at the first one that fails
+      passed = filterChain.pass(event);
     }
+    if (!passed) continue;
 
     iEvent++;
 
+    // Weight needed to undo any biasing
+    double biasWeight = tauBias.weight(event);
+    double eventWeight = pythia.info.weight() * biasWeight;
+    weight = eventWeight;
+    sumWeights += eventWeight;
+    sumWeights2 += eventWeight * eventWeight;
+
     // Output to screen if wanted
-    if (iEvent < 2 && opts.printEvent()) {
+    if (iEvent < 2 && opts.printEvent() && threadIndex == 0) {
       pythia.info.list();
       pythia.event.list();
       pythia.process.list();
@@ -186,13 +510,26 @@ int main(int argc, char *argv[]) {
     // Write the HepMC event to file. Done with it.
     if (opts.writeToHEPMC()) {
       HepMC::GenEvent* hepmcevt = new HepMC::GenEvent(HepMC::Units::GEV, HepMC::Units::MM);
-      ToHepMC.fill_next_event(pythia, hepmcevt);
-      ascii_io << hepmcevt;
+      {
+        PhaseTimer timer(monitor, ProgressMonitor::kConvert);
+        ToHepMC.fill_next_event(pythia, hepmcevt);
+        if (tauBias.enabled()) {
+          if (hepmcevt->weights().size() > 0) {
+            hepmcevt->weights()[0] *= biasWeight;
+          } else {
+            hepmcevt->weights().push_back(eventWeight);
+          }
+        }
+      }
+      PhaseTimer timer(monitor, ProgressMonitor::kWrite);
+      *ascii_io << hepmcevt;
       delete hepmcevt;
     }
 
     if (opts.writeToLHE()) {
+      PhaseTimer timer(monitor, ProgressMonitor::kWrite);
       // Store event info in the LHAup object.
+      myLHA.setWeightFactor(biasWeight);
       myLHA.setEvent();
       // Write out this event info on the file.
       // With optional argument (verbose =) false the file is smaller.
@@ -204,8 +541,39 @@ int main(int argc, char *argv[]) {
     //-------------------------------------------------------------------------
     if (!opts.writeToROOT()) continue;
 
+    // includes filling the trees, i.e. writing ROOT output
+    PhaseTimer analysisTimer(monitor, ProgressMonitor::kAnalysis);
+
+    // cluster gen jets. Independent of the h decay, so done for every event
+    if (jetClusterer) {
+      const std::vector<fastjet::PseudoJet> & jets = jetClusterer->cluster(event);
+      nJets = jets.size();
+      for (unsigned int iJet = 0; iJet < jets.size(); ++iJet) {
+        jetPt = jets[iJet].pt();
+        jetEta = jets[iJet].eta();
+        // same range as Pythia's phi(), [-pi, pi]
+        jetPhi = jets[iJet].phi_std();
+        jetMass = jets[iJet].m();
+        jetRank = iJet;
+        jetNBHadrons = jetClusterer->nBHadrons(iJet);
+        jetTree->Fill();
+      }
+      if (jets.empty()) {
+        jetPt = -1.;
+        jetEta = 99.;
+        jetPhi = 99.;
+        jetMass = -1.;
+        jetRank = -1;
+        jetNBHadrons = 0;
+        jetTree->Fill();
+      }
+    }
+
     bool donePlots = false;
 
+    // index the decay tree once, rather than searching it for every particle
+    decayIndex.build(event);
+
     // find h decay products and look at separation
     for (int i = 0; i < event.size(); ++i) {
       if (donePlots) break; // skip the rest of the event listing, we're done
@@ -223,46 +591,49 @@ int main(int argc, char *argv[]) {
         int d2 = h1.daughter2();
         a1Dr = REtaPhi(event[d1].p(), event[d2].p());
         a1DPhi = phi(event[d1].p(), event[d2].p());
-        hTree.Fill();
+        hTree->Fill();
 
         // now find all the h1 children (e.g. a1)
         // and plot child variables, and their decay products
-        for (auto & a1Itr : getChildren(event, &h1)) {
-          a1Pt = a1Itr->pT();
-          a1Eta = a1Itr->eta();
-          a1Phi = a1Itr->phi();
+        for (int iA1 : decayIndex.children(i)) {
+          Particle & a1 = event[iA1];
+          a1Pt = a1.pT();
+          a1Eta = a1.eta();
+          a1Phi = a1.phi();
 
           // look at a1 daughter particles
-          Vec4 daughter1Mom = event[a1Itr->daughter1()].p();
-          if (a1Itr->daughter2() == 0 || a1Itr->daughter2() == a1Itr->daughter1()) {
+          Vec4 daughter1Mom = event[a1.daughter1()].p();
+          if (a1.daughter2() == 0 || a1.daughter2() == a1.daughter1()) {
             cout << "OH BUM" << endl;
           }
-          Vec4 daughter2Mom = event[a1Itr->daughter2()].p();
+          Vec4 daughter2Mom = event[a1.daughter2()].p();
           a1DecayDr = REtaPhi(daughter1Mom, daughter2Mom);
           a1DecayDPhi = phi(daughter1Mom, daughter2Mom);
-          a1Tree.Fill();
+          a1Tree->Fill();
 
-          for (auto & dItr : getChildren(event, a1Itr)) {
-            a1DecayPt = dItr->pT();
-            a1DecayEta = dItr->eta();
-            a1DecayPhi = dItr->phi();
-            a1DecayTree.Fill();
+          for (int iD : decayIndex.children(iA1)) {
+            a1DecayPt = event[iD].pT();
+            a1DecayEta = event[iD].eta();
+            a1DecayPhi = event[iD].phi();
+            a1DecayTree->Fill();
           }
 
           // look at tau decay products
-          for (auto & tauItr : getAllDescendants(event, a1Itr, false)) {
+          for (int iTau : decayIndex.descendants(iA1, false)) {
+            Particle & tau = event[iTau];
             // get taus that decay properly (not gamma radiation)
-            if (tauItr->idAbs() == 15 && tauItr->daughterList().size() > 2) {
-              for (auto & pItr : getAllDescendants(event, tauItr, true)) {
+            if (tau.idAbs() == 15 && decayIndex.children(iTau).size() > 2) {
+              for (int iP : decayIndex.descendants(iTau, true)) {
+                Particle & prod = event[iP];
                 // for all products
-                tauDecayPtRatio = pItr->pT() / tauItr->pT();
-                tauDecayDr = REtaPhi(pItr->p(), tauItr->p());
-                tauDecayTree.Fill();
+                tauDecayPtRatio = prod.pT() / tau.pT();
+                tauDecayDr = REtaPhi(prod.p(), tau.p());
+                tauDecayTree->Fill();
                 // for charged products
-                if (fabs(pItr->charge()) != 0) {
-                  tauDecayChargedPtRatio = pItr->pT() / tauItr->pT();
-                  tauDecayChargedDr = REtaPhi(pItr->p(), tauItr->p());
-                  tauDecayChargedTree.Fill();
+                if (fabs(prod.charge()) != 0) {
+                  tauDecayChargedPtRatio = prod.pT() / tau.pT();
+                  tauDecayChargedDr = REtaPhi(prod.p(), tau.p());
+                  tauDecayChargedTree->Fill();
                 }
               }
             }
@@ -270,31 +641,33 @@ int main(int argc, char *argv[]) {
         }
 
         // analyze the muons in the tau decays. We want 2 SS muons.
-        std::vector<Particle*> posMu;
-        std::vector<Particle*> negMu;
-        for (auto & itr : getAllDescendants(event, &h1, true)) {
-          if (itr->idAbs() == 13) {
-            if (itr->charge() > 0) {
-              posMu.push_back(itr);
+        posMu.clear();
+        negMu.clear();
+        for (int iMu : decayIndex.descendants(i, true)) {
+          if (event[iMu].idAbs() == 13) {
+            if (event[iMu].charge() > 0) {
+              posMu.push_back(iMu);
             } else {
-              negMu.push_back(itr);
+              negMu.push_back(iMu);
             }
           }
         }
         // get whichever charge collection has 2+ muons...
-        std::vector<Particle*> a1mu;
+        const std::vector<int> * a1mu = nullptr;
         if (posMu.size() >= 2) {
-          a1mu = posMu;
+          a1mu = &posMu;
         } else if (negMu.size()) {
-          a1mu = negMu;
+          a1mu = &negMu;
         }
 
         // ...and plot some stuff
-        for (auto & muItr : a1mu) {
-          a1DecayMuPt = muItr->pT();
-          a1DecayMuEta = muItr->eta();
-          a1DecayMuPhi = muItr->phi();
-          a1DecayMuTree.Fill();
+        if (a1mu) {
+          for (int iMu : *a1mu) {
+            a1DecayMuPt = event[iMu].pT();
+            a1DecayMuEta = event[iMu].eta();
+            a1DecayMuPhi = event[iMu].phi();
+            a1DecayMuTree->Fill();
+          }
         }
 
         donePlots = true;
@@ -302,27 +675,40 @@ int main(int argc, char *argv[]) {
     }
   } // end of generating events loop
 
-  progressFile.close();
+  // final report, so the last line always matches the output
+  writeProgress(monitor, threadIndex, mass, iEvent, filterChain.nEvents(),
+                pythia.info.nTried(), threadLabel, progressFile);
 
   //---------------------------------------------------------------------------
   // PRINTOUT STATS & HISTOGRAMS
   //---------------------------------------------------------------------------
-  pythia.stat();
+  {
+    std::lock_guard<std::mutex> lock(outputMutex);
+    pythia.stat();
+  }
+
+  summary.started = true;
+  summary.nEvents = iEvent;
+  summary.nGenerated = filterChain.nEvents();
+  summary.filterStages = filterChain.stages();
+  summary.sumWeights = sumWeights;
+  summary.sumWeights2 = sumWeights2;
+  summary.tauMuBR = tauBias.originalBR();
+  summary.nTried = pythia.info.nTried();
+  summary.sigmaGen = pythia.info.sigmaGen();
+  summary.sigmaErr = pythia.info.sigmaErr();
 
   //---------------------------------------------------------------------------
   // WRITE ROOT HISTOGRAMS TO FILE & TIDY UP
   //---------------------------------------------------------------------------
-  if (opts.writeToROOT()) {
-      TFile * outFile = new TFile((opts.filenameROOT()).c_str(), "RECREATE");
-      // histMan.write(outFile);
-      hTree.Write("", TObject::kOverwrite);
-      a1Tree.Write("", TObject::kOverwrite);
-      a1DecayTree.Write("", TObject::kOverwrite);
-      a1DecayMuTree.Write("", TObject::kOverwrite);
-      tauDecayTree.Write("", TObject::kOverwrite);
-      tauDecayChargedTree.Write("", TObject::kOverwrite);
-      outFile->Close();
-      delete outFile;
+  if (outFile) {
+    // Flush remaining baskets & tree headers.
+    // Closing the file deletes the trees it owns.
+    // histMan.write(outFile);
+    outFile->Write("", TObject::kOverwrite);
+    outFile->Close();
+  } else {
+    for (auto & tree : trees) delete tree;
   }
 
   if (opts.writeToLHE()) {
@@ -331,78 +717,316 @@ int main(int argc, char *argv[]) {
     // Write endtag. Overwrite initialization info with new cross sections.
     myLHA.closeLHEF(true);
   }
+}
 
-  if (opts.zip()) {
-    // GZIP output to save space
-    std::vector<std::string> filenames;
-    if (opts.writeToLHE()) filenames.push_back(opts.filenameLHE());
-    if (opts.writeToHEPMC()) filenames.push_back(opts.filenameHEPMC());
 
-    for (const auto & fname : filenames) {
-      int res = gzip_file(fname);
-      if (res != 0) return res;
-    }
+/**
+ * @brief Combine the summaries from all threads for one mass point.
+ * @details Cross sections are combined weighting by number of tries.
+ *
+ * @param summaries Summary from each thread
+ *
+ * @return Combined summary
+ */
+ThreadSummary combineSummaries(const std::vector<ThreadSummary> & summaries) {
+  ThreadSummary combined = {0, 0, 0, 0., 0., {}, 0., 0., 1., false};
+  double sumSigma = 0, sumErr2 = 0;
+  std::vector<std::vector<FilterStageSummary>> filterStages;
+  for (const auto & summary : summaries) {
+    if (!summary.started) continue;
+    combined.started = true;
+    combined.nEvents += summary.nEvents;
+    combined.nGenerated += summary.nGenerated;
+    combined.nTried += summary.nTried;
+    sumSigma += summary.nTried * summary.sigmaGen;
+    sumErr2 += pow(summary.nTried * summary.sigmaErr, 2);
+    filterStages.push_back(summary.filterStages);
+    combined.sumWeights += summary.sumWeights;
+    combined.sumWeights2 += summary.sumWeights2;
+    combined.tauMuBR = summary.tauMuBR;
+  }
+  if (combined.nTried > 0) {
+    combined.sigmaGen = sumSigma / combined.nTried;
+    combined.sigmaErr = sqrt(sumErr2) / combined.nTried;
   }
+  combined.filterStages = FilterChain::combine(filterStages);
+  return combined;
+}
 
-  return 0;
+
+/**
+ * @brief Merge the per-thread output files for one mass point.
+ *
+ * @param opts Program options
+ * @param mass Mass of a1
+ * @param nThreads Number of threads
+ * @param combined Combined summary from all threads for this mass point
+ */
+void mergeThreadOutputs(PythiaProgramOpts & opts, double mass, int nThreads,
+                        const ThreadSummary & combined) {
+  double sigmaGen = combined.sigmaGen;
+  double sigmaErr = combined.sigmaErr;
+  cout << "Combined sigma from " << nThreads << " threads for ma1 = " << mass << ": "
+       << sigmaGen << " +- " << sigmaErr << " mb" << endl;
+
+  // If stopped early, some threads may not have started this mass point,
+  // so only merge the part files that exist
+  std::vector<std::string> parts;
+  if (opts.writeToHEPMC()) {
+    parts = threadFilenames(opts.filenameHEPMC(mass), nThreads);
+    if (!mergeHepMCFiles(parts, opts.filenameHEPMC(mass)))
+      throw std::runtime_error("Could not merge HepMC files into " + opts.filenameHEPMC(mass));
+    removeFiles(parts);
+  }
+  if (opts.writeToLHE()) {
+    parts = threadFilenames(opts.filenameLHE(mass), nThreads);
+    // LHE stores cross sections in pb
+    if (!mergeLHEFiles(parts, opts.filenameLHE(mass), 1E9 * sigmaGen, 1E9 * sigmaErr))
+      throw std::runtime_error("Could not merge LHE files into " + opts.filenameLHE(mass));
+    removeFiles(parts);
+  }
+  if (opts.writeToROOT()) {
+    parts = threadFilenames(opts.filenameROOT(mass), nThreads);
+    if (!mergeROOTFiles(parts, opts.filenameROOT(mass), opts.rootCompression()))
+      throw std::runtime_error("Could not merge ROOT files into " + opts.filenameROOT(mass));
+    removeFiles(parts);
+  }
 }
 
 
 /**
- * @brief Return vector of Particle pointers to 'children' of the particle.
+ * @brief Add the filters requested by the user to the chain.
  *
- * @param event Pythia8::Event object holding particle listings
- * @param p Particle to get children.
+ * @param opts Program options
+ * @param filterChain Chain to add filters to
+ */
+void setupFilters(PythiaProgramOpts & opts, FilterChain & filterChain) {
+  if (opts.diMuFilter()) {
+    LeptonSelection muons = {{13}, 0., 1E10};
+    filterChain.addFilter(std::unique_ptr<EventFilter>(new NLeptonFilter("diMuon", 2, muons)));
+  }
+
+  std::vector<int> pdgIds = {13};
+  if (opts.filterFlavour() == "e") {
+    pdgIds = {11};
+  } else if (opts.filterFlavour() == "lep") {
+    pdgIds = {11, 13};
+  }
+  LeptonSelection leptons = {pdgIds, opts.filterPtMin(), opts.filterEtaMax()};
+
+  if (opts.filterNLeptons() > 0) {
+    std::string name = "n" + opts.filterFlavour() + ">=" + lexical_cast<std::string>(opts.filterNLeptons());
+    filterChain.addFilter(std::unique_ptr<EventFilter>(
+      new NLeptonFilter(name, opts.filterNLeptons(), leptons)));
+  }
+  if (opts.filterSameSign()) {
+    filterChain.addFilter(std::unique_ptr<EventFilter>(
+      new SameSignPairFilter("sameSign" + opts.filterFlavour(), leptons)));
+  }
+}
+
+
+/**
+ * @brief Write a JSON summary of the run for one mass point: number of
+ * events, cross section, filter efficiency, etc.
+ * @details Useful for planning jobs, e.g. to account for filter efficiency.
  *
- * @return
+ * @param opts Program options
+ * @param mass Mass of a1
+ * @param summary Summary combined over all threads
  */
-std::vector<Particle*> getChildren(Event & event, Particle * p) {
-  std::vector<Particle*> children;
-  for (int child = p->daughter1(); child <= p->daughter2(); ++child) {
-    children.push_back(&event[child]);
+void writeRunSummary(PythiaProgramOpts & opts, double mass, const ThreadSummary & summary) {
+  JsonObject obj;
+  obj.add("card", opts.cardName())
+     .add("mass", mass)
+     .add("energy", opts.energy())
+     .add("seed", opts.seed())
+     .add("threads", opts.threads())
+     .add("nEvents", summary.nEvents)
+     .add("nEventsRequested", opts.nEvents())
+     .add("complete", summary.nEvents >= opts.nEvents())
+     .add("stopReason", stopReasonName())
+     .add("nGenerated", summary.nGenerated)
+     .add("nTried", summary.nTried)
+     .add("sigmaGen_mb", summary.sigmaGen)
+     .add("sigmaErr_mb", summary.sigmaErr)
+     .add("filter", FilterChain::toJson(summary.nGenerated, summary.filterStages))
+     .add("sumWeights", summary.sumWeights)
+     .add("sumWeights2", summary.sumWeights2)
+     // multiply sigmaGen by this to get the cross section of the kept events,
+     // accounting for both filters and any biasing
+     .add("weightedEfficiency", (summary.nGenerated > 0) ? summary.sumWeights / summary.nGenerated : 0.);
+  if (opts.genJets()) {
+    JsonObject jetObj;
+    jetObj.add("algorithm", opts.jetAlgo())
+          .add("R", opts.jetR())
+          .add("ptMin", opts.jetPtMin())
+          .add("etaMax", opts.jetEtaMax());
+    obj.add("genJets", jetObj);
   }
-  return children;
+  if (opts.tauMuBias() > 0) {
+    JsonObject biasObj;
+    biasObj.add("originalBR", summary.tauMuBR)
+           .add("biasedBR", opts.tauMuBias());
+    obj.add("tauMuBias", biasObj);
+  }
+  std::string filename = opts.filenameSummary(mass);
+  if (!obj.write(filename))
+    throw std::runtime_error("Could not write summary to " + filename);
+}
+
+
+/**
+ * @brief Derive the random number generator seed for a thread.
+ * @details Thread 0 uses the seed as given, so a single-threaded run is
+ * identical to before. Other threads offset it by a large amount, so that
+ * jobs using consecutive seeds (e.g. job IDs) do not share any seeds.
+ *
+ * @param seed Seed as specified by the user
+ * @param threadIndex Index of thread
+ *
+ * @return Seed for this thread
+ */
+int deriveSeed(int seed, int threadIndex) {
+  int newSeed = seed + threadIndex * threadSeedOffset;
+  // Pythia only accepts seeds up to 900000000
+  if (newSeed > 900000000)
+    throw std::runtime_error("Derived seed for thread " + lexical_cast<std::string>(threadIndex) +
+                             " too large, use a smaller seed or fewer threads");
+  return newSeed;
 }
 
 
 /**
- * @brief Get all descendants from a given particle. Iterates through all the
- * generation of children, until they are all final state (status > 0).
+ * @brief Get the filenames for all threads' part files that exist.
  *
- * @param event [description]
- * @param p Particle to get descendants.
- * @param finalStateOnly If true, returns only descendants which are final state
- * (status > 0). Otherwise, returns all intermediate children as well.
- * @return Returns a vector of Particle*
+ * @param filename Final output filename
+ * @param nThreads Number of threads
+ *
+ * @return Vector of part filenames, in thread order
  */
-std::vector<Particle*> getAllDescendants(Event & event, Particle * p, bool finalStateOnly) {
-  bool allFinalState = false;
-  std::vector<Particle*> intermediates = {p}; // hold the intermediates
-  std::vector<Particle*> descendants; // hold all the particles to be returned
-  while (!allFinalState) {
-    allFinalState = true;
-    std::vector<Particle*> newIntermediates;
-    for (auto & pItr : intermediates) {
-
-      if (pItr->isFinal()) continue;
-
-      auto kids = getChildren(event, pItr);
-      for (auto & childItr : kids) {
-        if (finalStateOnly) {
-          if (childItr->isFinal()) {
-            descendants.push_back(childItr);
-          }
-        } else {
-          descendants.push_back(childItr);
-        }
-        allFinalState = allFinalState && childItr->isFinal();
-      }
-      newIntermediates.insert(newIntermediates.end(), kids.begin(), kids.end());
+std::vector<std::string> threadFilenames(const std::string & filename, int nThreads) {
+  std::vector<std::string> filenames;
+  for (int iThread = 0; iThread < nThreads; ++iThread) {
+    std::string name = threadFilename(filename, iThread, nThreads);
+    if (check_file_exists(name)) filenames.push_back(name);
+  }
+  return filenames;
+}
+
+
+/**
+ * @brief Write a JSON sidecar file next to each output file for one mass
+ * point, with the number of events, cross section, seed, card hash, and the
+ * size & checksum of the file.
+ * @details Must be called after the outputs are merged and zipped.
+ *
+ * @param opts Program options
+ * @param mass Mass of a1
+ * @param summary Summary combined over all threads
+ */
+void writeOutputSidecars(PythiaProgramOpts & opts, double mass, const ThreadSummary & summary) {
+  unsigned long cardBytes = 0;
+  std::string cardHash = fileChecksum(opts.cardName(), cardBytes);
+
+  std::vector<std::pair<std::string, std::string>> outputs;  // format, filename
+  std::string zipExt = opts.compressOutput() ? ".gz" : "";
+  if (opts.writeToHEPMC()) outputs.push_back(std::make_pair("hepmc", opts.filenameHEPMC(mass) + zipExt));
+  if (opts.writeToLHE()) outputs.push_back(std::make_pair("lhe", opts.filenameLHE(mass) + zipExt));
+  if (opts.writeToROOT()) outputs.push_back(std::make_pair("root", opts.filenameROOT(mass)));
+
+  for (const auto & output : outputs) {
+    JsonObject obj;
+    obj.add("generator", "generateMC")
+       .add("format", output.first)
+       .add("nEvents", summary.nEvents)
+       .add("sigmaGen_mb", summary.sigmaGen)
+       .add("sigmaErr_mb", summary.sigmaErr)
+       .add("weightedEfficiency", (summary.nGenerated > 0) ? summary.sumWeights / summary.nGenerated : 0.)
+       .add("seed", opts.seed())
+       .add("mass", mass)
+       .add("energy", opts.energy())
+       .add("card", opts.cardName())
+       .add("cardHash", cardHash);
+    if (opts.bgzf() && output.first != "root")
+      obj.add("bgzfIndex", fs::path(output.second + ".idx").filename().string());
+    if (!writeSidecar(output.second, obj))
+      cout << "Could not write sidecar for " << output.second << endl;
+  }
+}
+
+
+/**
+ * @brief Write a progress report as one line of JSON to the progress file,
+ * and a short line to STDOUT if one is due.
+ *
+ * @param monitor Progress monitor for this thread & mass point
+ * @param threadIndex Index of thread
+ * @param mass Mass of a1
+ * @param nEvents Number of events kept so far
+ * @param nGenerated Number of events generated so far, before filters
+ * @param nTried Number of events tried by Pythia so far
+ * @param threadLabel Prefix for STDOUT
+ * @param progressFile File to write progress to, shared between threads
+ */
+void writeProgress(ProgressMonitor & monitor, int threadIndex, double mass,
+                   long nEvents, long nGenerated, long nTried,
+                   const std::string & threadLabel, ofstream & progressFile) {
+  JsonObject report = monitor.report(nEvents, nGenerated, nTried);
+  report.add("thread", threadIndex).add("mass", mass);
+  bool print = monitor.printDue();
+  std::lock_guard<std::mutex> lock(outputMutex);
+  progressFile << report.str() << endl;
+  if (print) {
+    cout << threadLabel << "iEvent: " << nEvents << " - " << getCurrentTime() << endl;
+  }
+}
+
+
+/**
+ * @brief Check whether to stop generating events early, either because a
+ * signal was received or the --maxSeconds limit has passed.
+ *
+ * @param opts Program options
+ *
+ * @return true if generation should stop
+ */
+bool stopGenerating(PythiaProgramOpts & opts) {
+  if (stopReason != kNotStopped) return true;
+  if (opts.maxSeconds() > 0) {
+    std::chrono::duration<double> elapsed = std::chrono::steady_clock::now() - startTime;
+    if (elapsed.count() > opts.maxSeconds()) {
+      int expected = kNotStopped;
+      stopReason.compare_exchange_strong(expected, kTimeLimit);
+      return true;
     }
-    intermediates = newIntermediates;
-    newIntermediates.clear(); // prob don't need this, but at least explicit
   }
-  return descendants;
+  return false;
+}
+
+
+/**
+ * @brief Signal handler for SIGTERM/SIGINT. Only sets a flag,
+ * the event loops then stop at the next event.
+ *
+ * @param sig Signal number
+ */
+extern "C" void handleStopSignal(int sig) {
+  (void) sig;
+  stopReason = kSignal;
+}
+
+
+/**
+ * @brief Get a description of why generating stopped early,
+ * empty if it didn't.
+ */
+std::string stopReasonName() {
+  switch (stopReason) {
+    case kSignal: return "signal";
+    case kTimeLimit: return "maxSeconds";
+    default: return "";
+  }
 }
 
 
@@ -439,6 +1063,30 @@ int gzip_file(std::string filename) {
   return 0;
 }
 
+
+/**
+ * @brief Compress a file with blocked gzip (BGZF), and write an index of
+ * event offsets to <filename>.gz.idx. The original file is removed,
+ * like with gzip.
+ *
+ * @param filename File to compress
+ * @param eventStart Start of the first line of each event
+ * @param footerStart Start of the first line after all the events
+ * @param indexInterval Index every this many events
+ *
+ * @return 0 if successful, 1 otherwise
+ */
+int bgzf_file(const std::string & filename, const std::string & eventStart,
+              const std::string & footerStart, int indexInterval) {
+  std::string output = filename + ".gz";
+  if (!bgzfCompressEvents(filename, output, output + ".idx",
+                          eventStart, footerStart, indexInterval)) {
+    return 1;
+  }
+  fs::remove(filename);
+  return 0;
+}
+
 /**
  * @brief Check file exists
  *
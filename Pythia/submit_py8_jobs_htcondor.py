@@ -33,11 +33,16 @@ import sys
 import os
 import getpass
 import logging
+sys.path.append('../Common')
+import common
 
 
 logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
 log = logging.getLogger(__name__)
 
+# Memory to request per thread, each runs its own Pythia instance
+MEMORY_PER_THREAD_MB = 100
+
 
 def submit_mc_jobs_htcondor(in_args=sys.argv[1:]):
     """
@@ -73,6 +78,12 @@ def submit_mc_jobs_htcondor(in_args=sys.argv[1:]):
                         "This will superseed any --mass option passed via --args",
                         nargs=3, type=float,
                         metavar=('startMass', 'endMass', 'massStep'))
+    parser.add_argument("--massesPerJob",
+                        help="Number of mass points to generate in each job. "
+                        "Packing several mass points into one job avoids "
+                        "paying the program startup cost for every mass.",
+                        type=int, default=1)
+    common.add_filter_args(parser)
     # All other program arguments to pass to program directly.
     parser.add_argument("--args",
                         help="All other program arguments. "
@@ -130,6 +141,10 @@ def submit_mc_jobs_htcondor(in_args=sys.argv[1:]):
     except KeyError as e:
         args.energy = 13
 
+    # Account for filter efficiency when sizing jobs
+    # -------------------------------------------------------------------------
+    common.set_events_for_filter(args)
+
     # Auto generate output directory if necessary
     # -------------------------------------------------------------------------
     if args.oDir == "":
@@ -167,15 +182,24 @@ def submit_mc_jobs_htcondor(in_args=sys.argv[1:]):
     else:
         masses = [get_option_in_args(args.args, '--mass')]
 
+    if args.massesPerJob < 1:
+        raise RuntimeError('--massesPerJob must be >= 1')
+
+    mass_strs = ['%g' % mass if isinstance(mass, float) else str(mass) for mass in masses]
+    mass_groups = [mass_strs[i:i + args.massesPerJob]
+                   for i in xrange(0, len(mass_strs), args.massesPerJob)]
+
     status_files = []
 
-    for mass in masses:
+    for mass_group in mass_groups:
 
         # File stem common for all dag and status files
         # ---------------------------------------------------------------------
-        mass_str = '%g' % mass if isinstance(mass, float) else str(mass)
+        mass_label = mass_group[0]
+        if len(mass_group) > 1:
+            mass_label = '%sto%s' % (mass_group[0], mass_group[-1])
         file_stem = '%s/ma%s_%s' % (generate_subdir(args.channel, args.energy),
-                                    mass_str, strftime("%H%M%S"))
+                                    mass_label, strftime("%H%M%S"))
         check_create_dir(os.path.dirname(file_stem))
 
         # Make DAG file
@@ -186,7 +210,7 @@ def submit_mc_jobs_htcondor(in_args=sys.argv[1:]):
         write_dag_file(dag_filename=dag_name,
                        condor_filename='HTCondor/mcJob.condor',
                        status_filename=status_name, exe=sandbox_exe,
-                       log_dir=log_dir, mass=mass_str, args=args)
+                       log_dir=log_dir, masses=mass_group, args=args)
 
         # Submit it
         # ---------------------------------------------------------------------
@@ -205,7 +229,7 @@ def submit_mc_jobs_htcondor(in_args=sys.argv[1:]):
 
 
 def write_dag_file(dag_filename, condor_filename, status_filename,
-                   log_dir, exe, mass, args):
+                   log_dir, exe, masses, args):
     """Write a DAG file for a set of jobs.
 
     Creates a DAG file, adding extra flags for the worker node script.
@@ -220,29 +244,29 @@ def write_dag_file(dag_filename, condor_filename, status_filename,
         Name to be used for DAG status file.
     exe: str
         Location of sandboxed executable to copy accross.
-    mass: str
-        Mass of a1 boson. Used to auto-generate HepMC filename.
+    masses: list[str]
+        Mass(es) of a1 boson to generate in each job.
+        Used to auto-generate HepMC filename.
     args: argparse.Namespace
         Contains info about output directory, job IDs, number of events per job,
         and args to pass to the executable.
     """
     # get number of events to generate per job
-    if '--number' in args.args:
-        n_events = get_option_in_args(args.args, "--number")
-    elif '-n' in args.args:
-        n_events = get_option_in_args(args.args, "-n")
-    else:
-        log.warning('Number of events per job not specified - assuming 1')
-        n_events = 1
+    n_events = get_number_events(args)
 
-    # set mass in args passed to program
+    # set mass(es) in args passed to program
     if '--mass' in args.args:
-        set_option_in_args(args.args, '--mass', str(mass))
+        set_option_in_args(args.args, '--mass', ' '.join(masses))
     else:
-        args.args.extend(['--mass', mass])
+        args.args.extend(['--mass', ' '.join(masses)])
 
     log.debug('args.args before: %s' % args.args)
 
+    # request as many cpus as the program will use threads,
+    # and enough memory for each thread's Pythia instance
+    n_threads = get_number_threads(args)
+    memory = '%dMB' % (MEMORY_PER_THREAD_MB * n_threads)
+
     log.info("DAG file: %s" % dag_filename)
     with open(dag_filename, 'w') as dag_file:
         dag_file.write('# DAG for channel %s\n' % args.channel)
@@ -272,11 +296,21 @@ def write_dag_file(dag_filename, condor_filename, status_filename,
                                 "No HepMC file will be produced.")
                 if flag not in exe_args:
                     continue
+                elif len(masses) > 1 and not get_option_in_args(args.args, flag):
+                    # Let generateMC.cc make the default filename for each
+                    # mass point, which already includes the seed.
+                    out_names = []
+                    for mass in masses:
+                        default_name = generate_filename(args.channel, mass, args.energy,
+                                                         n_events, fmt)
+                        out_names.append("%s_seed%d.%s" % (os.path.splitext(default_name)[0],
+                                                           job_ind, fmt))
                 else:
                     # Auto generate output filename if necessary
                     # Bit hacky as have to manually sync with PythiaProgramOpts
                     if not get_option_in_args(args.args, flag):
-                        out_name = generate_filename(args.channel, mass, args.energy, n_events, fmt)
+                        out_name = generate_filename(args.channel, masses[0], args.energy,
+                                                     n_events, fmt)
                         set_option_in_args(exe_args, flag, out_name)
 
                     # Use the filename itself, ignore any directories from user.
@@ -288,23 +322,47 @@ def write_dag_file(dag_filename, condor_filename, status_filename,
                     out_name = "%s_seed%d.%s" % (os.path.splitext(out_name)[0],
                                                  job_ind, fmt)
                     set_option_in_args(exe_args, flag, out_name)
-                    if '--zip' in exe_args:
-                        out_name += ".gz"
 
-                    # transfer to hdfs after generating, to a subfolder
-                    # depending on filetype
-                    oDir_fmt = os.path.join(args.oDir, fmt)
-                    check_create_dir(oDir_fmt)
+                    # generateMC.cc adds the mass to the filename for each mass point
+                    if len(masses) > 1:
+                        out_names = [common.generate_mass_filename(out_name, mass)
+                                     for mass in masses]
+                    else:
+                        out_names = [out_name]
+
+                # generateMC.cc only zips HepMC & LHE files
+                use_bgzf = '--bgzf' in exe_args and fmt != 'root'
+                if ('--zip' in exe_args or use_bgzf) and fmt != 'root':
+                    out_names = [out_name + ".gz" for out_name in out_names]
+
+                # transfer to hdfs after generating, to a subfolder
+                # depending on filetype
+                oDir_fmt = os.path.join(args.oDir, fmt)
+                check_create_dir(oDir_fmt)
+                for out_name in out_names:
                     job_opts.extend(['--copyFromLocal', out_name, oDir_fmt])
+                    # sidecar describing the file contents (number of events, etc)
+                    job_opts.extend(['--copyFromLocal', common.sidecar_filename(out_name),
+                                     oDir_fmt])
+                    if use_bgzf:
+                        job_opts.extend(['--copyFromLocal', common.bgzf_index_filename(out_name),
+                                         oDir_fmt])
+
+            # summary of the run (number of events, filter efficiency, etc)
+            oDir_summary = os.path.join(args.oDir, 'summary')
+            check_create_dir(oDir_summary)
+            for mass in masses:
+                summary_name = common.generate_summary_filename(args.channel, mass,
+                                                                args.energy, n_events, job_ind)
+                job_opts.extend(['--copyFromLocal', summary_name, oDir_summary])
 
             job_opts.append('--args')
             job_opts.extend(exe_args)
             log.debug('job_opts: %s' % job_opts)
             log_name = os.path.splitext(os.path.basename(dag_filename))[0]
             dag_file.write('VARS %s ' % job_name)
-            dag_file.write('opts="%s" logdir="%s" logfile="%s"\n' % (' '.join(job_opts),
-                                                                     log_dir,
-                                                                     log_name))
+            dag_file.write('opts="%s" logdir="%s" logfile="%s" cpus="%d" memory="%s"\n'
+                           % (' '.join(job_opts), log_dir, log_name, n_threads, memory))
         dag_file.write('NODE_STATUS_FILE %s 30\n' % status_filename)
 
 
@@ -346,6 +404,44 @@ def generate_filename(channel, mass, energy, n_events, fmt):
     return "%s_ma1_%s_%dTeV_n%s.%s" % (channel, mass, energy, n_events, fmt)
 
 
+def get_number_events(args):
+    """Return number of events as specified in user args.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+
+    Returns
+    -------
+    int
+        Number of events. Default 1 is not specified
+    """
+    if '--number' in args.args:
+        return int(get_option_in_args(args.args, "--number"))
+    elif '-n' in args.args:
+        return int(get_option_in_args(args.args, "-n"))
+    else:
+        log.warning('Number of events per job not specified - assuming 1')
+        return 1
+
+
+def get_number_threads(args):
+    """Return number of threads as specified in user args, default 1.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+
+    Returns
+    -------
+    int
+        Number of threads the program will run with.
+    """
+    if '--threads' in args.args:
+        return int(get_option_in_args(args.args, '--threads'))
+    return 1
+
+
 def get_option_in_args(args, flag):
     """Return value that accompanied flag in list of args.
 
@@ -42,6 +42,9 @@ log = logging.getLogger(__name__)
 # Set directory for STDOUT/STDERR/LOG from jobs
 LOG_DIR = '/storage/%s/NMSSMPheno/Pythia8' % os.environ['LOGNAME']
 
+# Memory to request per thread, as each thread runs a Pythia instance
+MEMORY_PER_THREAD_MB = 100
+
 
 def submit_mc_jobs_htcondor(in_args=sys.argv[1:], log_dir=LOG_DIR):
     """
@@ -77,6 +80,12 @@ def submit_mc_jobs_htcondor(in_args=sys.argv[1:], log_dir=LOG_DIR):
                         "This will superseed any --mass option passed via --args",
                         nargs=3, type=float,
                         metavar=('startMass', 'endMass', 'massStep'))
+    parser.add_argument("--massesPerJob",
+                        help="Number of mass points to generate in each job. "
+                        "Packing several mass points into one job avoids "
+                        "paying the program startup cost for every mass.",
+                        type=int, default=1)
+    common.add_filter_args(parser)
     # All other program arguments to pass to program directly.
     parser.add_argument("--args",
                         help="All other program arguments. "
@@ -123,15 +132,30 @@ def submit_mc_jobs_htcondor(in_args=sys.argv[1:], log_dir=LOG_DIR):
     except KeyError:
         args.energy = 13
 
+    # Account for filter efficiency when sizing jobs
+    common.set_events_for_filter(args)
+
     # Loop over required mass(es), generating DAG files for each
     if args.massRange:
         masses = common.frange(args.massRange[0], args.massRange[1], args.massRange[2])
     else:
         masses = [get_option_in_args(args.args, '--mass')]
 
+    # Group mass points into jobs
+    if args.massesPerJob < 1:
+        raise RuntimeError('--massesPerJob must be >= 1')
+    masses = ['%g' % mass if isinstance(mass, float) else str(mass) for mass in masses]
+    mass_groups = [masses[i:i + args.massesPerJob]
+                   for i in xrange(0, len(masses), args.massesPerJob)]
+
     status_files = []
 
-    for mass in masses:
+    for mass_group in mass_groups:
+        # Label used in directory names
+        mass = mass_group[0]
+        if len(mass_group) > 1:
+            mass = '%sto%s' % (mass_group[0], mass_group[-1])
+
         # Auto generate output directory if necessary
         if args.oDir == "":
             args.oDir = generate_dir_soolin(args.channel, args.energy, mass)
@@ -150,7 +174,7 @@ def submit_mc_jobs_htcondor(in_args=sys.argv[1:], log_dir=LOG_DIR):
         pythia_dag = create_dag(dag_filename=file_stem + '.dag',
                                 condor_filename='HTCondor/pythia.condor',
                                 status_filename=status_name,
-                                log_dir=log_dir, mass=mass, args=args)
+                                log_dir=log_dir, masses=mass_group, args=args)
 
         # Submit it
         if args.dry:
@@ -196,7 +220,7 @@ def check_args(args):
             raise RuntimeError('You cannot have endMass < startMass')
 
 
-def create_dag(dag_filename, status_filename, condor_filename, log_dir, mass, args):
+def create_dag(dag_filename, status_filename, condor_filename, log_dir, masses, args):
     """Create a htcondenser.DAGMan to run a set of Pythia8 jobs.
 
     Parameters
@@ -207,33 +231,38 @@ def create_dag(dag_filename, status_filename, condor_filename, log_dir, mass, ar
         Name of condor job file to be used for each job.
     status_filename: str
         Name to be used for DAG status file.
-    mass: int, float
-        Mass of a1 boson. Used to auto-generate HepMC filename.
+    masses: list[str]
+        Mass(es) of a1 boson to generate in each job.
+        Used to auto-generate HepMC filename.
     args: argparse.Namespace
         Contains info about output directory, job IDs, number of events per job,
         and args to pass to the executable.
 
     """
-    # set mass in args passed to program
+    # set mass(es) in args passed to program
     if '--mass' in args.args:
-        set_option_in_args(args.args, '--mass', mass)
+        set_option_in_args(args.args, '--mass', ' '.join(masses))
     else:
-        args.args.extend(['--mass', mass])
+        args.args.extend(['--mass', ' '.join(masses)])
 
     log.debug('args.args before: %s', args.args)
 
+    # one cpu per thread, and memory scaled to match
+    n_threads = get_number_threads(args)
+    memory = '%dMB' % (MEMORY_PER_THREAD_MB * n_threads)
     pythia_jobset = ht.JobSet(exe=args.exe, copy_exe=True,
                               setup_script='HTCondor/setup.sh',
                               filename=condor_filename,
                               out_dir=log_dir, err_dir=log_dir, log_dir=log_dir,
-                              memory="100MB", disk="2GB", share_exe_setup=True,
+                              cpus=n_threads,
+                              memory=memory, disk="2GB", share_exe_setup=True,
                               common_input_files=[args.card, 'input_cards/common_pp.cmnd'],
                               hdfs_store=args.oDir)
 
     pythia_dag = ht.DAGMan(filename=dag_filename, status_file=status_filename)
 
     for job_ind in xrange(args.jobIdRange[0], args.jobIdRange[1] + 1):
-        pythia_job = generate_pythia_job(args, job_ind, mass)
+        pythia_job = generate_pythia_job(args, job_ind, masses)
         pythia_jobset.add_job(pythia_job)
         pythia_dag.add_job(pythia_job)
 
@@ -344,7 +373,24 @@ def get_number_events(args):
         return 1
 
 
-def generate_pythia_job(args, job_index, mass, num_events):
+def get_number_threads(args):
+    """Return number of threads as specified in user args.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+
+    Returns
+    -------
+    int
+        Number of threads. Default 1 if not specified
+    """
+    if '--threads' in args.args:
+        return int(get_option_in_args(args.args, '--threads'))
+    return 1
+
+
+def generate_pythia_job(args, job_index, masses):
     """
     Parameters
     ----------
@@ -352,8 +398,8 @@ def generate_pythia_job(args, job_index, mass, num_events):
         Description
     job_index : TYPE
         Description
-    mass : TYPE
-        Description
+    masses : list[str]
+        Mass(es) of a1 to generate in this job.
 
     Returns
     -------
@@ -380,7 +426,8 @@ def generate_pythia_job(args, job_index, mass, num_events):
             # Bit hacky as have to manually sync with PythiaProgramOpts
             if not get_option_in_args(args.args, flag):
                 num_events = get_number_events(args)
-                out_name = generate_filename(args.channel, mass, args.energy, num_events, fmt)
+                mass_label = masses[0] if len(masses) == 1 else '%sto%s' % (masses[0], masses[-1])
+                out_name = generate_filename(args.channel, mass_label, args.energy, num_events, fmt)
                 set_option_in_args(exe_args, flag, out_name)
 
             # Use the filename itself, ignore any directories from user.
@@ -392,9 +439,26 @@ def generate_pythia_job(args, job_index, mass, num_events):
             out_name = "%s_seed%d.%s" % (os.path.splitext(out_name)[0],
                                          job_index, fmt)
             set_option_in_args(exe_args, flag, out_name)
-            if '--zip' in exe_args:
-                out_name += ".gz"
-            out_files.append(out_name)
+
+            # generateMC.cc adds the mass to the filename for each mass point
+            out_names = [out_name]
+            if len(masses) > 1:
+                out_names = [common.generate_mass_filename(out_name, mass) for mass in masses]
+            # generateMC.cc only zips HepMC & LHE files
+            use_bgzf = '--bgzf' in exe_args and fmt != 'root'
+            if ('--zip' in exe_args or use_bgzf) and fmt != 'root':
+                out_names = [name + ".gz" for name in out_names]
+            out_files.extend(out_names)
+            if use_bgzf:
+                # event offset index, to read from the middle of the file
+                out_files.extend([common.bgzf_index_filename(name) for name in out_names])
+            # sidecars describing the file contents (number of events, etc)
+            out_files.extend([common.sidecar_filename(name) for name in out_names])
+
+    # summary of the run (number of events, filter efficiency, etc)
+    for mass in masses:
+        out_files.append(common.generate_summary_filename(args.channel, mass, args.energy,
+                                                          get_number_events(args), job_index))
 
     pythia_job = ht.Job(name='%d_%s' % (job_index, args.channel),
                         args=exe_args, output_files=out_files,
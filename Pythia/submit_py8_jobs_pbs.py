@@ -34,12 +34,23 @@ import argparse
 import getpass
 from time import strftime
 import logging
+sys.path.append('../Common')
+import common
 
 
 logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
 log = logging.getLogger(__name__)
 
 
+# Walltimes for normal jobs (as set in PBS/mcJob.sh) and test jobs
+DEFAULT_WALLTIME = '5:00:00'
+TEST_WALLTIME = '0:30:00'
+
+# Time (in seconds) to leave at the end of a job, after generating stops,
+# for writing out & zipping the output before the walltime is reached
+WALLTIME_MARGIN = 600
+
+
 def submit_mc_jobs_pbs(in_args=sys.argv[1:]):
     """Main function for handing user args and submitting PBS jobs."""
 
@@ -71,6 +82,12 @@ def submit_mc_jobs_pbs(in_args=sys.argv[1:]):
                         "This will superseed any --mass option passed via --args",
                         nargs=3, type=float,
                         metavar=('startMass', 'endMass', 'massStep'))
+    parser.add_argument("--massesPerJob",
+                        help="Number of mass points to generate in each job. "
+                        "Packing several mass points into one job avoids "
+                        "paying the program startup cost for every mass.",
+                        type=int, default=1)
+    common.add_filter_args(parser)
     # All other program arguments to pass to program directly.
     parser.add_argument("--args",
                         help="All other program arguments. "
@@ -134,6 +151,19 @@ def submit_mc_jobs_pbs(in_args=sys.argv[1:]):
     # -------------------------------------------------------------------------
     args.args.extend(['--seed', '\\$PBS_ARRAYID'])
 
+    # Account for filter efficiency when sizing jobs
+    # -------------------------------------------------------------------------
+    common.set_events_for_filter(args)
+
+    # Stop generating before the walltime is reached, so the output from
+    # jobs that run out of time is still written properly
+    # -------------------------------------------------------------------------
+    walltime = TEST_WALLTIME if args.test else DEFAULT_WALLTIME
+    if '--maxSeconds' not in args.args:
+        max_seconds = max(walltime_to_seconds(walltime) - WALLTIME_MARGIN,
+                          walltime_to_seconds(walltime) / 2)
+        args.args.extend(['--maxSeconds', str(max_seconds)])
+
     # Get number of events to generate per job
     # -------------------------------------------------------------------------
     if '--number' in args.args:
@@ -155,25 +185,34 @@ def submit_mc_jobs_pbs(in_args=sys.argv[1:]):
     else:
         masses = [get_option_in_args(args.args, '--mass')]
 
-    for mass in masses:
+    # Group mass points, each job generating all masses in its group
+    if args.massesPerJob < 1:
+        raise RuntimeError('--massesPerJob must be >= 1')
+    masses = ['%g' % mass if isinstance(mass, float) else str(mass) for mass in masses]
+    mass_groups = [masses[i:i + args.massesPerJob]
+                   for i in xrange(0, len(masses), args.massesPerJob)]
+
+    for mass_group in mass_groups:
 
         # Submit the jobs.
         # --------------------------------------------------------------------
         # The jobs will be submitted as a job array, to allow easy manipulation
         # of the set of jobs as a whole.
         pbs_script = 'PBS/mcJob.sh'
-        mass_str = '%g' % mass if isinstance(mass, float) else str(mass)
+        mass_str = mass_group[0]
+        if len(mass_group) > 1:
+            mass_str = '%sto%s' % (mass_group[0], mass_group[-1])
         job_name = args.channel + mass_str
         job_range = '%d-%d' % (args.jobIdRange[0], args.jobIdRange[1])
         log_name = "%s_\\${PBS_JOBID%%%%[*]}" % args.channel
 
         exe_args = args.args[:]
 
-        # Set mass in args
+        # Set mass(es) in args
         if '--mass' in exe_args:
-            set_option_in_args(exe_args, '--mass', str(mass))
+            set_option_in_args(exe_args, '--mass', ' '.join(mass_group))
         else:
-            exe_args.extend(['--mass', mass])
+            exe_args.extend(['--mass', ' '.join(mass_group)])
 
         # Set filenames in args. Ensures seed and output directory
         # added to filenames.
@@ -187,9 +226,11 @@ def submit_mc_jobs_pbs(in_args=sys.argv[1:]):
                 continue
             else:
                 # Auto generate output filename if necessary
-                # Bit hacky as have to manually sync with PythiaProgramOpts
+                # Bit hacky as have to manually sync with PythiaProgramOpts.
+                # If there are several masses, generateMC.cc inserts
+                # "_ma1_<mass>" into the filename for each mass point.
                 if not get_option_in_args(args.args, flag):
-                    out_name = "%s_ma1_%s_n%s.%s" % (args.channel, mass,
+                    out_name = "%s_ma1_%s_n%s.%s" % (args.channel, mass_str,
                                                      n_events, fmt)
                     set_option_in_args(exe_args, flag, out_name)
 
@@ -206,10 +247,17 @@ def submit_mc_jobs_pbs(in_args=sys.argv[1:]):
         script_vars = {'exe': args.exe,
                        'args': " ".join(exe_args)}
 
+        # Request as many processors as the program will use threads
+        resources = []
+        if '--threads' in exe_args:
+            resources.append('nodes=1:ppn=%s' % get_option_in_args(exe_args, '--threads'))
+
+        pbs_opts = {}
         if args.test:
-            pbs_opts = {'-q': 'test', '-l': 'walltime=0:30:00'}
-        else:
-            pbs_opts = None
+            pbs_opts['-q'] = 'test'
+            resources.append('walltime=%s' % TEST_WALLTIME)
+        if resources:
+            pbs_opts['-l'] = ','.join(resources)
 
         if args.v:
             log.debug(script_vars)
@@ -221,6 +269,18 @@ def submit_mc_jobs_pbs(in_args=sys.argv[1:]):
                            script_vars=script_vars, pbs_opts=pbs_opts)
 
 
+def walltime_to_seconds(walltime):
+    """Convert a PBS walltime string to a number of seconds.
+
+    >>> walltime_to_seconds('5:00:00')
+    18000
+    """
+    seconds = 0
+    for field in walltime.split(':'):
+        seconds = 60 * seconds + int(field)
+    return seconds
+
+
 def checkJobIdRange(jobIdRange):
     """Checks range of job IDs. Will raise a RuntimeError if unsatisfactory.
 